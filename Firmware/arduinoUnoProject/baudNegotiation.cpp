@@ -0,0 +1,66 @@
+// Baud rate negotiation
+//
+// The board always starts at SERIAL_BAUD, so a reset brings both ends back to a known rate. The host then asks for
+// the fastest rate it wants to use. If the request is refused, or the link does not work at the new rate, the host
+// resets the board and tries the next rate down.
+
+#include "baudNegotiation.h"
+#include "crc_8.h"
+
+// Rates a 16 MHz AVR generates without error (U2X mode), highest first
+static const uint32_t au32_supportedBaudRates[] = {1000000, 500000, 250000, 115200};
+
+// Returns true if the host has started sending a baud rate request.
+bool isBaudRequestPending(void)
+{
+  return Serial.peek() == BAUD_REQUEST_START;
+}
+
+// Returns true if the board can switch to u32_baud.
+bool isSupportedBaudRate(uint32_t u32_baud)
+{
+  for (uint8_t u8_i = 0; u8_i < sizeof(au32_supportedBaudRates) / sizeof(au32_supportedBaudRates[0]); u8_i++) {
+    if (au32_supportedBaudRates[u8_i] == u32_baud)
+      return true;
+  }
+  return false;
+}
+
+// Reads a baud rate request, answers it, and switches to the new baud rate if it was accepted.
+void processBaudRequest(void)
+{
+  char requestBuffer[BAUD_REQUEST_LEN];
+  char replyBuffer[BAUD_REQUEST_LEN];
+  uint32_t u32_baud = 0;
+  uint32_t u32_requestedBaud;
+  int s16_crcIndex;
+
+  memset(requestBuffer, '\0', BAUD_REQUEST_LEN);
+  Serial.readBytesUntil(BAUD_REQUEST_EOL, requestBuffer, BAUD_REQUEST_LEN - 1);
+
+  String str_request(requestBuffer);
+  s16_crcIndex = str_request.indexOf("CRC:");
+  if (str_request.startsWith("BAUD:") && s16_crcIndex > 0) {
+    String str_data = str_request.substring(0, s16_crcIndex);
+    uint8_t u8_CRC = (uint8_t) str_request.substring(s16_crcIndex + strlen("CRC:")).toInt();
+
+    if (u8_CRC == calculate_crc_8((char*) str_data.c_str(), str_data.length())) {
+      u32_requestedBaud = (uint32_t) str_data.substring(strlen("BAUD:")).toInt();
+      if (isSupportedBaudRate(u32_requestedBaud))
+        u32_baud = u32_requestedBaud;
+    }
+  }
+
+  // Reply at the current baud rate
+  snprintf(replyBuffer, BAUD_REQUEST_LEN, "BAUD:%lu;", (unsigned long) u32_baud);
+  Serial.print(replyBuffer);
+  Serial.print("CRC:");
+  Serial.print(calculate_crc_8(replyBuffer, strlen(replyBuffer)));
+  Serial.println(";");
+  Serial.flush();
+
+  if (u32_baud != 0) {
+    Serial.end();
+    Serial.begin(u32_baud);
+  }
+}
@@ -0,0 +1,18 @@
+#ifndef BAUD_NEGOTIATION_H
+#define BAUD_NEGOTIATION_H
+
+#include <Arduino.h>
+#include <stdint.h>
+
+// Baud rate request sent by the host after the welcome message: "BAUD:<rate>;CRC:<crc>;"
+// The board answers with the same line at the current baud rate, then switches. "BAUD:0;" means the request was
+// refused (unsupported rate or bad CRC) and the baud rate is unchanged.
+#define BAUD_REQUEST_START  'B'
+#define BAUD_REQUEST_EOL    '\n'
+#define BAUD_REQUEST_LEN    32
+
+bool isBaudRequestPending(void);
+bool isSupportedBaudRate(uint32_t);
+void processBaudRequest(void);
+
+#endif // BAUD_NEGOTIATION_H
@@ -0,0 +1,257 @@
+// Binary framed protocol (firmware v2)
+//
+// Every packet is [type][data...][sequence number][CRC-8/Maxim of everything before it], byte stuffed and terminated
+// with FRAME_END.
+//
+// Outputs packet (Host -> Board):
+//   PACKET_OUTPUTS, LED mask (LED_MASK_BYTES, little endian, bit n = LED n), PWM values (1 byte each), SEQ, CRC
+// Config packet (Host -> Board):
+//   PACKET_CONFIG, mode (MODE_REQUEST_RESPONSE or MODE_DELTA), SEQ, CRC
+// Inputs packet (Board -> Host):
+//   PACKET_INPUTS, Switch mask (SW_MASK_BYTES, little endian, bit n = SW n), analog values (1 byte each), SEQ, CRC
+// Input delta packet (Board -> Host):
+//   PACKET_INPUT_DELTA, Switch mask, analog change mask (ANA_MASK_BYTES, bit n = ANA n changed),
+//   changed analog values (1 byte each, in channel order), SEQ, CRC
+//
+// MODE_REQUEST_RESPONSE (default): every outputs packet is answered with one inputs packet carrying the same sequence
+// number, so the host can keep several outputs packets in flight. The serial receive buffer (64 bytes) limits this to
+// 3 packets.
+//
+// MODE_DELTA: outputs packets are not answered. The host only sends outputs when they change, plus a keepalive. The
+// board sends an input delta packet when the inputs change, and a full inputs packet every FULL_SYNC_PERIOD.
+//
+// In both modes, the board goes back to waiting for a connection (outputs off) if nothing is received for the timeout.
+// Config packets are always answered with a full inputs packet.
+
+#include "binaryProtocol.h"
+#include "crc_8.h"
+
+// Frame reader state
+static size_t frameLen = 0;
+static bool frameEscaped = false;
+static bool frameValid = true;
+
+// Last inputs sent to the host, used to build input delta packets
+static uint16_t u16_lastSwitchMask = 0;
+static uint8_t au8_lastAnalog[NUM_OF_ANA_INS];
+
+// Resets the frame reader, dropping any partially received frame.
+void resetFrameReader(void)
+{
+  frameLen = 0;
+  frameEscaped = false;
+  frameValid = true;
+}
+
+// Reads the bytes that are available into au8_buffer, removing the byte stuffing. Does not wait for more data.
+// Returns the packet length once a frame is complete, 0 if the frame is not complete yet, or -1 if the frame was too
+// long or badly escaped.
+int16_t pollFrame(uint8_t* au8_buffer, size_t maxLen)
+{
+  while (Serial.available() > 0) {
+    uint8_t u8_byte = (uint8_t) Serial.read();
+
+    if (u8_byte == FRAME_END) {
+      int16_t s16_result = frameValid ? (int16_t) frameLen : -1;
+      resetFrameReader();
+      // Skip empty frames (back to back delimiters)
+      if (s16_result == 0)
+        continue;
+      return s16_result;
+    }
+
+    if (frameEscaped) {
+      frameEscaped = false;
+      if (u8_byte == FRAME_ESC_END)
+        u8_byte = FRAME_END;
+      else if (u8_byte == FRAME_ESC_ESC)
+        u8_byte = FRAME_ESC;
+      else
+        frameValid = false;
+    }
+    else if (u8_byte == FRAME_ESC) {
+      frameEscaped = true;
+      continue;
+    }
+
+    if (frameLen < maxLen)
+      au8_buffer[frameLen++] = u8_byte;
+    else
+      frameValid = false;
+  }
+  return 0;
+}
+
+// Appends the CRC-8 to the packet, then writes it out with byte stuffing and the frame delimiter.
+// au8_packet must have room for one more byte.
+void writeFrame(uint8_t* au8_packet, size_t len)
+{
+  au8_packet[len] = calculate_crc_8((char*) au8_packet, len);
+  len++;
+
+  for (size_t i = 0; i < len; i++) {
+    if (au8_packet[i] == FRAME_END) {
+      Serial.write(FRAME_ESC);
+      Serial.write(FRAME_ESC_END);
+    }
+    else if (au8_packet[i] == FRAME_ESC) {
+      Serial.write(FRAME_ESC);
+      Serial.write(FRAME_ESC_ESC);
+    }
+    else {
+      Serial.write(au8_packet[i]);
+    }
+  }
+  Serial.write(FRAME_END);
+  Serial.flush();
+}
+
+// Returns true if the packet has the expected type, length and CRC.
+bool isValidPacket(uint8_t* au8_packet, size_t len, uint8_t u8_type, size_t expectedLen)
+{
+  return len == expectedLen && au8_packet[0] == u8_type &&
+         au8_packet[len - 1] == calculate_crc_8((char*) au8_packet, len - 1);
+}
+
+// Validates an outputs packet and applies the LED and PWM values.
+// Returns true if the packet was valid.
+bool processOutputsPacket(uint8_t* au8_packet, size_t len)
+{
+  uint16_t u16_ledMask = 0;
+  uint8_t u8_i;
+
+  if (!isValidPacket(au8_packet, len, PACKET_OUTPUTS, OUTPUTS_PACKET_LEN))
+    return false;
+
+  // LED n is bit n of the packet. setLEDs() expects the same layout as firmware v1.0, which is the
+  // host's LED array packed into the upper bits of the 16-bit mask.
+  for (u8_i = 0; u8_i < LED_MASK_BYTES; u8_i++)
+    u16_ledMask |= ((uint16_t) au8_packet[1 + u8_i]) << (8 * u8_i);
+  setLEDs(u16_ledMask << (16 - NUM_OF_LED_OUTS));
+
+  for (u8_i = 0; u8_i < NUM_OF_PWM_OUTS; u8_i++)
+    setPWM(u8_i, au8_packet[1 + LED_MASK_BYTES + u8_i]);
+
+  return true;
+}
+
+// Returns the sequence number of a received packet, 0 if it is too short to have one.
+uint8_t getSequenceNumber(uint8_t* au8_packet, size_t len)
+{
+  return (len >= 2) ? au8_packet[len - 2] : 0;
+}
+
+// Reads the inputs and sends them to the host, answering the outputs packet with sequence number u8_sequence.
+void sendInputsPacket(uint8_t u8_sequence)
+{
+  uint8_t au8_packet[INPUTS_PACKET_LEN];
+  uint8_t u8_i;
+
+  u16_lastSwitchMask = getSwitchMask();
+  for (u8_i = 0; u8_i < NUM_OF_ANA_INS; u8_i++)
+    au8_lastAnalog[u8_i] = getAnalog(u8_i);
+
+  au8_packet[0] = PACKET_INPUTS;
+  for (u8_i = 0; u8_i < SW_MASK_BYTES; u8_i++)
+    au8_packet[1 + u8_i] = (uint8_t) (u16_lastSwitchMask >> (8 * u8_i));
+  for (u8_i = 0; u8_i < NUM_OF_ANA_INS; u8_i++)
+    au8_packet[1 + SW_MASK_BYTES + u8_i] = au8_lastAnalog[u8_i];
+  au8_packet[1 + SW_MASK_BYTES + NUM_OF_ANA_INS] = u8_sequence;
+
+  writeFrame(au8_packet, INPUTS_PACKET_LEN - 1);
+}
+
+// Sends an input delta packet if the switches changed, or an analog value moved by ANALOG_DELTA_THRESHOLD or more
+// since the last packet. Returns true if a packet was sent.
+bool sendInputDeltaPacket(uint8_t u8_sequence)
+{
+  uint8_t au8_packet[MAX_INPUT_DELTA_PACKET_LEN];
+  uint8_t au8_analogMask[ANA_MASK_BYTES];
+  uint8_t au8_analog[NUM_OF_ANA_INS];
+  uint16_t u16_switchMask = getSwitchMask();
+  bool changed = (u16_switchMask != u16_lastSwitchMask);
+  size_t len;
+  uint8_t u8_i;
+
+  memset(au8_analogMask, 0, ANA_MASK_BYTES);
+  for (u8_i = 0; u8_i < NUM_OF_ANA_INS; u8_i++) {
+    au8_analog[u8_i] = getAnalog(u8_i);
+    if (abs((int16_t) au8_analog[u8_i] - (int16_t) au8_lastAnalog[u8_i]) >= ANALOG_DELTA_THRESHOLD) {
+      au8_analogMask[u8_i / 8] |= 1 << (u8_i % 8);
+      changed = true;
+    }
+  }
+
+  if (!changed)
+    return false;
+
+  au8_packet[0] = PACKET_INPUT_DELTA;
+  for (u8_i = 0; u8_i < SW_MASK_BYTES; u8_i++)
+    au8_packet[1 + u8_i] = (uint8_t) (u16_switchMask >> (8 * u8_i));
+  memcpy(&au8_packet[1 + SW_MASK_BYTES], au8_analogMask, ANA_MASK_BYTES);
+  len = 1 + SW_MASK_BYTES + ANA_MASK_BYTES;
+  for (u8_i = 0; u8_i < NUM_OF_ANA_INS; u8_i++) {
+    if (au8_analogMask[u8_i / 8] & (1 << (u8_i % 8))) {
+      au8_packet[len++] = au8_analog[u8_i];
+      au8_lastAnalog[u8_i] = au8_analog[u8_i];
+    }
+  }
+  au8_packet[len++] = u8_sequence;
+  u16_lastSwitchMask = u16_switchMask;
+
+  writeFrame(au8_packet, len);
+  return true;
+}
+
+// Runs the binary protocol until nothing is received from the host for u16_timeout milliseconds.
+void runBinaryProtocol(uint16_t u16_timeout)
+{
+  uint8_t au8_packet[MAX_PACKET_LEN];
+  int16_t s16_packetLen;
+  uint8_t u8_sequence = 0;
+  uint8_t u8_mode = MODE_REQUEST_RESPONSE;
+  unsigned long lastRxTime = millis();
+  unsigned long lastSyncTime = millis();
+  unsigned long lastDeltaTime = millis();
+  bool valid;
+
+  resetFrameReader();
+
+  while (millis() - lastRxTime < u16_timeout) {
+    s16_packetLen = pollFrame(au8_packet, MAX_PACKET_LEN);
+
+    if (s16_packetLen != 0) {
+      lastRxTime = millis();
+      u8_sequence = getSequenceNumber(au8_packet, (size_t) s16_packetLen);
+
+      if (s16_packetLen > 0 && au8_packet[0] == PACKET_CONFIG) {
+        if (isValidPacket(au8_packet, (size_t) s16_packetLen, PACKET_CONFIG, CONFIG_PACKET_LEN))
+          u8_mode = au8_packet[1];
+        sendInputsPacket(u8_sequence);
+        lastSyncTime = millis();
+        continue;
+      }
+
+      valid = s16_packetLen > 0 && processOutputsPacket(au8_packet, (size_t) s16_packetLen);
+      setStatusLED(valid ? HIGH : LOW);
+
+      // Answer every frame with the inputs, even if the outputs packet was invalid, so the host does not time out.
+      // In delta mode, only bad packets are answered, so the host gets a full resync.
+      if (u8_mode != MODE_DELTA || !valid) {
+        sendInputsPacket(u8_sequence);
+        lastSyncTime = millis();
+      }
+    }
+
+    if (u8_mode == MODE_DELTA) {
+      if (millis() - lastSyncTime >= FULL_SYNC_PERIOD) {
+        sendInputsPacket(u8_sequence);
+        lastSyncTime = millis();
+      }
+      else if (millis() - lastDeltaTime >= INPUT_DELTA_PERIOD) {
+        if (sendInputDeltaPacket(u8_sequence))
+          lastDeltaTime = millis();
+      }
+    }
+  }
+}
@@ -0,0 +1,52 @@
+#ifndef BINARY_PROTOCOL_H
+#define BINARY_PROTOCOL_H
+
+#include <Arduino.h>
+#include <stdint.h>
+#include "hardwareMap.h"
+
+// Welcome message sent after a reset when the binary protocol is in use
+#define BINARY_WELCOME  "FRC Control Board Fw2"
+
+// Frame delimiter and escape bytes (SLIP, RFC 1055)
+#define FRAME_END       0xC0
+#define FRAME_ESC       0xDB
+#define FRAME_ESC_END   0xDC
+#define FRAME_ESC_ESC   0xDD
+
+// Packet types
+#define PACKET_OUTPUTS      0x01  // Host -> Board: LED mask, PWM values
+#define PACKET_CONFIG       0x02  // Host -> Board: protocol mode
+#define PACKET_INPUTS       0x81  // Board -> Host: Switch mask, analog values
+#define PACKET_INPUT_DELTA  0x82  // Board -> Host: Switch mask, changed analog values
+
+// Protocol modes
+#define MODE_REQUEST_RESPONSE 0x00
+#define MODE_DELTA            0x01
+
+// Delta mode timing (ms) and analog change threshold
+#define FULL_SYNC_PERIOD        100
+#define INPUT_DELTA_PERIOD      5
+#define ANALOG_DELTA_THRESHOLD  2
+
+// Packet sizes (before byte stuffing): type + data + sequence number + CRC-8
+#define LED_MASK_BYTES      ((NUM_OF_LED_OUTS + 7) / 8)
+#define SW_MASK_BYTES       ((NUM_OF_SW_INS + 7) / 8)
+#define ANA_MASK_BYTES      ((NUM_OF_ANA_INS + 7) / 8)
+#define OUTPUTS_PACKET_LEN  (1 + LED_MASK_BYTES + NUM_OF_PWM_OUTS + 1 + 1)
+#define INPUTS_PACKET_LEN   (1 + SW_MASK_BYTES + NUM_OF_ANA_INS + 1 + 1)
+#define CONFIG_PACKET_LEN   (1 + 1 + 1 + 1)
+#define MAX_INPUT_DELTA_PACKET_LEN  (1 + SW_MASK_BYTES + ANA_MASK_BYTES + NUM_OF_ANA_INS + 1 + 1)
+#define MAX_PACKET_LEN      64
+
+void resetFrameReader(void);
+int16_t pollFrame(uint8_t*, size_t);
+void writeFrame(uint8_t*, size_t);
+bool isValidPacket(uint8_t*, size_t, uint8_t, size_t);
+bool processOutputsPacket(uint8_t*, size_t);
+uint8_t getSequenceNumber(uint8_t*, size_t);
+void sendInputsPacket(uint8_t);
+bool sendInputDeltaPacket(uint8_t);
+void runBinaryProtocol(uint16_t);
+
+#endif // BINARY_PROTOCOL_H
@@ -3,6 +3,8 @@
 #include <stdlib.h>
 #include "hardwareMap.h"
 #include "crc_8.h"
+#include "binaryProtocol.h"
+#include "baudNegotiation.h"
 #include <SoftwareSerial.h>
 
 #define SERIAL_BAUD     115200
@@ -15,6 +17,9 @@
 
 #define DEBUG
 
+// Uncomment to use the binary framed protocol (firmware v2). The host must use a *_Fw2 control board type.
+//#define BINARY_PROTOCOL
+
 bool debugEnabled = false;
 
 #ifdef DEBUG
@@ -36,7 +41,11 @@ void setup()
 {
   Serial.begin(SERIAL_BAUD);
   Serial.setTimeout(SERIAL_TIMEOUT); 
+#ifdef BINARY_PROTOCOL
+  Serial.println(BINARY_WELCOME);
+#else
   Serial.println("FRC Control Board");
+#endif
 
   #ifdef DEBUG
   debugSerial.begin(115200);
@@ -56,9 +65,18 @@ void loop()
 
   establishConnection();
 
+  // The host may ask for a faster baud rate before it sends any data. Wait for the host again at the new rate.
+  if (isBaudRequestPending()) {
+    processBaudRequest();
+    return;
+  }
+
   // Enable Servo Output
   enableServos();
     
+#ifdef BINARY_PROTOCOL
+  runBinaryProtocol(SERIAL_TIMEOUT);
+#else
   // if we get a valid byte, read analog ins:
   do {
     memset(sensorStringBuffer, '\0', SENSOR_OUT_STRING_LENGTH);
@@ -68,6 +86,7 @@ void loop()
       printSensorString();
     }
   } while (u8_bytesRead > 0);
+#endif
 }
 
 void establishConnection(void) {
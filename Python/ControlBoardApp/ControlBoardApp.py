@@ -22,6 +22,8 @@ if getattr(sys, 'frozen', False):
     from ControlBoardApp.ntal import NetworkTableAbstractionLayer
     from ControlBoardApp.config import ConfigFile
     from ControlBoardApp.cbhal import ControlBoardHalInterfaceHandler
+    from ControlBoardApp.cbhal.EventBus import EventBus
+    from ControlBoardApp.cbhal.AsyncEngine import AsyncEngine
 
 else:
     # Test Mode
@@ -31,6 +33,8 @@ else:
     from ntal import NetworkTableAbstractionLayer
     from config import ConfigFile
     from cbhal import ControlBoardHalInterfaceHandler
+    from cbhal.EventBus import EventBus
+    from cbhal.AsyncEngine import AsyncEngine
 
 dictLogConfig = {
     "version": 1,
@@ -93,23 +97,46 @@ def main():
 
     # Load the selected HAL
     if app_config.get_cb_type() in cbhal_handler.get_keys():
-        cbhal_handler.init_cbtype_inst(app_config.get_cb_type())
+        cbhal_handler.init_cbtype_inst(app_config.get_cb_type(), *app_config.get_cb_binding())
     else:
         logger.error('The saved config type (%s) does not exist in %s. Picking \"%s\".' % (
         app_config.get_cb_type(), str(cbhal_handler.get_keys()), cbhal_handler.get_keys()[0]))
         default_cb_type = cbhal_handler.get_keys()[0]
-        cbhal_handler.init_cbtype_inst(default_cb_type)
+        cbhal_handler.init_cbtype_inst(default_cb_type, *app_config.get_cb_binding())
         app_config.set_cb_type(default_cb_type)
 
+    # Load the additional HALs
+    for board in app_config.get_additional_boards():
+        if not board['Name'] or board['Name'] in cbhal_handler.get_board_names():
+            logger.error('Additional control boards need a unique name. Skipping %s.' % str(board))
+        elif board['Type'] not in cbhal_handler.get_keys():
+            logger.error('The additional control board type (%s) does not exist in %s. Skipping \"%s\".' % (
+                board['Type'], str(cbhal_handler.get_keys()), board['Name']))
+        else:
+            cbhal_handler.add_board(board['Type'], board['Name'], board['Port'], board['SerialNumber'])
+
+    # Run the HALs on one asyncio event loop, if selected
+    engine = None
+    if app_config.get_hal_engine() == 'asyncio':
+        engine = AsyncEngine()
+        engine.start()
+        cbhal_handler.set_async_engine(engine)
+
     # Load NTAL
-    nt = NetworkTableAbstractionLayer(address=app_config.get_nt_server_address(), cbhal_handler=cbhal_handler)
+    nt = NetworkTableAbstractionLayer(address=app_config.get_nt_server_address(), cbhal_handler=cbhal_handler,
+                                      publish_rate=app_config.get_nt_publish_rate(),
+                                      min_flush_interval=app_config.get_nt_min_flush_interval(),
+                                      analog_flush_delta=app_config.get_nt_analog_flush_delta(),
+                                      latency_trace=app_config.get_nt_latency_trace())
+    nt.start_publisher()
 
     # Load the main window
     main_window_inst = MainWindow(cbhal_handler=cbhal_handler, nt=nt, config=app_config)
 
-    # Pass the main window's event_responder to HAL
+    # Subscribe the main window's event_responder to the HAL events
     cbhal_handler.set_main_window(main_window_inst)
-    cbhal_handler.set_event_handler(main_window_inst.event_responder)
+    cbhal_handler.subscribe(EventBus.EVENT_NEW_INPUTS, main_window_inst.event_responder)
+    cbhal_handler.subscribe(EventBus.EVENT_STATE_CHANGED, main_window_inst.event_responder)
 
     # Start HAL
     cbhal_handler.start_cbhal()
@@ -120,6 +147,9 @@ def main():
     # GUI closed, stop HAL
     if cbhal_handler.is_valid():
         cbhal_handler.shutdown_cbhal()
+    nt.stop_publisher()
+    if engine is not None:
+        engine.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,27 @@
+import sys
+
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.ControlBoardSerialBaseFw2 import ControlBoardSerialBaseFw2
+else:
+    # Test Mode
+    from cbhal.ControlBoardSerialBaseFw2 import ControlBoardSerialBaseFw2
+
+CB_SNAME = 'ArduinoUno_Fw2'
+CB_LNAME = 'Arduino Uno (Firmware v2)'
+
+
+class HardwareAbstractionLayer(ControlBoardSerialBaseFw2):
+    """
+    Arduino Uno HAL - Uses ControlBoardSerialBaseFw2
+    """
+    CB_LNAME = CB_LNAME
+    CB_SNAME = CB_SNAME
+    LED_OUTPUTS = 4
+    PWM_OUTPUTS = 1
+    ANALOG_INPUTS = 6
+    SWITCH_INPUTS = 6
+
+    # USB Identifiers
+    PID = 67
+    VID = 9025
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEngine:
+    """
+    Runs CBHAL state machines as tasks on one asyncio event loop, instead of a thread per board. The loop runs on its
+    own thread, so the GUI thread is not affected.
+
+    Serial CBHALs wait for their input frames and cycle deadlines on the event loop, so several boards share the one
+    thread and stopping a board cancels its wait right away instead of waiting out the port timeout. Resets and
+    reconnects still block, so they run in the loop's executor. Other coroutines, such as timers, can share the loop
+    with submit().
+    """
+
+    def __init__(self, name='CBHAL asyncio engine'):
+        """
+        :param name: str - name of the event loop thread
+        """
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.tasks = {}
+
+    def start(self):
+        """
+        Starts the event loop thread.
+
+        :return:
+        """
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops all the CBHALs, then the event loop thread.
+
+        :return:
+        """
+        if self.loop is None:
+            return
+        for hal in list(self.tasks):
+            hal.stop()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+    def is_running(self):
+        """
+        Returns True if the event loop thread is running.
+
+        :return: bool
+        """
+        return self.loop is not None
+
+    def run(self):
+        """
+        Event loop thread.
+
+        :return:
+        """
+        logger.debug('%s has started.' % self.name)
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        logger.debug('%s has stopped.' % self.name)
+
+    def submit(self, coroutine):
+        """
+        Schedules a coroutine on the event loop. Can be called from any thread.
+
+        :param coroutine: coroutine - the coroutine to run
+        :return: concurrent.futures.Future - the coroutine's result
+        """
+        if self.loop is None:
+            raise RuntimeError('%s is not running.' % self.name)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def start_hal(self, hal):
+        """
+        Starts a CBHAL's state machine as a task on the event loop. Used instead of hal.start().
+
+        :param hal: ControlBoardBase - the CBHAL
+        :return:
+        """
+        if hal.run_thread is True:
+            return
+        self.start()
+        hal.engine = self
+        hal.run_thread = True
+        hal.event_bus.start()
+        self.tasks[hal] = self.submit(self.create_task(hal))
+
+    async def create_task(self, hal):
+        """
+        Creates the state machine task on the event loop.
+
+        :param hal: ControlBoardBase - the CBHAL
+        :return: asyncio.Task - the task
+        """
+        return asyncio.get_running_loop().create_task(hal.async_run())
+
+    def stop_hal(self, hal):
+        """
+        Cancels a CBHAL's task and waits for it to close the port. Called by hal.stop().
+
+        :param hal: ControlBoardBase - the CBHAL
+        :return:
+        """
+        future = self.tasks.pop(hal, None)
+        if future is None or self.loop is None:
+            return
+        if threading.current_thread() is self.thread:
+            # Can not wait for the task on its own loop, it finishes once this callback returns
+            if future.done():
+                future.result().cancel()
+            return
+        self.submit(self.cancel_task(future.result())).result()
+
+    @staticmethod
+    async def cancel_task(task):
+        """
+        Cancels a task and waits for it to finish.
+
+        :param task: asyncio.Task - the task
+        :return:
+        """
+        task.cancel()
+        await asyncio.wait([task])
+
+    def get_status(self):
+        """
+        Returns the engine status.
+
+        :return: dict - Running (bool) and Tasks (number of CBHAL tasks)
+        """
+        return {'Running': self.is_running(),
+                'Tasks': len(self.tasks)}
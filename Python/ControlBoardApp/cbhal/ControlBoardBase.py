@@ -2,11 +2,22 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+import asyncio
+import collections
+import sys
 import threading
 import time
-import wx
 import traceback
 
+if getattr(sys, 'frozen', False):
+    from ControlBoardApp.cbhal.CycleScheduler import CycleScheduler
+    from ControlBoardApp.cbhal.CycleStatistics import CycleStatistics
+    from ControlBoardApp.cbhal.EventBus import EventBus
+else:
+    from cbhal.CycleScheduler import CycleScheduler
+    from cbhal.CycleStatistics import CycleStatistics
+    from cbhal.EventBus import EventBus
+
 
 ######################################################
 # ControlBoardBase exception classes
@@ -42,6 +53,18 @@ class DataIntegrityError(IOError):
 
 ######################################################
 
+class ControlBoardSnapshot(collections.namedtuple('ControlBoardSnapshot', ['led_mask', 'pwms', 'analogs',
+                                                                           'switch_mask', 'state', 'is_running',
+                                                                           'update_rate', 'cycle', 'input_time'])):
+    """
+    The state of the control board at the end of a HAL cycle. LEDs and switches are bit masks (bit n = channel n),
+    PWMs and analogs are bytes (one per channel). input_time is the perf_counter_ns() time the inputs were received
+    from the board, None if they were not. The snapshot is never modified, so a reader gets values from a single
+    cycle by reading one reference.
+    """
+    __slots__ = ()
+
+
 class ControlBoardBase:
     """ The base control board class. """
     NAME = 'Control Board Base'
@@ -51,22 +74,46 @@ class ControlBoardBase:
     ANALOG_INPUTS = 0
     SWITCH_INPUTS = 0
 
-    UPDATE_DELTA_TIME_AVERAGE_LEN = 10
+    # HAL states
+    STATE_INIT = 'Initializing'
+    STATE_CHECK_CONNECTION = 'Checking connection'
+    STATE_RESET = 'Resetting control board'
+    STATE_RESYNC = 'Resynchronizing with control board'
+    STATE_RUN = 'Running'
+    STATE_DISCONNECTED = 'Control board disconnected'
+    STATE_RECONNECTED = 'Control board connected'
+    STATE_STOP = 'Stopped'
+
+    # Number of cycle times used for the update rate and cycle statistics
+    CYCLE_STATS_WINDOW = 1000
+
+    # Target rate of the HAL run loop. None runs the loop as fast as update() returns.
+    CYCLE_RATE = None  # Hz
+    # Time before each cycle deadline spent spinning instead of sleeping, for a more precise cycle start.
+    CYCLE_BUSY_WAIT = 0.0  # second(s)
+
+    # Bit values of each byte of a bit mask, LSB first
+    BYTE_BITS = tuple(tuple(bool((byte >> bit) & 0x01) for bit in range(8)) for byte in range(256))
 
     def __init__(self):
         # Set up default variable
-        self.led_out = None
-        self.pwm_out = None
-        self.analog_in = None
-        self.switch_in = None
-        self.update_deltas = []
-        self.last_update_time = None
-        self.hal_state = 'None'
-        self.control_board_running = False
+        # LEDs and switches are bit masks (bit n = channel n), PWMs and analogs are bytes (one per channel)
+        self.led_mask = 0
+        self.pwm_out = b''
+        self.analog_in = b''
+        self.switch_mask = 0
+        self.input_time_ns = None
+        self.cycle_stats = CycleStatistics(self.CYCLE_STATS_WINDOW)
+        self.scheduler = CycleScheduler(self.CYCLE_RATE, self.CYCLE_BUSY_WAIT)
+        self.cycle_count = 0
+        self.snapshot = ControlBoardSnapshot(led_mask=0, pwms=b'', analogs=b'', switch_mask=0, state='None',
+                                             is_running=False, update_rate=None, cycle=0, input_time=None)
         self.run_thread = False
-        self.event_handler = None
+        self.last_state = self.STATE_INIT
+        self.last_error = None
+        self.engine = None
+        self.event_bus = EventBus(name='%s events' % self.NAME)
         self.thread = None
-        self.data_lock = threading.Lock()
         self.data_in = ''
         self.data_out = ''
         self.reset_values()
@@ -98,7 +145,8 @@ class ControlBoardBase:
         """
         This function is called to send new control data to the control board. 
         
-        :return: 
+        :return: bool - False if no new inputs were received, so the cycle is not counted or published; None or True
+                 otherwise
         """
         raise NotImplementedError('This function needs to be implemented!')
 
@@ -119,6 +167,27 @@ class ControlBoardBase:
 
         raise NotImplementedError('This function needs to be implemented!')
 
+    def resync(self):
+        """
+        Tries to get the data exchange back in step after a timeout, without resetting the board. Boards without a
+        soft resync return False, so they are reset.
+
+        :return: bool - True if the board answered and the HAL can keep running; False to reset the board
+        """
+        return False
+
+    def set_port_binding(self, port_name='auto', serial_number=None, location=None):
+        """
+        Binds the board to a port, a USB serial number and/or a USB location. Boards that do not use a port ignore the
+        binding.
+
+        :param port_name: str - such as COM1, or 'auto'
+        :param serial_number: str - USB serial number; None to accept any
+        :param location: str - USB location, such as 1-1.2:1.0; None to accept any
+        :return: 
+        """
+        pass
+
     def is_simulator(self):
         """
         Tells whether or not the current board is a simulator.
@@ -140,28 +209,95 @@ class ControlBoardBase:
         
         :return: 
         """
+        self.event_bus.start()
         self.run_thread = True
         self.thread = threading.Thread(target=self.run, daemon=True)
         self.thread.start()
 
     def stop(self):
         """
-        Stops the CBHAL thread.
+        Stops the CBHAL thread and the event dispatcher threads.
         
         :return: 
         """
         if self.run_thread is True:
             self.run_thread = False
-            self.thread.join()
+            if self.engine is not None:
+                self.engine.stop_hal(self)
+            else:
+                self.thread.join()
+        self.event_bus.stop()
+
+    def subscribe(self, event_type, callback):
+        """
+        Subscribes to a CBHAL event. The callback is called with the ControlBoardSnapshot that caused the event, on the
+        callback's own event dispatcher thread. If the callback falls behind, only the latest snapshot is delivered, and
+        the other subscribers are not delayed.
+        
+        :param event_type: str - EventBus.EVENT_STATE_CHANGED, EVENT_NEW_INPUTS or EVENT_OUTPUTS_CHANGED
+        :param callback: function - called with the snapshot
+        :return: EventSubscription - used to unsubscribe
+        """
+        return self.event_bus.subscribe(event_type, callback)
 
-    def set_event_handler(self, event_function):
+    def unsubscribe(self, subscription):
         """
-        Sets the event handler to process new data.
+        Removes an event subscription.
         
-        :param event_function: The function to call when new data arrives.
+        :param subscription: EventSubscription - returned by subscribe()
         :return: 
         """
-        self.event_handler = event_function
+        self.event_bus.unsubscribe(subscription)
+
+    def get_snapshot(self):
+        """
+        Returns the state of the control board at the end of the last HAL cycle. The snapshot is replaced, never
+        modified, by the HAL thread, so it can be read without a lock.
+
+        :return: ControlBoardSnapshot - the last snapshot
+        """
+        return self.snapshot
+
+    @classmethod
+    def mask_to_list(cls, mask, length):
+        """
+        Converts a bit mask to a list of bools, 8 bits at a time.
+
+        :param mask: int - bit mask, bit n = channel n
+        :param length: int - number of channels
+        :return: list(bool) - channel values
+        """
+        values = []
+        for byte_num in range(0, length, 8):
+            values.extend(cls.BYTE_BITS[(mask >> byte_num) & 0xFF])
+        del values[length:]
+        return values
+
+    @staticmethod
+    def list_to_mask(values):
+        """
+        Converts a list of channel values to a bit mask.
+
+        :param values: list - channel values, anything that converts to bool
+        :return: int - bit mask, bit n = channel n
+        """
+        mask = 0
+        for bit, value in enumerate(values):
+            if value:
+                mask |= 1 << bit
+        return mask
+
+    @staticmethod
+    def list_to_bytes(values):
+        """
+        Converts a list of channel values to bytes, limiting them to 0-255.
+
+        :param values: list - channel values, anything that converts to int
+        :return: bytes - one byte per channel
+        """
+        if isinstance(values, (bytes, bytearray)):
+            return bytes(values)
+        return bytes(min(max(int(value), 0), 255) for value in values)
 
     def getSwitchValue(self, ch):
         """
@@ -170,18 +306,23 @@ class ControlBoardBase:
         :param ch: Switch channel
         :return: bool - Switch value
         """
-        return self.getSwitchValues()[ch]
+        return bool((self.snapshot.switch_mask >> ch) & 0x01)
 
     def getSwitchValues(self):
         """
-        Returns a list of switch values.
+        Returns the switch values from the last snapshot.
         
         :return: list(bool) - Switch values
         """
-        self.data_lock.acquire()
-        data = self.switch_in
-        self.data_lock.release()
-        return data
+        return self.mask_to_list(self.snapshot.switch_mask, self.SWITCH_INPUTS)
+
+    def getSwitchMask(self):
+        """
+        Returns the switch values from the last snapshot as a bit mask.
+
+        :return: int - bit n = switch n
+        """
+        return self.snapshot.switch_mask
 
     def getAnalogValue(self, ch):
         """
@@ -190,18 +331,23 @@ class ControlBoardBase:
         :param ch: Analog channel
         :return: uint8 - Analog value
         """
-        return self.getAnalogValues()[ch]
+        return self.snapshot.analogs[ch]
 
     def getAnalogValues(self):
         """
-        Returns a list of analog values.
+        Returns the analog values from the last snapshot.
         
-        :return: list(uint8) - Analog values
+        :return: list(int) - Analog values
+        """
+        return list(self.snapshot.analogs)
+
+    def getAnalogBytes(self):
         """
-        self.data_lock.acquire()
-        data = self.analog_in
-        self.data_lock.release()
-        return data
+        Returns the analog values from the last snapshot as bytes.
+
+        :return: bytes - byte n = analog n
+        """
+        return self.snapshot.analogs
 
     def getPwmValue(self, ch):
         """
@@ -210,18 +356,23 @@ class ControlBoardBase:
         :param ch: PWM channel 
         :return: uint8 - PWM value
         """
-        return self.getPwmValues()[ch]
+        return self.pwm_out[ch]
 
     def getPwmValues(self):
         """
-        Returns a list of PWM values.
+        Returns the PWM values last programmed. These are sent to the board on the next update.
         
-        :return: list(uint8) - PWM values
+        :return: list(int) - PWM values
         """
-        self.data_lock.acquire()
-        data = self.pwm_out
-        self.data_lock.release()
-        return data
+        return list(self.pwm_out)
+
+    def getPwmBytes(self):
+        """
+        Returns the PWM values last programmed as bytes.
+
+        :return: bytes - byte n = PWM n
+        """
+        return self.pwm_out
 
     def getLedValue(self, ch):
         """
@@ -230,17 +381,22 @@ class ControlBoardBase:
         :param ch: LED channel 
         :return: bool - LED state
         """
-        return self.getLedValues()[ch]
+        return bool((self.led_mask >> ch) & 0x01)
 
     def getLedValues(self):
-        """ Returns a list of LED values. 
+        """ Returns the LED values last programmed. These are sent to the board on the next update.
         
         :return: list(bool) - LED values
         """
-        self.data_lock.acquire()
-        data = self.led_out
-        self.data_lock.release()
-        return data
+        return self.mask_to_list(self.led_mask, self.LED_OUTPUTS)
+
+    def getLedMask(self):
+        """
+        Returns the LED values last programmed as a bit mask.
+
+        :return: int - bit n = LED n
+        """
+        return self.led_mask
 
     @staticmethod
     def check_list_length(input_list, expected_length, list_type):
@@ -264,58 +420,75 @@ class ControlBoardBase:
         :return: 
         """
         self.check_list_length(led_out, self.LED_OUTPUTS, 'LED outs')
-        self.data_lock.acquire()
         try:
-            self.led_out = [bool(led) for led in led_out]
+            self.led_mask = self.list_to_mask(led_out)
         except Exception:
             logger.error('Failed to pack LED values: \n %s' % traceback.format_exc())
 
-        self.data_lock.release()
+    def putLedMask(self, led_mask):
+        """
+        Programs the LED outputs from a bit mask.
+
+        :param led_mask: int - bit n = LED n
+        :return:
+        """
+        self.led_mask = led_mask & ((1 << self.LED_OUTPUTS) - 1)
 
     def putPwmValues(self, pwm_out):
         """
-        Programs the list of PWM outputs.
+        Programs the list of PWM outputs. Values are limited to 0-255.
         
-        :param pwm_out: list - PWM outputs 
+        :param pwm_out: list or bytes - PWM outputs 
         :return: 
         """
         self.check_list_length(pwm_out, self.PWM_OUTPUTS, 'PWM outs')
-        self.data_lock.acquire()
         try:
-            self.pwm_out = [int(pwm) for pwm in pwm_out]
+            self.pwm_out = self.list_to_bytes(pwm_out)
         except Exception:
             logger.error('Failed to pack PWM values: \n %s' % traceback.format_exc())
-        self.data_lock.release()
 
     def putAnalogvalues(self, analog_in):
         """
-        Programs the list of Analog inputs.
+        Programs the list of Analog inputs. Readers see them in the next snapshot.
 
-        :param analog_in: list - Analog inputs 
+        :param analog_in: list or bytes - Analog inputs 
         :return: 
         """
         self.check_list_length(analog_in, self.ANALOG_INPUTS, 'Analog ins')
-        self.data_lock.acquire()
         try:
-            self.analog_in = [int(analog) for analog in analog_in]
+            self.analog_in = self.list_to_bytes(analog_in)
         except Exception:
             logger.error('Failed to pack analog values: \n %s' % traceback.format_exc())
-        self.data_lock.release()
 
     def putSwitchvalues(self, switch_in):
         """
-        Programs the list of Switch inputs.
+        Programs the list of Switch inputs. Readers see them in the next snapshot.
 
         :param switch_in: list - Switch inputs 
         :return: 
         """
         self.check_list_length(switch_in, self.SWITCH_INPUTS, 'Switch ins')
-        self.data_lock.acquire()
         try:
-            self.switch_in = [bool(switch) for switch in switch_in]
+            self.switch_mask = self.list_to_mask(switch_in)
         except Exception:
             logger.error('Failed to pack switch values: \n %s' % traceback.format_exc())
-        self.data_lock.release()
+
+    def putSwitchMask(self, switch_mask):
+        """
+        Programs the Switch inputs from a bit mask. Readers see them in the next snapshot.
+
+        :param switch_mask: int - bit n = switch n
+        :return:
+        """
+        self.switch_mask = switch_mask & ((1 << self.SWITCH_INPUTS) - 1)
+
+    def record_input_time(self):
+        """
+        Records that new inputs were received from the board. Used to trace the input latency.
+
+        :return:
+        """
+        self.input_time_ns = time.perf_counter_ns()
 
     def reset_values(self):
         """
@@ -324,189 +497,392 @@ class ControlBoardBase:
         :return: 
         """
         logger.debug('Resetting the control board variables')
-        self.data_lock.acquire()
-        self.led_out = [False] * self.LED_OUTPUTS
-        self.pwm_out = [int(0)] * self.PWM_OUTPUTS
-        self.analog_in = [int(0)] * self.ANALOG_INPUTS
-        self.switch_in = [False] * self.SWITCH_INPUTS
-        self.update_deltas = []
-        self.last_update_time = None
+        self.led_mask = 0
+        self.pwm_out = bytes(self.PWM_OUTPUTS)
+        self.analog_in = bytes(self.ANALOG_INPUTS)
+        self.switch_mask = 0
+        self.input_time_ns = None
+        self.cycle_stats.reset()
+        self.scheduler.reset()
         self.data_in = ''
         self.data_out = ''
-        self.data_lock.release()
+        self.publish_snapshot(self.snapshot.state, self.snapshot.is_running)
+        self.event_bus.publish(EventBus.EVENT_NEW_INPUTS, self.snapshot)
+
+    def publish_snapshot(self, state, is_running):
+        """
+        Replaces the snapshot with the current values. Called by the HAL thread at the end of each cycle. Publishes
+        the state changed and outputs changed events if they differ from the last snapshot.
 
-        self.trigger_event()
+        :param state: str - HAL state
+        :param is_running: bool - True if the control board is running
+        :return: 
+        """
+        last_snapshot = self.snapshot
+        snapshot = ControlBoardSnapshot(led_mask=self.led_mask,
+                                        pwms=self.pwm_out,
+                                        analogs=self.analog_in,
+                                        switch_mask=self.switch_mask,
+                                        state=state,
+                                        is_running=is_running,
+                                        update_rate=self.calc_update_rate(),
+                                        cycle=self.cycle_count,
+                                        input_time=self.input_time_ns)
+        self.snapshot = snapshot
+
+        if snapshot.state != last_snapshot.state or snapshot.is_running != last_snapshot.is_running:
+            self.event_bus.publish(EventBus.EVENT_STATE_CHANGED, snapshot)
+        if snapshot.led_mask != last_snapshot.led_mask or snapshot.pwms != last_snapshot.pwms:
+            self.event_bus.publish(EventBus.EVENT_OUTPUTS_CHANGED, snapshot)
 
     def getUpdateRate(self):
         """
-        Returns the rate of update. None if not ready.
+        Returns the rate of update from the last snapshot. None if not ready.
         :return: float - update rate; None if not ready.
         """
-        self.data_lock.acquire()
-        update_deltas = self.update_deltas
-        self.data_lock.release()
-        if len(update_deltas) is self.UPDATE_DELTA_TIME_AVERAGE_LEN:
-            avg_delta = sum(update_deltas) / len(update_deltas)
-        else:
-            avg_delta = None
+        return self.snapshot.update_rate
 
-        if avg_delta is not None and avg_delta > 0:
-            return 1.0 / avg_delta
-        else:
-            return None
+    def calc_update_rate(self):
+        """
+        Calculates the mean rate of update over the cycle statistics window. None if not ready.
+        :return: float - update rate; None if not ready.
+        """
+        return self.cycle_stats.get_rate()
+
+    def get_cycle_statistics(self):
+        """
+        Returns the cycle time statistics over the cycle statistics window: rate, mean, p50/p95/p99, max and jitter.
+        Calculated on the caller's thread.
+        :return: dict - cycle statistics, see CycleStatistics.get_statistics()
+        """
+        return self.cycle_stats.get_statistics()
+
+    def set_cycle_statistics_window(self, window):
+        """
+        Changes the number of cycles used for the update rate and cycle statistics. Clears the recorded cycle times.
+        Safe to call while the HAL is running.
+        :param window: int - number of cycles
+        :return:
+        """
+        self.cycle_stats.set_window(window)
+
+    def set_cycle_rate(self, cycle_rate, busy_wait=None):
+        """
+        Changes the target rate of the HAL run loop.
+        :param cycle_rate: float - target rate in Hz; None to run as fast as the board answers
+        :param busy_wait: float - seconds before each cycle deadline to spin instead of sleep; None to keep the current
+                          setting
+        :return:
+        """
+        self.scheduler.set_cycle_rate(cycle_rate)
+        if busy_wait is not None:
+            self.scheduler.set_busy_wait(busy_wait)
 
     def is_control_board_running(self):
         """
         Returns if the control board is actively running
         :return: bool - running state
         """
-        self.data_lock.acquire()
-        control_board_running = self.control_board_running
-        self.data_lock.release()
-        return control_board_running
+        return self.snapshot.is_running
 
     def get_hal_state(self):
         """
         Returns the HAL state
         :return: str - HAL state
         """
-        self.data_lock.acquire()
-        state = str(self.hal_state)
-        self.data_lock.release()
-        return state
+        return str(self.snapshot.state)
 
     def get_status(self):
         """
-        Returns a dictionary of status information
+        Returns a dictionary of status information, all from the same snapshot
         :return: dict - status
         """
-        return {'LEDs': self.getLedValues(),
-                'PWMs': self.getPwmValues(),
-                'ANAs': self.getAnalogValues(),
-                'SWs': self.getSwitchValues(),
-                'State': self.get_hal_state(),
-                'IsRunning': self.is_control_board_running(),
-                'UpdateRate': self.getUpdateRate()}
+        snapshot = self.snapshot
+        return {'LEDs': self.mask_to_list(snapshot.led_mask, self.LED_OUTPUTS),
+                'PWMs': list(snapshot.pwms),
+                'ANAs': list(snapshot.analogs),
+                'SWs': self.mask_to_list(snapshot.switch_mask, self.SWITCH_INPUTS),
+                'State': snapshot.state,
+                'IsRunning': snapshot.is_running,
+                'UpdateRate': snapshot.update_rate,
+                'Cycle': snapshot.cycle,
+                'CycleStats': self.get_cycle_statistics(),
+                'Scheduler': self.scheduler.get_status(),
+                'Events': self.event_bus.get_status()}
 
-    def trigger_event(self):
+    def get_cycle_deadline(self):
         """
-        Invokes the event handler.
-        :return: 
+        Moves the scheduler on to the next HAL cycle and returns the time it should start.
+
+        :return: int - perf_counter_ns() time to start the cycle at; None to start it now
+        """
+        return self.scheduler.next_deadline()
+
+    def wait_for_cycle(self):
         """
-        if self.event_handler is not None:
-            self.event_handler()
+        Waits for the start of the next HAL cycle, as set by the cycle rate.
+
+        :return:
+        """
+        self.scheduler.wait_until(self.get_cycle_deadline())
+
+    def finish_cycle(self):
+        """
+        Counts a completed HAL cycle, then publishes its snapshot and the new inputs event.
+
+        :return:
+        """
+        self.cycle_count += 1
+        self.calc_time_since_last_update()
+        self.publish_snapshot(self.STATE_RUN, True)
+        self.event_bus.publish(EventBus.EVENT_NEW_INPUTS, self.snapshot)
 
     def calc_time_since_last_update(self):
         """
-        Calculates the time since the last update. Used to calculate the update rate. 
+        Records the time since the last update in the cycle statistics. Used to calculate the update rate. 
         
         :return: 
         """
-        cur_time = time.time()
-        self.data_lock.acquire()
-        if self.last_update_time is not None:
-            self.update_deltas.append(cur_time - self.last_update_time)
-        self.last_update_time = cur_time
-        if len(self.update_deltas) > self.UPDATE_DELTA_TIME_AVERAGE_LEN:
-            self.update_deltas.pop(0)
-        self.data_lock.release()
+        self.cycle_stats.record()
+
+    def start_state_machine(self):
+        """
+        Prepares the state machine shared by run() and async_run().
+
+        :return: str - the first state, STATE_INIT
+        """
+        self.last_state = self.STATE_INIT
+        self.last_error = None
+        return self.STATE_INIT
+
+    def enter_state(self, state):
+        """
+        Returns the state the state machine runs next, STATE_STOP once the CBHAL has been stopped. Logs and publishes
+        state changes.
+
+        :param state: str - the state selected by the last step
+        :return: str - the state to run
+        """
+        if self.run_thread is False:
+            state = self.STATE_STOP
+
+        # Debug
+        if state is not self.last_state:
+            logger.debug('HAL mode switch: %s -> %s' % (self.last_state, state))
+            self.last_state = state
+
+        if state is not self.snapshot.state:
+            self.publish_snapshot(state, state is self.STATE_RUN or state is self.STATE_RESYNC)
+        return state
+
+    def complete_state(self, state, result=None):
+        """
+        Returns the state that follows a state whose I/O completed. The I/O of each state is done by the engine:
+        reset_board() for STATE_RESET, resync() for STATE_RESYNC, a cycle wait and update() for STATE_RUN, reconnect()
+        for STATE_DISCONNECTED and disconnect() for STATE_STOP.
+
+        :param state: str - the state that ran
+        :param result: the return value of the state's I/O
+        :return: str - the next state; None once the state machine has stopped
+        """
+        if state is self.STATE_RUN:
+            # A cycle without new inputs is not published
+            if result is not False:
+                self.finish_cycle()
+            next_state = self.STATE_RUN
+
+        elif state is self.STATE_INIT:
+            next_state = self.STATE_DISCONNECTED
+
+        elif state is self.STATE_CHECK_CONNECTION:
+            next_state = self.STATE_RESET if self.is_connected() else self.STATE_DISCONNECTED
+
+        elif state is self.STATE_RESET:
+            self.reset_values()
+            next_state = self.STATE_RUN
+
+        elif state is self.STATE_RESYNC:
+            next_state = self.STATE_RUN if result else self.STATE_RESET
+
+        elif state is self.STATE_DISCONNECTED:
+            next_state = self.STATE_RECONNECTED
+
+        elif state is self.STATE_RECONNECTED:
+            logger.info('Control board connected.')
+            next_state = self.STATE_CHECK_CONNECTION
+
+        else:
+            next_state = None
+
+        self.last_error = None
+        return next_state
+
+    def fail_state(self, state, error):
+        """
+        Returns the state that follows a state that raised an error. Each different error is only logged once. Must
+        be called from the except block that caught the error.
+
+        :param state: str - the state that failed
+        :param error: Exception - the error
+        :return: str - the next state
+        """
+        if isinstance(error, ConnectionFailed):
+            if str(error) != str(self.last_error):
+                logger.warning(traceback.format_exc())
+                self.last_error = error
+            return self.STATE_DISCONNECTED
+        elif isinstance(error, ConnectionTimeout):
+            logger.warning(error)
+            # A timeout while running is first handled with a soft resync
+            return self.STATE_RESYNC if state is self.STATE_RUN else self.STATE_RESET
+        elif isinstance(error, DataIntegrityError):
+            if str(error) != str(self.last_error):
+                logger.warning(traceback.format_exc())
+                self.last_error = error
+        elif isinstance(error, KeyboardInterrupt):
+            logger.debug('Keyboard Interrupt')
+            return self.STATE_STOP
+        elif str(error) != str(self.last_error):
+            logger.error(traceback.format_exc())
+            self.last_error = error
+        return state
+
+    def run_cycle(self):
+        """
+        Runs one HAL cycle: waits for the start of the cycle, then updates the board.
+
+        :return: bool - the return value of update()
+        """
+        self.wait_for_cycle()
+        return self.update()
 
     def run(self):
-        """ Main CBHAL run thread.
+        """ Main CBHAL run thread. The state transitions are shared with async_run(), only the I/O blocks here.
         
         :return: 
         """
-        last_error = None
-        run_state_machine = True
+        state_io = {self.STATE_RESET: self.reset_board,
+                    self.STATE_RESYNC: self.resync,
+                    self.STATE_RUN: self.run_cycle,
+                    self.STATE_DISCONNECTED: self.reconnect,
+                    self.STATE_STOP: self.disconnect}
+        state = self.start_state_machine()
+
+        logger.debug('HAL state machine has started.')
+
+        while state is not None:
+            state = self.enter_state(state)
+            try:
+                io = state_io.get(state)
+                state = self.complete_state(state, io() if io is not None else None)
+            except (Exception, KeyboardInterrupt) as e:
+                state = self.fail_state(state, e)
+        logger.debug('HAL state machine has stopped.')
+
+    ######################################################
+    # asyncio engine
+
+    async def run_blocking(self, function):
+        """
+        Runs a blocking function in the event loop's executor. If the task is cancelled, the function is allowed to
+        finish first, so the port is never closed while it is in use.
 
-        # States:
-        STATE_INIT = 'Initializing'
-        STATE_CHECK_CONNECTION = 'Checking connection'
-        STATE_RESET = 'Resetting control board'
-        STATE_RUN = 'Running'
-        STATE_DISCONNECTED = 'Control board disconnected'
-        STATE_RECONNECTED = 'Control board connected'
-        STATE_STOP = 'Stopped'
+        :param function: function - called with no arguments
+        :return: the function's return value
+        """
+        job = asyncio.get_running_loop().run_in_executor(None, function)
+        try:
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            await asyncio.wait([job])
+            raise
 
-        last_state = STATE_INIT
-        state = STATE_INIT
+    async def async_update(self):
+        """
+        asyncio version of update(). Runs update() in the executor, for boards that can not wait on the event loop.
 
-        logger.debug('HAL state machine has started.')
+        :return: bool - the return value of update()
+        """
+        return await self.run_blocking(self.update)
+
+    async def async_reset_board(self):
+        """
+        asyncio version of reset_board(). Resets only happen after errors, so reset_board() runs in the executor.
+
+        :return:
+        """
+        await self.run_blocking(self.reset_board)
 
-        while run_state_machine:
-            # Stop case
-            if self.run_thread is False:
-                state = STATE_STOP
+    async def async_resync(self):
+        """
+        asyncio version of resync(). Runs resync() in the executor.
 
-            # Debug
-            if state is not last_state:
-                self.trigger_event()
-                logger.debug('HAL mode switch: %s -> %s' % (last_state, state))
-                last_state = state
+        :return: bool - True if the HAL can keep running; False to reset the board
+        """
+        return await self.run_blocking(self.resync)
 
-            # State machine
+    async def async_reconnect(self):
+        """
+        asyncio version of reconnect(). Runs reconnect() in the executor.
+
+        :return:
+        """
+        await self.run_blocking(self.reconnect)
+
+    async def async_wait_for_cycle(self):
+        """
+        asyncio version of wait_for_cycle(). Sleeps on the event loop, without the busy wait.
+
+        :return:
+        """
+        deadline_ns = self.get_cycle_deadline()
+        if deadline_ns is None:
+            # Still let the other tasks run when free running
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(max(deadline_ns - time.perf_counter_ns(), 0) / 1e9)
+
+    async def async_run_cycle(self):
+        """
+        asyncio version of run_cycle().
+
+        :return: bool - the return value of async_update()
+        """
+        await self.async_wait_for_cycle()
+        return await self.async_update()
+
+    async def async_disconnect(self):
+        """
+        asyncio version of disconnect(). Closing the port does not block, so disconnect() runs on the event loop.
+
+        :return:
+        """
+        self.disconnect()
+
+    async def async_run(self):
+        """ asyncio version of the CBHAL state machine, run by AsyncEngine. The state transitions are shared with
+        run(), only the I/O is awaited here. Cancelling the task stops the state machine and closes the port.
+        
+        :return: 
+        """
+        state_io = {self.STATE_RESET: self.async_reset_board,
+                    self.STATE_RESYNC: self.async_resync,
+                    self.STATE_RUN: self.async_run_cycle,
+                    self.STATE_DISCONNECTED: self.async_reconnect,
+                    self.STATE_STOP: self.async_disconnect}
+        state = self.start_state_machine()
+
+        logger.debug('HAL state machine task has started.')
+
+        while state is not None:
+            state = self.enter_state(state)
             try:
-                if state is STATE_INIT:
-                    # self.is_connected()
-                    # state = STATE_CHECK_CONNECTION
-                    state = STATE_DISCONNECTED
-
-                elif state is STATE_CHECK_CONNECTION:
-                    if self.is_connected():
-                        state = STATE_RESET
-                    else:
-                        state = STATE_DISCONNECTED
-
-                elif state is STATE_RESET:
-                    self.reset_board()
-                    self.reset_values()
-                    state = STATE_RUN
-
-                elif state is STATE_RUN:
-                    self.update()
-                    self.calc_time_since_last_update()
-                    self.trigger_event()
-                    state = STATE_RUN
-
-                elif state is STATE_DISCONNECTED:
-                    self.reconnect()
-                    state = STATE_RECONNECTED
-
-                elif state is STATE_RECONNECTED:
-                    logger.info('Control board connected.')
-                    state = STATE_CHECK_CONNECTION
-
-                elif state is STATE_STOP:
-                    self.disconnect()
-                    run_state_machine = False
-                    state = STATE_STOP
-
-                last_error = None
-
-            except ConnectionFailed as e:
-                if str(e) != str(last_error):
-                    logger.warning(traceback.format_exc())
-                    last_error = e
-                state = STATE_DISCONNECTED
-            except ConnectionTimeout as e:
-                logger.warning(e)
-                state = STATE_RESET
-            except DataIntegrityError as e:
-                if str(e) != str(last_error):
-                    logger.warning(traceback.format_exc())
-                    last_error = e
-            except KeyboardInterrupt:
-                if str(e) != str(last_error):
-                    logger.debug('Keyboard Interrupt')
-                    last_error = e
-                state = STATE_STOP
+                io = state_io.get(state)
+                state = self.complete_state(state, await io() if io is not None else None)
+            except asyncio.CancelledError:
+                # Stopped by the engine. Close the port on the way out.
+                self.run_thread = False
+                state = self.STATE_STOP
             except Exception as e:
-                if str(e) != str(last_error):
-                    logger.error(traceback.format_exc())
-                    last_error = e
-
-            self.data_lock.acquire()
-            self.control_board_running = state is STATE_RUN
-            self.hal_state = state
-            self.data_lock.release()
-        logger.debug('HAL state machine has stopped.')
+                state = self.fail_state(state, e)
+        logger.debug('HAL state machine task has stopped.')
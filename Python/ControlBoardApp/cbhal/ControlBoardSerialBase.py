@@ -1,6 +1,8 @@
+import asyncio
+import io
 import logging
 import serial
-import serial.tools.list_ports as lp
+import threading
 import time
 import sys
 
@@ -10,9 +12,15 @@ if getattr(sys, 'frozen', False):
     # Normal Mode
     from ControlBoardApp.cbhal.ControlBoardBase import ControlBoardBase, ConnectionFailed, ConnectionTimeout, \
         DataIntegrityError
+    from ControlBoardApp.cbhal.Crc8MaximTable import Crc8MaximTable
+    from ControlBoardApp.cbhal.HotplugWatcher import HotplugWatcher
+    from ControlBoardApp.cbhal.SerialPortIndex import SerialPortIndex
 else:
     # Test Mode
     from cbhal.ControlBoardBase import ControlBoardBase, ConnectionFailed, ConnectionTimeout, DataIntegrityError
+    from cbhal.Crc8MaximTable import Crc8MaximTable
+    from cbhal.HotplugWatcher import HotplugWatcher
+    from cbhal.SerialPortIndex import SerialPortIndex
 
 
 class ControlBoardSerialBase(ControlBoardBase):
@@ -20,21 +28,89 @@ class ControlBoardSerialBase(ControlBoardBase):
     NAME = 'Control Board Serial Base'
     BAUD_RATE = 0
 
+    # Class used to open the port. Replaced by the firmware emulator, which cannot reset a pseudo-terminal with DTR.
+    SERIAL_CLASS = serial.Serial
+
+    # Baud rates to ask the board for after its welcome message, highest first. The board always starts at BAUD_RATE.
+    NEGOTIATED_BAUD_RATES = ()
+    # Data integrity errors in a row at a negotiated baud rate before falling back to a lower one
+    MAX_BAUD_RATE_ERRORS = 5
+    # second(s), how long to wait for the answer to the first baud rate request. Firmware without negotiation may not
+    # answer at all.
+    BAUD_PROBE_TIMEOUT = 0.25
+
+    # Soft resync after a timeout, before falling back to a DTR reset
+    RESYNC_TIMEOUT = 0.1  # second(s), how long to wait for the board to answer a resync
+    MAX_RESYNCS_IN_ROW = 3  # soft resyncs without good data in between before the board is reset instead
+
+    # Size of the receive buffer. Must be longer than any frame.
+    RX_BUFFER_SIZE = 512  # bytes
+
+    # Terminator of the frames the board sends its inputs in
+    INPUT_TERMINATOR = b'\n'
+
+    # asyncio engine: how often to poll the port when the event loop can not watch it, such as on Windows
+    ASYNC_POLL_PERIOD = 1e-3  # second(s)
+
+    # Spin for the last part of each cycle wait, so the outputs go out on time
+    CYCLE_BUSY_WAIT = 300e-6  # second(s)
+
+    # Ports opened by any serial control board, port name to the board that has it open. With several boards
+    # connected, a board set to auto only picks a port that no other board has claimed.
+    claimed_ports = {}
+    port_claim_lock = threading.Lock()
+
+    # Cached list of the serial ports, shared by all the serial boards
+    port_index = SerialPortIndex()
+
     def __init__(self, port_name, baud_rate, timeout, pid=None, vid=None):
         """
 
-        :param port_name: str - such as COM1. None for Auto
+        :param port_name: str - such as COM1. 'auto' to pick the first unclaimed port with the PID and VID
         :param baud_rate: int - the baud rate of the serial connection
         :param timeout: int - timeout in seconds
         :param pid: - USB PID
         :param vid: - USB VID
         """
         self.port_name = port_name
+        self.serial_number = None
+        self.location = None
+        self.claimed_port_name = None
         self.baud_rate = baud_rate
         self.timeout = timeout
         self.pid = pid
         self.vid = vid
         self.port = None
+
+        # Receive buffer. Received data is rx_buffer[rx_start:rx_end].
+        self.rx_buffer = bytearray(self.RX_BUFFER_SIZE)
+        self.rx_view = memoryview(self.rx_buffer)
+        self.rx_start = 0
+        self.rx_end = 0
+
+        # Baud rate negotiation. None until the board answers its first baud rate request on this connection.
+        self.failed_baud_rates = set()
+        self.baud_negotiation_supported = None
+        self.data_errors_in_row = 0
+
+        # Recovery after timeouts. Every timeout while running starts a soft resync; the ones that fail, or are
+        # escalated, end in a hard (DTR) reset.
+        self.resyncs_in_row = 0
+        self.recovery_counters = {'SoftResyncs': 0,
+                                  'SoftResyncFailures': 0,
+                                  'Escalations': 0,
+                                  'HardResets': 0}
+
+        # Last encoded output frame, reused while the outputs do not change
+        self.encoded_led_out = None
+        self.encoded_pwm_out = None
+        self.encoded_frame = None
+        self.frame_cache_hits = 0
+        self.frame_cache_misses = 0
+
+        # Decides when to try to reconnect after the board is lost
+        self.hotplug = HotplugWatcher()
+
         super(ControlBoardSerialBase, self).__init__()
 
         # Log the USB PIDs and VIDs at startup. Only used for debugging purposes.
@@ -50,12 +126,217 @@ class ControlBoardSerialBase(ControlBoardBase):
 
     def update(self):
         """
-        Used to update the board. 
-        
-        :return: 
+        Updates the board. Sends the outputs, then passes the next input frame, or None if none completed within
+        get_input_timeout(), to receive_inputs().
+
+        :return: bool - the return value of receive_inputs(), False if no new inputs were received
+        """
+        self.send_outputs()
+        self.set_port_timeout(self.get_input_timeout())
+        return self.receive_inputs(self.poll_frame(self.INPUT_TERMINATOR))
+
+    def send_outputs(self):
+        """
+        Used to write the outputs to the board, first half of update().
+
+        :return:
+        """
+        raise NotImplementedError('This function needs to be implemented in the child class!')
+
+    def receive_inputs(self, frame):
+        """
+        Used to apply an input frame from the board, second half of update().
+
+        :param frame: memoryview - frame data without the terminator, or None if no frame was completed in time
+        :return:
+        """
+        raise NotImplementedError('This function needs to be implemented in the child class!')
+
+    def get_input_timeout(self):
+        """
+        Returns how long update() waits for an input frame.
+
+        :return: float - timeout in seconds
+        """
+        return self.timeout
+
+    ######################################################
+    # asyncio engine
+
+    async def async_update(self):
+        """
+        asyncio version of update(). Waits for the input frame on the event loop instead of blocking in the port read.
+
+        :return: bool - the return value of receive_inputs(), False if no new inputs were received
+        """
+        self.send_outputs()
+        return self.receive_inputs(await self.async_poll_frame(self.INPUT_TERMINATOR, self.get_input_timeout()))
+
+    async def async_reset_board(self):
+        """
+        asyncio version of reset_board(). The reset runs in the executor, then the port is made non-blocking so the
+        event loop does the waiting.
+
+        :return:
+        """
+        self.set_port_timeout(self.timeout)
+        await self.run_blocking(self.reset_board)
+        self.set_port_timeout(0)
+
+    async def async_poll_frame(self, terminator, timeout):
+        """
+        asyncio version of poll_frame(). The port timeout must be 0.
+
+        :param terminator: bytes - the frame terminator
+        :param timeout: float - seconds to wait for the frame
+        :return: memoryview - frame data without the terminator, or None if no frame was completed. Only valid until
+                 the next read.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            frame = self.receive_frame(terminator)
+            if frame is not None:
+                return frame
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            await self.async_wait_readable(remaining)
+
+    async def async_wait_readable(self, timeout):
+        """
+        Waits until the port has data to read, or the timeout expires. Uses the event loop to watch the port's file
+        descriptor where it can, otherwise sleeps for ASYNC_POLL_PERIOD. Windows ports have no file descriptor, and
+        the default Windows event loop can not watch one, so they always poll.
+
+        :param timeout: float - seconds to wait at most
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+
+        def set_readable():
+            if not readable.done():
+                readable.set_result(None)
+
+        try:
+            fd = self.port.fileno()
+            loop.add_reader(fd, set_readable)
+        except serial.SerialException as e:
+            raise ConnectionFailed(e)
+        except (AttributeError, NotImplementedError, io.UnsupportedOperation):
+            await asyncio.sleep(min(timeout, self.ASYNC_POLL_PERIOD))
+            return
+
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
+
+    def pack_frame(self, led_mask, pwm_values):
+        """
+        Used to encode the outputs into the bytes written to the board.
+
+        :param led_mask: int - LED values, bit n = LED n
+        :param pwm_values: bytes - PWM values, one per channel
+        :return: the encoded frame, usually bytes
         """
         raise NotImplementedError('This function needs to be implemented in the child class!')
 
+    def encode_outputs(self, led_mask, pwm_values):
+        """
+        Returns the encoded frame for the outputs. The last frame (and its CRC) is reused if the outputs have not
+        changed since it was encoded, which is the common case.
+
+        :param led_mask: int - LED values, as returned by getLedMask()
+        :param pwm_values: bytes - PWM values, as returned by getPwmBytes()
+        :return: the encoded frame from pack_frame
+        """
+        if self.encoded_frame is not None and led_mask == self.encoded_led_out and pwm_values == self.encoded_pwm_out:
+            self.frame_cache_hits += 1
+        else:
+            self.frame_cache_misses += 1
+            self.encoded_frame = self.pack_frame(led_mask, pwm_values)
+            self.encoded_led_out = led_mask
+            self.encoded_pwm_out = pwm_values
+        return self.encoded_frame
+
+    def get_frame_cache_stats(self):
+        """
+        Returns the output frame cache counters.
+
+        :return: dict - Hits, Misses and HitRate (0.0 - 1.0, None before the first frame)
+        """
+        hits = self.frame_cache_hits
+        misses = self.frame_cache_misses
+        return {'Hits': hits,
+                'Misses': misses,
+                'HitRate': hits / (hits + misses) if hits + misses > 0 else None}
+
+    def get_status(self):
+        """
+        Returns a dictionary of status information, including the output frame cache counters.
+        :return: dict - status
+        """
+        status = super(ControlBoardSerialBase, self).get_status()
+        status.update({'FrameCache': self.get_frame_cache_stats(),
+                       'BaudRate': self.port.baudrate if self.port is not None else None,
+                       'Port': self.claimed_port_name,
+                       'Reconnect': self.hotplug.get_status(),
+                       'PortIndex': self.port_index.get_status(),
+                       'Recovery': dict(self.recovery_counters)})
+        return status
+
+    def set_port_binding(self, port_name='auto', serial_number=None, location=None):
+        """
+        Binds the board to a port, a USB serial number, a USB location, or a mix. Takes effect on the next connection.
+
+        :param port_name: str - such as COM1. 'auto' to pick the first unclaimed port with the PID and VID
+        :param serial_number: str - USB serial number of the board; None to accept any
+        :param location: str - USB location (hub port) of the board, such as 1-1.2:1.0; None to accept any
+        :return:
+        """
+        self.port_name = port_name if port_name else 'auto'
+        self.serial_number = serial_number if serial_number else None
+        self.location = location if location else None
+
+    def claim_port(self, port_name):
+        """
+        Claims a port for this board, so no other board opens it.
+
+        :param port_name: str - port name
+        :return:
+        """
+        with self.port_claim_lock:
+            owner = self.claimed_ports.get(port_name)
+            if owner is not None and owner is not self:
+                raise ConnectionFailed('%s is already in use by another control board.' % port_name)
+            self.claimed_ports[port_name] = self
+            self.claimed_port_name = port_name
+
+    def release_port(self):
+        """
+        Releases the port claimed by this board, if any.
+
+        :return:
+        """
+        with self.port_claim_lock:
+            if self.claimed_ports.get(self.claimed_port_name) is self:
+                del self.claimed_ports[self.claimed_port_name]
+            self.claimed_port_name = None
+
+    def is_port_claimed(self, port_name):
+        """
+        Returns True if another board has claimed the port.
+
+        :param port_name: str - port name
+        :return: bool
+        """
+        owner = self.claimed_ports.get(port_name)
+        return owner is not None and owner is not self
+
     def flush_input(self):
         """
         Flushes the serial input. 
@@ -64,37 +345,298 @@ class ControlBoardSerialBase(ControlBoardBase):
         """
         try:
             self.port.flushInput()
+            self.rx_start = 0
+            self.rx_end = 0
+        except serial.SerialException as e:
+            raise ConnectionFailed(e)
+
+    def set_port_timeout(self, timeout):
+        """
+        Changes the read timeout of the open serial port.
+
+        :param timeout: float - timeout in seconds
+        :return:
+        """
+        try:
+            if self.port.timeout != timeout:
+                self.port.timeout = timeout
         except serial.SerialException as e:
             raise ConnectionFailed(e)
 
+    def set_baud_rate(self, baud_rate):
+        """
+        Changes the baud rate of the open serial port.
+
+        :param baud_rate: int - the baud rate
+        :return:
+        """
+        try:
+            if self.port.baudrate != baud_rate:
+                self.port.baudrate = baud_rate
+        except (serial.SerialException, ValueError) as e:
+            raise ConnectionFailed(e)
+
+    def request_baud_rate(self, baud_rate):
+        """
+        Sends a baud rate request to the board and reads its reply, at the current baud rate.
+
+        :param baud_rate: int - the baud rate to ask for
+        :return: int - the baud rate the board accepted, 0 if it refused
+        """
+        request = 'BAUD:%d;' % baud_rate
+        self.write_frame((request + 'CRC:%d;\r\n' % Crc8MaximTable.calc(request.encode(), 0)).encode())
+
+        reply = self.read_line()
+        data, tag, crc = reply.partition('CRC:')
+        if not tag or not data.startswith('BAUD:') or crc.rstrip('\r\n;') != str(Crc8MaximTable.calc(data.encode(), 0)):
+            raise DataIntegrityError('Invalid baud rate reply: %r' % reply)
+        try:
+            return int(data[len('BAUD:'):].rstrip(';'))
+        except ValueError:
+            raise DataIntegrityError('Invalid baud rate reply: %r' % reply)
+
+    def negotiate_baud_rate(self):
+        """
+        Switches to the highest rate in NEGOTIATED_BAUD_RATES the board accepts and that has not failed before. Must be
+        called right after the welcome message.
+
+        The new rate is checked by repeating the request at that rate. If the check fails, the rate is not used again
+        and ConnectionTimeout is raised, so the board is reset and the next rate down is tried.
+
+        Firmware without negotiation answers the first request with an inputs line (the v1.0 sketch), or not at all
+        (the first v2 firmware, which waits for the end of the frame). The board then stays at BAUD_RATE, and
+        negotiation is not tried again until the port is reconnected.
+
+        :return: int - the baud rate in use
+        """
+        if self.baud_negotiation_supported is False:
+            return self.BAUD_RATE
+
+        for baud_rate in self.NEGOTIATED_BAUD_RATES:
+            if baud_rate in self.failed_baud_rates:
+                continue
+
+            port_timeout = self.port.timeout
+            try:
+                if self.baud_negotiation_supported is None:
+                    self.set_port_timeout(self.BAUD_PROBE_TIMEOUT)
+                accepted_baud_rate = self.request_baud_rate(baud_rate)
+            except (ConnectionTimeout, DataIntegrityError) as e:
+                if self.baud_negotiation_supported:
+                    raise
+                logger.info('The control board does not support baud rate negotiation, staying at %d baud (%s)' %
+                            (self.BAUD_RATE, e))
+                self.baud_negotiation_supported = False
+                self.discard_baud_request()
+                return self.BAUD_RATE
+            finally:
+                self.set_port_timeout(port_timeout)
+            self.baud_negotiation_supported = True
+
+            if accepted_baud_rate != baud_rate:
+                logger.info('The control board refused %d baud' % baud_rate)
+                self.failed_baud_rates.add(baud_rate)
+                continue
+
+            self.set_baud_rate(baud_rate)
+            try:
+                verified = self.request_baud_rate(baud_rate) == baud_rate
+            except (ConnectionTimeout, DataIntegrityError):
+                verified = False
+
+            if not verified:
+                self.failed_baud_rates.add(baud_rate)
+                raise ConnectionTimeout('The link failed the check at %d baud. Falling back.' % baud_rate)
+
+            logger.info('Negotiated %d baud with the control board' % baud_rate)
+            return baud_rate
+
+        return self.BAUD_RATE
+
+    def discard_baud_request(self):
+        """
+        Used to clean up after a baud rate request that firmware without negotiation did not understand, so the next
+        frame starts clean on both ends. Flushes the input by default.
+
+        :return:
+        """
+        self.flush_input()
+
+    def record_data_error(self):
+        """
+        Counts a data integrity error. After MAX_BAUD_RATE_ERRORS in a row at a negotiated baud rate, that rate is not
+        used again and ConnectionTimeout is raised, so the board is reset and a lower rate negotiated.
+        Call record_good_data() after good data.
+
+        :return:
+        """
+        self.data_errors_in_row += 1
+        baud_rate = self.port.baudrate
+        if self.data_errors_in_row >= self.MAX_BAUD_RATE_ERRORS and baud_rate != self.BAUD_RATE:
+            self.failed_baud_rates.add(baud_rate)
+            self.data_errors_in_row = 0
+            raise ConnectionTimeout('Too many data integrity errors at %d baud. Falling back.' % baud_rate)
+
+    def record_good_data(self):
+        """
+        Clears the error counters after good data was received.
+
+        :return:
+        """
+        self.data_errors_in_row = 0
+        self.resyncs_in_row = 0
+
+    def reset_values(self):
+        """
+        Resets all control board variables. Called after the board has been reset.
+
+        :return:
+        """
+        super(ControlBoardSerialBase, self).reset_values()
+        self.resyncs_in_row = 0
+
+    def resync(self):
+        """
+        Soft resync. Flushes the input and has resync_board() exchange a frame with the board, with a timeout of
+        RESYNC_TIMEOUT. A dropped or garbled frame is usually fixed this way in a few milliseconds, where a DTR reset
+        takes seconds while the bootloader runs.
+
+        Escalates to a reset after MAX_RESYNCS_IN_ROW resyncs without good data in between, or if the baud rate in use
+        has failed, since only a reset negotiates a new one.
+
+        :return: bool - True if the board answered; False to reset the board
+        """
+        if self.resyncs_in_row >= self.MAX_RESYNCS_IN_ROW or self.port.baudrate in self.failed_baud_rates:
+            self.recovery_counters['Escalations'] += 1
+            self.recovery_counters['HardResets'] += 1
+            return False
+
+        self.resyncs_in_row += 1
+        self.recovery_counters['SoftResyncs'] += 1
+        port_timeout = self.port.timeout
+        try:
+            self.set_port_timeout(self.RESYNC_TIMEOUT)
+            self.flush_input()
+            self.resync_board()
+        except (ConnectionTimeout, DataIntegrityError) as e:
+            logger.info('Soft resync failed: %s' % e)
+            self.recovery_counters['SoftResyncFailures'] += 1
+            self.recovery_counters['HardResets'] += 1
+            return False
+        finally:
+            self.set_port_timeout(port_timeout)
+
+        logger.info('Resynchronized with the control board')
+        return True
+
+    def resync_board(self):
+        """
+        Used to exchange a frame with the board after the input is flushed, and apply its inputs. Raises
+        ConnectionTimeout or DataIntegrityError if the board does not answer.
+
+        :return:
+        """
+        raise NotImplementedError('This function needs to be implemented in the child class!')
+
     def read_line(self):
         """
         Reads a line of data from the serial input.
         
-        :return: utf-8 data
+        :return: utf-8 data, including the line ending
         """
         try:
-            data = self.port.readline().decode('utf-8')
-            if not any(data):
-                raise ConnectionTimeout('No data was read in time.')
-            return data
-        except serial.SerialTimeoutException as e:
-            raise ConnectionTimeout(e)
-        except serial.SerialException as e:
-            raise ConnectionFailed(e)
+            return str(self.read_frame(b'\n'), 'utf-8') + '\n'
         except UnicodeDecodeError as e:
             raise DataIntegrityError(e)
 
     def write_line(self, data_out):
         """
-        Writes a line of data to the serial output. Flushes the output before continuing. 
+        Writes a line of data to the serial output.
         
-        :param data_out: 
+        :param data_out: str - the line, without the line ending
         :return: 
         """
+        self.write_frame((data_out + '\r\n').encode())
+
+    def receive_frame(self, terminator):
+        """
+        Returns the next frame of data, reading from the port as needed. The port is read into a preallocated buffer,
+        all the waiting bytes at once, and the frame is returned as a view of that buffer rather than a copy.
+        A partial frame stays in the buffer for the next call.
+        NOTE: The returned memoryview is only valid until the next call.
+
+        :param terminator: bytes - the frame terminator
+        :return: memoryview - frame data without the terminator, or None if no frame was completed within the timeout
+        """
+        buffer = self.rx_buffer
+        search_start = self.rx_start
+
+        while True:
+            frame_end = buffer.find(terminator, search_start, self.rx_end)
+            if frame_end >= 0:
+                frame = self.rx_view[self.rx_start:frame_end]
+                self.rx_start = frame_end + len(terminator)
+                return frame
+            search_start = max(self.rx_end - len(terminator) + 1, self.rx_start)
+
+            # Make room for more data. Usually the buffer is empty by now, so nothing needs to be moved.
+            if self.rx_start == self.rx_end:
+                self.rx_start = self.rx_end = search_start = 0
+            elif self.rx_end == len(buffer):
+                if self.rx_start == 0:
+                    self.rx_end = 0
+                    raise DataIntegrityError('Frame is longer than the receive buffer (%d bytes)' % len(buffer))
+                length = self.rx_end - self.rx_start
+                buffer[:length] = buffer[self.rx_start:self.rx_end]
+                search_start -= self.rx_start
+                self.rx_start = 0
+                self.rx_end = length
+
+            # Read whatever is waiting, or wait for one byte
+            try:
+                size = min(max(self.port.in_waiting, 1), len(buffer) - self.rx_end)
+                count = self.port.readinto(self.rx_view[self.rx_end:self.rx_end + size])
+            except serial.SerialTimeoutException as e:
+                raise ConnectionTimeout(e)
+            except serial.SerialException as e:
+                raise ConnectionFailed(e)
+
+            if not count:
+                return None
+            self.rx_end += count
+
+    def read_frame(self, terminator):
+        """
+        Reads a frame of binary data from the serial input, up to the terminator.
+
+        :param terminator: bytes - the frame terminator
+        :return: memoryview - frame data, without the terminator. Only valid until the next read.
+        """
+        frame = self.receive_frame(terminator)
+        if frame is None:
+            raise ConnectionTimeout('No complete frame was read in time.')
+        return frame
+
+    def poll_frame(self, terminator):
+        """
+        Reads a frame of binary data if one completes within the port timeout. A partial frame is kept and completed
+        by the next call.
+
+        :param terminator: bytes - the frame terminator
+        :return: memoryview - frame data without the terminator, or None if no frame was completed. Only valid until
+                 the next read.
+        """
+        return self.receive_frame(terminator)
+
+    def write_frame(self, frame):
+        """
+        Writes a frame of binary data to the serial output.
+
+        :param frame: bytes - the complete frame, including any terminator
+        :return:
+        """
         try:
-            self.port.write(str.encode(data_out + '\r\n'))
-            self.port.flushOutput()
+            self.port.write(frame)
         except serial.SerialTimeoutException as e:
             raise ConnectionTimeout(e)
         except serial.SerialException as e:
@@ -107,52 +649,71 @@ class ControlBoardSerialBase(ControlBoardBase):
         """
         try:
             port_name = self.find_com_port()
-            self.port = serial.Serial(port=port_name, baudrate=self.BAUD_RATE, timeout=self.timeout)
+            self.claim_port(port_name)
+            # This may be a different board, so try all the baud rates again
+            self.failed_baud_rates.clear()
+            self.baud_negotiation_supported = None
+            self.port = self.SERIAL_CLASS(port=port_name, baudrate=self.BAUD_RATE, timeout=self.timeout)
         except serial.SerialTimeoutException as e:
+            self.release_port()
             raise ConnectionTimeout(e)
         except serial.SerialException as e:
-            time.sleep(1)
+            self.release_port()
+            # The port list may be out of date
+            self.port_index.invalidate()
             raise ConnectionFailed(e)
+        self.port_index.remember(self.get_port_key(), port_name)
 
-    @staticmethod
-    def log_com_pids_vids():
+    @classmethod
+    def log_com_pids_vids(cls):
         """
         Logs all of the available COM ports with PID and VID information to the log file. 
         NOTE: Logger must be at a debug level.
          
         :return: 
         """
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         logger.debug('Listing available COM ports:')
-        for port in lp.comports():
-            logger.debug('  %s: PID: %s, VID: %s' % (port.device, port.pid, port.vid))
+        for port in cls.port_index.get_ports():
+            logger.debug('  %s: PID: %s, VID: %s, Serial number: %s, Location: %s' % (port.device, port.pid, port.vid,
+                                                                                     port.serial_number, port.location))
+
+    def get_port_key(self):
+        """
+        Returns the key the port index remembers this board's last good port under.
+
+        :return: tuple - the key
+        """
+        return self.port_index.get_key(self.vid, self.pid, self.serial_number, self.location)
 
     def find_com_port(self):
         """
-        Finds all of the appropriate COM port based on the set PID and VID. Will automatically select the first match.
-        
-        TODO: Need to handle multiple connections. It might not be uncommon to have multiple Arduinos or FTDI USB to 
-        Serial devices connected to a computer at once. 
+        Finds the COM port based on the set PID, VID, USB serial number and USB location. In auto mode, selects the
+        port the board last connected on if it is still there, otherwise the first match that is not claimed by another
+        control board, so several boards of the same type can run at once.
         
         :return: str - port name
         """
-
-        # Filter on just the PIDs and VIDs that match, if provided
+        # Filter on just the PIDs and VIDs that match, if provided, and the USB serial number and location, if the
+        # board is bound to them
         if self.pid is not None and self.vid is not None:
-            # If the port name is auto, find the control board by searching through the PID and VID
-            port_names = [port.device for port in lp.comports() if port.pid == self.pid and port.vid == self.vid]
+            ports = self.port_index.find(self.vid, self.pid, self.serial_number, self.location)
         else:
-            # If PID or VID is not supplied, list all the com ports
-            port_names = [port.device for port in lp.comports()]
+            ports = self.port_index.find(serial_number=self.serial_number, location=self.location)
 
-        # If Auto, select the first port in the port_names list
+        port_names = [port.device for port in ports]
+
+        # If Auto, select the first port in the port_names list that no other board has open
         if self.port_name.lower() == 'auto' and self.pid is not None and self.vid is not None:
             if not any(port_names):
                 raise ConnectionFailed('No valid COM ports found for the control board. Is it connected?')
-            elif len(port_names) > 1:
-                # TODO: Handle multiple port_names
-                port_name = port_names[0]
-            else:
-                port_name = port_names[0]
+            free_port_names = [port_name for port_name in port_names if not self.is_port_claimed(port_name)]
+            if not any(free_port_names):
+                raise ConnectionFailed('All the COM ports found for the control board are in use by other control '
+                                       'boards.')
+            last_good_port_name = self.port_index.get_last_good(self.get_port_key())
+            port_name = last_good_port_name if last_good_port_name in free_port_names else free_port_names[0]
         else:
             # This is the hard-set COM port setting.
             if self.port_name in port_names:
@@ -172,12 +733,40 @@ class ControlBoardSerialBase(ControlBoardBase):
                 self.port.close()
             except serial.SerialException as e:
                 raise ConnectionFailed(e)
+            finally:
+                self.release_port()
 
     def reconnect(self):
-        """ Disconnected and reconnects to the COM port. """
+        """ Disconnects and reconnects to the COM port, once the next attempt is due. """
+        self.disconnect()
+        self.hotplug.wait(self.is_cbhal_running)
+        self.connect_attempt()
+
+    async def async_reconnect(self):
+        """
+        asyncio version of reconnect(). Waits for the next attempt on the event loop, then connects in the executor.
+
+        :return:
+        """
         self.disconnect()
-        time.sleep(1)
-        self.connect()
+        await self.hotplug.async_wait(self.is_cbhal_running)
+        await self.run_blocking(self.connect_attempt)
+
+    def connect_attempt(self):
+        """
+        Connects, recording the attempt with the hotplug watcher so a failure backs off the next one.
+
+        :return:
+        """
+        if not self.is_cbhal_running():
+            return
+        self.hotplug.record_attempt()
+        try:
+            self.connect()
+        except Exception:
+            self.hotplug.record_failure()
+            raise
+        self.hotplug.record_success()
 
     def pulse_dtr(self, assert_time=50e-3):
         """
@@ -1,24 +1,31 @@
 import logging
 import sys
-from crccheck.crc import Crc8Maxim
-import numpy
 
 logger = logging.getLogger(__name__)
 
 if getattr(sys, 'frozen', False):
     # Normal Mode
     from ControlBoardApp.cbhal.ControlBoardSerialBase import ControlBoardSerialBase
-    from ControlBoardApp.cbhal.ControlBoardBase import DataIntegrityError
+    from ControlBoardApp.cbhal.Crc8MaximTable import Crc8MaximTable
+    from ControlBoardApp.cbhal.ControlBoardBase import DataIntegrityError, ConnectionTimeout
 else:
     # Test Mode
     from cbhal.ControlBoardSerialBase import ControlBoardSerialBase
-    from cbhal.ControlBoardBase import DataIntegrityError
+    from cbhal.Crc8MaximTable import Crc8MaximTable
+    from cbhal.ControlBoardBase import DataIntegrityError, ConnectionTimeout
 
 
 class ControlBoardSerialBaseFw1v0(ControlBoardSerialBase):
     """ Represents Arduino based firmware v1.0 for the Control Board"""
     BAUD_RATE = 115200  # bps
     TIMEOUT = 2  # second(s)
+    NEGOTIATED_BAUD_RATES = (1000000, 500000, 250000)  # bps, highest first
+    CYCLE_RATE = 100  # Hz, an exchange takes about 12 ms at 115200 bps and 1.5 ms at 1 Mbps
+    RESYNC_LINES = 3  # lines read while looking for a valid response to a resync
+
+    # Parser lookup table
+    # Analog value strings sent by the firmware to their values
+    ANALOG_STRINGS = {str(value).encode(): value for value in range(256)}
 
     def __init__(self):
 
@@ -29,6 +36,10 @@ class ControlBoardSerialBaseFw1v0(ControlBoardSerialBase):
                                                           pid=self.PID,
                                                           vid=self.VID)
 
+        # Preallocated storage for unpack_data
+        self.switch_array = [False] * self.SWITCH_INPUTS
+        self.analog_array = [0] * self.ANALOG_INPUTS
+
     def reset_board(self):
         """
         Resets the microcontroller using the DTR signal.
@@ -36,6 +47,7 @@ class ControlBoardSerialBaseFw1v0(ControlBoardSerialBase):
         """
         logger.debug('Resetting the control board')
         # Flush input. There may be data already waiting at the port.
+        self.set_baud_rate(self.BAUD_RATE)
         self.flush_input()
 
         # Reset
@@ -47,26 +59,57 @@ class ControlBoardSerialBaseFw1v0(ControlBoardSerialBase):
         if welcome_msg != 'FRC Control Board\r\n':
             raise ConnectionError('FRC control board did not send welcome message after reset.')
 
-    def update(self):
+        self.negotiate_baud_rate()
+
+    def send_outputs(self):
         """
-        Updates the microcontroller with output data. Receives a response packet with input data.
-        :return: 
+        Sends the output data to the microcontroller, which answers with a response line with input data.
+        :return:
         """
 
         # Get Output Data
-        led_out = self.getLedValues()
-        pwm_out = self.getPwmValues()
-        data_out = self.pack_data(led_out, pwm_out)
+        data_out = self.encode_outputs(self.getLedMask(), self.getPwmBytes())
 
-        # Serial Write & Read
-        self.write_line(data_out)
-        data_in = self.read_line()
+        # Serial Write
+        self.write_frame(data_out)
+
+    def receive_inputs(self, data_in):
+        """
+        Applies the response line with input data.
+        :param data_in: memoryview - the line without the line ending, None if it was not received in time
+        :return:
+        """
+        if data_in is None:
+            raise ConnectionTimeout('No complete frame was read in time.')
+        self.record_input_time()
 
         # Push Input Data
-        switch_in, analog_in = self.unpack_data(data_in)
-        self.putSwitchvalues(switch_in)
+        try:
+            switch_mask, analog_in = self.unpack_inputs(data_in)
+        except DataIntegrityError:
+            self.record_data_error()
+            raise
+        self.record_good_data()
+        self.putSwitchMask(switch_mask)
         self.putAnalogvalues(analog_in)
 
+    def resync_board(self):
+        """
+        Sends the outputs and waits for a valid response line. The first line may be the end of a line that was cut
+        by the flush, or the reply to a partial line the microcontroller had, so a few lines are tried.
+        :return:
+        """
+        self.send_outputs()
+        for _ in range(self.RESYNC_LINES):
+            try:
+                switch_mask, analog_in = self.unpack_inputs(self.read_frame(b'\n'))
+            except DataIntegrityError:
+                continue
+            self.putSwitchMask(switch_mask)
+            self.putAnalogvalues(analog_in)
+            return
+        raise DataIntegrityError('No valid response line to the resync.')
+
     def pack_data(self, led_array, pwm_array):
         """
         Packages input data into the format the microcontroller expects
@@ -79,96 +122,118 @@ class ControlBoardSerialBaseFw1v0(ControlBoardSerialBase):
         assert len(pwm_array) == self.PWM_OUTPUTS, 'Length of PWM array is invalid'
         assert len(led_array) == self.LED_OUTPUTS, 'Length of LED array is invalid'
 
+        return self.format_outputs(self.list_to_mask(led_array), pwm_array)
+
+    def format_outputs(self, led_mask, pwm_values):
+        """
+        Formats the outputs into the line the microcontroller expects, without the line ending
+        :param led_mask: int - LED values, bit n = LED n
+        :param pwm_values: bytes or list - PWM values
+        :return: str - the line
+        """
+
         ###########################################
-        # Convert the LED Boolean array to a string
-        # 1. Convert LED boolean array to number
-        led_u16 = 0x0000
-        for led in led_array:
-            led_u16 |= led << 16
-            led_u16 >>= 1
-
-        # 2. Convert number to string
-        led_string = str(led_u16)
+        # Convert the LED mask to a string
+        # The LEDs fill the upper bits of the 16-bit number, last LED in bit 15.
+        led_string = str(led_mask << (16 - self.LED_OUTPUTS))
         ###########################################
 
         ###########################################
         # Convert PWM Number array to a string
-        pwm_string = str(pwm_array).strip('[]').replace(' ', '')
+        pwm_string = ','.join(map(str, pwm_values))
         ###########################################
 
         # Combine the data together for CRC processing
         data_out = 'LED:' + led_string + ';PWM:' + pwm_string + ';'
 
         # Calculate the CRC and add it to the string
-        data_crc_out = data_out + 'CRC:' + str(Crc8Maxim.calc(data_out.encode(), 0))
+        data_crc_out = data_out + 'CRC:' + str(Crc8MaximTable.calc(data_out.encode(), 0))
 
         return data_crc_out
 
+    def pack_frame(self, led_mask, pwm_values):
+        """
+        Packages output data into the line written to the microcontroller.
+        :param led_mask: int - LED values, bit n = LED n
+        :param pwm_values: bytes - PWM values, one per channel
+        :return: bytes - the encoded line, including the line ending
+        """
+        return (self.format_outputs(led_mask, pwm_values) + '\r\n').encode()
+
     def unpack_data(self, data_string):
         """
-        Unpacks data from the microcontroller
-        :param data_string: str - Raw data from the microcontroller
+        Unpacks data from the microcontroller into lists
+        NOTE: The returned lists are reused by the next call.
+
+        :param data_string: str, bytes or memoryview - Raw data from the microcontroller
         :return: tuple - First element is the switch array (list), Second element is the analog array (list)
         """
-        switch_array = []
-        analog_array = []
+        switch_mask, analog_values = self.unpack_inputs(data_string)
+        self.switch_array[:] = self.mask_to_list(switch_mask, self.SWITCH_INPUTS)
+        self.analog_array[:] = analog_values
+        return self.switch_array, self.analog_array
+
+    def unpack_inputs(self, data_string):
+        """
+        Unpacks data from the microcontroller
+        'SW:0;ANA:4,4,6,4,4,4,5,4,4,4,4,5,5,4,4,6;CRC:162;'
+
+        The only Python level pass over the data is the CRC. The tags and values are located and sliced with bytes
+        methods, and the values are converted straight to the switch mask and analog bytes.
+
+        :param data_string: str, bytes or memoryview - Raw data from the microcontroller
+        :return: tuple - switch mask (int, bit n = switch n), analog values (bytes)
+        """
+        if isinstance(data_string, str):
+            data_string = data_string.encode()
+        elif not isinstance(data_string, bytes):
+            # The tag search and value lookups need bytes. This is the only copy of a received line.
+            data_string = bytes(data_string)
 
         # Check if there is any data
-        if not any(data_string):
+        if not data_string:
             raise DataIntegrityError('No data')
 
         # Check for missing data tags
-        missing = []
-        for tag in ['ANA', 'CRC', 'SW']:
-            if not tag in data_string:
-                missing.append(tag)
-        if any(missing):
+        sw_pos = data_string.find(b'SW:')
+        ana_pos = data_string.find(b'ANA:')
+        crc_pos = data_string.find(b'CRC:')
+        if sw_pos < 0 or ana_pos < 0 or crc_pos < 0:
+            missing = [tag for (tag, pos) in [('ANA', ana_pos), ('CRC', crc_pos), ('SW', sw_pos)] if pos < 0]
             raise DataIntegrityError(
-                'Missing attributes in data: %s Original data: \'%s\'' % (str(missing), data_string))
-
-        # Separate the data packet into a list.
-        # 'SW:0;ANA:4,4,6,4,4,4,5,4,4,4,4,5,5,4,4,6;CRC:162;\r\n'
-        data_array = (data_string.replace('\r\n', '')).split(';')[:-1]
-        # ['SW:0', 'ANA:4,4,6,4,4,4,5,4,4,4,4,5,5,4,4,6', 'CRC:162']
+                'Missing attributes in data: %s Original data: %r' % (str(missing), bytes(data_string)))
 
         ###########################################
         # CRC Check
         # Calculate the CRC value from the data before 'CRC:'
-        # 'SW:0;ANA:4,4,6,4,4,4,5,4,4,4,4,5,5,4,4,6;'
-        crc_val = Crc8Maxim.calc(data_string.split('CRC:')[0].encode(), 0)
-        #
-        # Create a dictionary from the data array (placed here to get the CRC value
-        data_in_dict = {}
-        for data in data_array:
-            data = data.split(':')
-            data_in_dict.update({data[0]: data[1]})
+        crc_val = Crc8MaximTable.calc(memoryview(data_string)[:crc_pos], 0)
         #
         # Check that the PC side CRC matches the microcontroller side CRC
-        if int(data_in_dict['CRC']) != int(crc_val):
-            raise DataIntegrityError('CRC failed. Calculated %s for data \'%s\'' % (str(int(crc_val)), data_string))
+        try:
+            crc_in = int(data_string[crc_pos + 4:data_string.find(b';', crc_pos)])
+        except ValueError:
+            raise DataIntegrityError('Invalid CRC value in data: %r' % bytes(data_string))
+        if crc_in != crc_val:
+            raise DataIntegrityError('CRC failed. Calculated %d for data %r' % (crc_val, bytes(data_string)))
         # End CRC Check
         ###########################################
 
         # At this point, we know the data is valid
 
-        # Unpack the switch values from the Unsigned 16-bit Integer
-        switches = numpy.uint16(int(data_in_dict['SW'], 16))
-        for switch_num in range(self.SWITCH_INPUTS):
-            switch_array.append(bool(switches & 0x0001))
-            switches >>= 1
-
-        # Unpack the analog values from the string of analog values
-        analogs = data_in_dict['ANA'].split(',')
-        if len(analogs) is self.ANALOG_INPUTS:
-            analog_array = list(map(int, analogs))
-
-        # Check that the data lengths are valid
-        if len(analog_array) is not self.ANALOG_INPUTS:
-            raise IndexError(
-                'Number of analog inputs is incorrect. Saw %d, Expected %d' % (len(analog_array), self.ANALOG_INPUTS))
-        if len(switch_array) is not self.SWITCH_INPUTS:
+        # Unpack the analog values from the comma separated list
+        analogs = data_string[ana_pos + 4:data_string.find(b';', ana_pos)].split(b',')
+        if len(analogs) != self.ANALOG_INPUTS:
             raise IndexError(
-                'Number of switch inputs is incorrect. Saw %d, Expected %d' % (len(switch_array), self.SWITCH_INPUTS))
+                'Number of analog inputs is incorrect. Saw %d, Expected %d' % (len(analogs), self.ANALOG_INPUTS))
+        try:
+            analog_values = bytes(map(self.ANALOG_STRINGS.__getitem__, analogs))
+        except KeyError:
+            # Not one of the values the firmware normally sends (0-255, no padding)
+            analog_values = self.list_to_bytes(list(map(int, analogs)))
+
+        # Unpack the switch mask from the Unsigned 16-bit Integer
+        switch_mask = int(data_string[sw_pos + 3:data_string.find(b';', sw_pos)], 16)
+        switch_mask &= (1 << self.SWITCH_INPUTS) - 1
 
         # Return the switch and analog data
-        return switch_array, analog_array
+        return switch_mask, analog_values
@@ -0,0 +1,535 @@
+import collections
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.ControlBoardSerialBase import ControlBoardSerialBase
+    from ControlBoardApp.cbhal.Crc8MaximTable import Crc8MaximTable
+    from ControlBoardApp.cbhal.ControlBoardBase import DataIntegrityError, ConnectionTimeout
+else:
+    # Test Mode
+    from cbhal.ControlBoardSerialBase import ControlBoardSerialBase
+    from cbhal.Crc8MaximTable import Crc8MaximTable
+    from cbhal.ControlBoardBase import DataIntegrityError, ConnectionTimeout
+
+
+class ControlBoardSerialBaseFw2(ControlBoardSerialBase):
+    """
+    Represents Arduino based firmware v2 for the Control Board. Firmware v2 uses fixed length binary packets instead
+    of the ASCII lines used by firmware v1.0.
+
+    Every packet is [type][data...][sequence number][CRC-8/Maxim of everything before it], byte stuffed (SLIP,
+    RFC 1055) and terminated with FRAME_END.
+
+    Outputs packet (PC -> Board):
+        PACKET_OUTPUTS, LED mask (bit n = LED n, little endian), PWM values (1 byte each), SEQ, CRC
+    Config packet (PC -> Board):
+        PACKET_CONFIG, mode (MODE_REQUEST_RESPONSE or MODE_DELTA), SEQ, CRC
+    Inputs packet (Board -> PC):
+        PACKET_INPUTS, Switch mask (bit n = SW n, little endian), Analog values (1 byte each), SEQ, CRC
+    Input delta packet (Board -> PC):
+        PACKET_INPUT_DELTA, Switch mask, Analog change mask (bit n = ANA n changed, little endian),
+        changed Analog values (1 byte each, in channel order), SEQ, CRC
+
+    In request/response mode (the default), the board answers every outputs packet with an inputs packet carrying the
+    same sequence number. This allows up to PIPELINE_DEPTH outputs packets to be in flight, so the USB-serial round
+    trip is not paid on every cycle. A reply that does not arrive within a few cycle periods is counted as lost and its
+    request is dropped from the pipeline, so the next cycle sends a new one instead of the link stalling until TIMEOUT.
+
+    In delta mode, outputs are only sent when they change, plus a keepalive every KEEPALIVE_PERIOD so the board does not
+    time out. The board sends input delta packets when its inputs change, and a full inputs packet periodically.
+    """
+    BAUD_RATE = 115200  # bps
+    TIMEOUT = 2  # second(s)
+    NEGOTIATED_BAUD_RATES = (1000000, 500000, 250000)  # bps, highest first
+    CYCLE_RATE = 200  # Hz, an exchange takes about 3 ms at 115200 bps
+    WELCOME_MESSAGE = 'FRC Control Board Fw2\r\n'
+
+    # Framing
+    FRAME_END = 0xC0
+    FRAME_ESC = 0xDB
+    FRAME_ESC_END = 0xDC
+    FRAME_ESC_ESC = 0xDD
+    INPUT_TERMINATOR = bytes([FRAME_END])
+
+    # Packet types
+    PACKET_OUTPUTS = 0x01
+    PACKET_CONFIG = 0x02
+    PACKET_INPUTS = 0x81
+    PACKET_INPUT_DELTA = 0x82
+
+    # Modes
+    MODE_REQUEST_RESPONSE = 0x00
+    MODE_DELTA = 0x01
+
+    # Number of outputs packets kept in flight. 1 is stop-and-wait. Limited by the firmware's 64 byte receive buffer.
+    PIPELINE_DEPTH = 2
+    MAX_PIPELINE_DEPTH = 3
+    REPLY_TIMEOUT_CYCLES = 3  # cycle periods to wait for a reply before its request is counted as lost
+    # second(s), shortest reply timeout, and the reply timeout when free running. Kept well above the 16 ms default
+    # latency timer of FTDI USB-serial adapters, which can hold a reply back that long. Plugins on a faster link
+    # can lower it.
+    MIN_REPLY_TIMEOUT = 0.05
+
+    # Delta mode
+    DELTA_MODE = False
+    KEEPALIVE_PERIOD = 0.2  # second(s), must be well below the firmware's 500 ms timeout
+    DELTA_POLL_PERIOD = 0.01  # second(s), how long update() waits for an input packet in delta mode
+
+    def __init__(self):
+
+        # Setup parent class
+        super(ControlBoardSerialBaseFw2, self).__init__(port_name='auto',
+                                                        baud_rate=self.BAUD_RATE,
+                                                        timeout=self.TIMEOUT,
+                                                        pid=self.PID,
+                                                        vid=self.VID)
+
+        # Packet sizes, before byte stuffing
+        self.led_mask_bytes = (self.LED_OUTPUTS + 7) // 8
+        self.switch_mask_bytes = (self.SWITCH_INPUTS + 7) // 8
+        self.analog_mask_bytes = (self.ANALOG_INPUTS + 7) // 8
+        self.inputs_packet_len = 1 + self.switch_mask_bytes + self.ANALOG_INPUTS + 1 + 1
+        self.input_delta_min_len = 1 + self.switch_mask_bytes + self.analog_mask_bytes + 1 + 1
+
+        # Last analog values received, which input delta packets are applied to
+        self.received_analogs = bytes(self.ANALOG_INPUTS)
+
+        # Pipeline
+        self.pipeline_depth = None
+        self.set_pipeline_depth(self.PIPELINE_DEPTH)
+        self.in_flight = collections.deque()
+        self.next_sequence = 0
+        self.unmatched_responses = 0
+        self.lost_replies = 0
+
+        # Delta mode
+        self.delta_mode = self.DELTA_MODE
+        self.last_sent_outputs = None
+        self.last_send_time = 0.0
+        self.last_receive_time = 0.0
+        self.delta_counters = {'OutputsSent': 0,
+                               'OutputsSkipped': 0,
+                               'Keepalives': 0,
+                               'InputDeltas': 0,
+                               'InputSyncs': 0}
+
+    def set_pipeline_depth(self, depth):
+        """
+        Sets the number of outputs packets kept in flight.
+
+        :param depth: int - 1 (stop-and-wait) to MAX_PIPELINE_DEPTH
+        :return:
+        """
+        if not 1 <= depth <= self.MAX_PIPELINE_DEPTH:
+            raise ValueError('Pipeline depth must be between 1 and %d' % self.MAX_PIPELINE_DEPTH)
+        self.pipeline_depth = depth
+
+    def set_delta_mode(self, enabled):
+        """
+        Selects delta mode or request/response mode. Takes effect the next time the board is reset.
+
+        :param enabled: bool - True for delta mode
+        :return:
+        """
+        self.delta_mode = bool(enabled)
+
+    def reset_pipeline(self):
+        """
+        Forgets all outputs packets in flight.
+
+        :return:
+        """
+        self.in_flight.clear()
+        self.next_sequence = 0
+        self.last_sent_outputs = None
+
+    def reset_board(self):
+        """
+        Resets the microcontroller using the DTR signal.
+        :return:
+        """
+        logger.debug('Resetting the control board')
+        # Flush input. There may be data already waiting at the port.
+        self.set_baud_rate(self.BAUD_RATE)
+        self.flush_input()
+        self.set_port_timeout(self.timeout)
+
+        # Reset
+        self.reset_pipeline()
+        self.pulse_dtr()
+
+        # Read welcome message. This is still sent as a line of text.
+        welcome_msg = self.read_line()
+
+        if welcome_msg != self.WELCOME_MESSAGE:
+            raise ConnectionError('FRC control board did not send the firmware v2 welcome message after reset.')
+
+        self.negotiate_baud_rate()
+        self.last_receive_time = time.perf_counter()
+
+        if self.delta_mode:
+            self.configure_mode(self.MODE_DELTA)
+
+    def discard_baud_request(self):
+        """
+        Firmware without negotiation keeps the baud rate request as the start of a frame. Ends that frame, and drops the
+        inputs packet the board answers the invalid frame with.
+        :return:
+        """
+        self.write_frame(bytes([self.FRAME_END]))
+        try:
+            self.read_frame(self.INPUT_TERMINATOR)
+        except ConnectionTimeout:
+            pass
+        self.flush_input()
+
+    def configure_mode(self, mode):
+        """
+        Sends a config packet selecting the protocol mode and waits for the board's full inputs packet in reply.
+
+        :param mode: int - MODE_REQUEST_RESPONSE or MODE_DELTA
+        :return:
+        """
+        self.write_frame(self.pack_config(mode, 0))
+        _, _, switch_mask, analog_in = self.unpack_packet(self.read_frame(bytes([self.FRAME_END])))
+        self.putSwitchMask(switch_mask)
+        self.putAnalogvalues(analog_in)
+
+        self.last_receive_time = time.perf_counter()
+        if mode == self.MODE_DELTA:
+            # From here on, update() polls for input packets instead of waiting for a response
+            self.set_port_timeout(self.DELTA_POLL_PERIOD)
+
+    def pack_config(self, mode, sequence):
+        """
+        Packages a config packet.
+        :param mode: int - MODE_REQUEST_RESPONSE or MODE_DELTA
+        :param sequence: int - packet sequence number (0-255)
+        :return: bytes - the byte stuffed frame
+        """
+        packet = bytes([self.PACKET_CONFIG, mode])
+        return self.add_sequence((self.stuff_frame(packet)[:-1], Crc8MaximTable.calc(packet, 0)), sequence)
+
+    def resync_board(self):
+        """
+        Ends any partial frame the microcontroller has, then sends a config packet for the current mode. The board
+        always answers a config packet with a full inputs packet with the same sequence number. Responses that were
+        still in flight are skipped, and the pipeline starts again empty.
+        :return:
+        """
+        # The board skips empty frames
+        self.write_frame(bytes([self.FRAME_END]))
+
+        sequence = self.next_sequence
+        self.next_sequence = (sequence + 1) & 0xFF
+        self.in_flight.clear()
+        self.last_sent_outputs = None
+        self.write_frame(self.pack_config(self.MODE_DELTA if self.delta_mode else self.MODE_REQUEST_RESPONSE, sequence))
+
+        for _ in range(self.MAX_PIPELINE_DEPTH + 1):
+            try:
+                packet_type, response_sequence, switch_mask, analog_in = self.unpack_packet(
+                    self.read_frame(self.INPUT_TERMINATOR))
+            except DataIntegrityError:
+                continue
+            if packet_type == self.PACKET_INPUTS and response_sequence == sequence:
+                self.last_receive_time = time.perf_counter()
+                self.putSwitchMask(switch_mask)
+                self.putAnalogvalues(analog_in)
+                return
+        raise DataIntegrityError('No response to the resync config packet.')
+
+    def get_cycle_deadline(self):
+        """
+        Moves on to the next HAL cycle. In delta mode, the cycles are paced by the input packets and DELTA_POLL_PERIOD
+        instead of the cycle rate, so the cycle starts now.
+
+        :return: int - perf_counter_ns() time to start the cycle at; None to start it now
+        """
+        if self.delta_mode:
+            return None
+        return super(ControlBoardSerialBaseFw2, self).get_cycle_deadline()
+
+    def get_input_timeout(self):
+        """
+        Returns how long update() waits for an input packet. In delta mode, a cycle without one is normal. In
+        request/response mode, this is the reply timeout: REPLY_TIMEOUT_CYCLES cycle periods, at least
+        MIN_REPLY_TIMEOUT.
+
+        :return: float - timeout in seconds
+        """
+        if self.delta_mode:
+            return self.DELTA_POLL_PERIOD
+        period_ns = self.scheduler.period_ns
+        if period_ns is None:
+            return self.MIN_REPLY_TIMEOUT
+        return max(self.MIN_REPLY_TIMEOUT, self.REPLY_TIMEOUT_CYCLES * period_ns / 1e9)
+
+    def send_outputs(self):
+        """
+        Sends the output data to the microcontroller.
+
+        Keeps the pipeline full of outputs packets, so the oldest response can be read next.
+        :return:
+        """
+        if self.delta_mode:
+            self.send_outputs_delta()
+            return
+
+        # Get Output Data
+        encoded_outputs = self.encode_outputs(self.getLedMask(), self.getPwmBytes())
+
+        # Serial Write
+        while len(self.in_flight) < self.pipeline_depth:
+            sequence = self.next_sequence
+            self.next_sequence = (sequence + 1) & 0xFF
+            self.write_frame(self.add_sequence(encoded_outputs, sequence))
+            self.in_flight.append(sequence)
+
+    def receive_inputs(self, data_in):
+        """
+        Applies the response packet with input data to the oldest outputs packet in flight.
+        :param data_in: memoryview - the frame without FRAME_END, None if it was not received in time
+        :return: bool - False in delta mode if no input packet arrived
+        """
+        if self.delta_mode:
+            return self.receive_inputs_delta(data_in)
+
+        if data_in is None:
+            # The oldest request's reply is lost. Drop it, so the next cycle sends a new request.
+            if self.in_flight:
+                self.in_flight.popleft()
+                self.lost_replies += 1
+            if time.perf_counter() - self.last_receive_time > self.timeout:
+                raise ConnectionTimeout('No response received from the control board.')
+            return
+        self.record_input_time()
+
+        # Match the response to its request. Older requests in flight have lost their response.
+        try:
+            _, sequence, switch_mask, analog_in = self.unpack_packet(data_in)
+        except DataIntegrityError:
+            self.record_data_error()
+            raise
+        self.record_good_data()
+        self.last_receive_time = time.perf_counter()
+        if sequence in self.in_flight:
+            while self.in_flight.popleft() != sequence:
+                self.unmatched_responses += 1
+        else:
+            self.unmatched_responses += 1
+            logger.debug('Response with sequence number %d was not in flight' % sequence)
+
+        # Push Input Data
+        self.putSwitchMask(switch_mask)
+        self.putAnalogvalues(analog_in)
+
+    def send_outputs_delta(self):
+        """
+        Delta mode send. Sends the outputs if they changed or the keepalive is due.
+        :return:
+        """
+
+        # Get Output Data
+        encoded_outputs = self.encode_outputs(self.getLedMask(), self.getPwmBytes())
+        now = time.perf_counter()
+
+        # Serial Write. encode_outputs() returns the same object until the outputs change.
+        if encoded_outputs is not self.last_sent_outputs:
+            self.delta_counters['OutputsSent'] += 1
+        elif now - self.last_send_time >= self.KEEPALIVE_PERIOD:
+            self.delta_counters['Keepalives'] += 1
+        else:
+            encoded_outputs = None
+            self.delta_counters['OutputsSkipped'] += 1
+
+        if encoded_outputs is not None:
+            sequence = self.next_sequence
+            self.next_sequence = (sequence + 1) & 0xFF
+            self.write_frame(self.add_sequence(encoded_outputs, sequence))
+            self.last_sent_outputs = encoded_outputs
+            self.last_send_time = now
+
+    def receive_inputs_delta(self, data_in):
+        """
+        Delta mode receive. Applies the input packet, if one arrived within DELTA_POLL_PERIOD. A poll without a packet
+        only feeds the keepalive watchdog, it is not published as a new cycle.
+        :param data_in: memoryview - the frame without FRAME_END, None if no packet arrived
+        :return: bool - False if no input packet arrived
+        """
+        if data_in is None:
+            if time.perf_counter() - self.last_receive_time > self.timeout:
+                raise ConnectionTimeout('No input packet received from the control board in delta mode.')
+            return False
+        self.last_receive_time = time.perf_counter()
+        self.record_input_time()
+
+        try:
+            packet_type, _, switch_mask, analog_in = self.unpack_packet(data_in)
+        except DataIntegrityError:
+            self.record_data_error()
+            raise
+        self.record_good_data()
+        if packet_type == self.PACKET_INPUT_DELTA:
+            self.delta_counters['InputDeltas'] += 1
+        else:
+            self.delta_counters['InputSyncs'] += 1
+
+        # Push Input Data
+        self.putSwitchMask(switch_mask)
+        self.putAnalogvalues(analog_in)
+
+    def get_status(self):
+        """
+        Returns a dictionary of status information, including the pipeline counters.
+        :return: dict - status
+        """
+        status = super(ControlBoardSerialBaseFw2, self).get_status()
+        status.update({'Pipeline': {'Depth': self.pipeline_depth,
+                                    'InFlight': len(self.in_flight),
+                                    'Unmatched': self.unmatched_responses,
+                                    'Lost': self.lost_replies},
+                       'Delta': dict(self.delta_counters, Enabled=self.delta_mode)})
+        return status
+
+    @classmethod
+    def stuff_frame(cls, packet):
+        """
+        Byte stuffs a packet and terminates it with FRAME_END.
+
+        :param packet: bytes - the raw packet
+        :return: bytes - the frame, ready to be written
+        """
+        return bytes(packet).replace(bytes([cls.FRAME_ESC]), bytes([cls.FRAME_ESC, cls.FRAME_ESC_ESC])) \
+            .replace(bytes([cls.FRAME_END]), bytes([cls.FRAME_ESC, cls.FRAME_ESC_END])) + bytes([cls.FRAME_END])
+
+    @classmethod
+    def unstuff_frame(cls, frame):
+        """
+        Removes the byte stuffing from a frame. The FRAME_END terminator must already be removed.
+
+        :param frame: bytes - the received frame
+        :return: bytes - the raw packet
+        """
+        return bytes(frame).replace(bytes([cls.FRAME_ESC, cls.FRAME_ESC_END]), bytes([cls.FRAME_END])) \
+            .replace(bytes([cls.FRAME_ESC, cls.FRAME_ESC_ESC]), bytes([cls.FRAME_ESC]))
+
+    def pack_data(self, led_array, pwm_array, sequence=0):
+        """
+        Packages output data into the packet the microcontroller expects
+        :param led_array: list - List of LED values, must be the same length as expected
+        :param pwm_array: list - List of PWM values, must be the same length as expected
+        :param sequence: int - packet sequence number (0-255)
+        :return: bytes - the byte stuffed frame
+        """
+
+        # Make sure the data is the right length
+        assert len(pwm_array) == self.PWM_OUTPUTS, 'Length of PWM array is invalid'
+        assert len(led_array) == self.LED_OUTPUTS, 'Length of LED array is invalid'
+
+        encoded_outputs = self.pack_frame(self.list_to_mask(led_array), self.list_to_bytes(pwm_array))
+        return self.add_sequence(encoded_outputs, sequence)
+
+    def pack_frame(self, led_mask, pwm_values):
+        """
+        Packages output data into the part of the packet that does not change with the sequence number. The LED mask
+        and PWM bytes are already in the packet's format.
+        :param led_mask: int - LED values, bit n = LED n
+        :param pwm_values: bytes - PWM values, one per channel
+        :return: tuple - the byte stuffed type and data (bytes), and their CRC (int)
+        """
+        packet = bytes([self.PACKET_OUTPUTS]) + led_mask.to_bytes(self.led_mask_bytes, 'little') + pwm_values
+
+        return self.stuff_frame(packet)[:-1], Crc8MaximTable.calc(packet, 0)
+
+    def add_sequence(self, encoded_outputs, sequence):
+        """
+        Completes an outputs frame from pack_frame with the sequence number and CRC.
+        :param encoded_outputs: tuple - the result of pack_frame
+        :param sequence: int - packet sequence number (0-255)
+        :return: bytes - the byte stuffed frame
+        """
+        stuffed_data, data_crc = encoded_outputs
+        crc = Crc8MaximTable.calc((sequence,), data_crc)
+        return stuffed_data + self.stuff_frame((sequence, crc))
+
+    def unpack_data(self, frame):
+        """
+        Unpacks data from the microcontroller
+        :param frame: bytes - Raw frame from the microcontroller, without the FRAME_END terminator
+        :return: tuple - First element is the switch array (list), Second element is the analog array (list)
+        """
+        _, _, switch_mask, analog_values = self.unpack_packet(frame)
+        return self.mask_to_list(switch_mask, self.SWITCH_INPUTS), list(analog_values)
+
+    def unpack_packet(self, frame):
+        """
+        Unpacks an inputs or input delta packet from the microcontroller. An input delta packet is applied to the
+        analog values of the last packet.
+        :param frame: bytes - Raw frame from the microcontroller, without the FRAME_END terminator
+        :return: tuple - packet type (int), sequence number (int), switch mask (int, bit n = switch n),
+                 analog values (bytes)
+        """
+
+        # Check if there is any data
+        if not frame:
+            raise DataIntegrityError('No data')
+
+        packet = self.unstuff_frame(frame)
+
+        if len(packet) < 1 + self.switch_mask_bytes + 2:
+            raise DataIntegrityError('Packet is too short. Original data: %s' % packet.hex())
+
+        ###########################################
+        # CRC Check
+        # The CRC is the last byte of the packet
+        crc_val = Crc8MaximTable.calc(memoryview(packet)[:-1], 0)
+        if packet[-1] != crc_val:
+            raise DataIntegrityError('CRC failed. Calculated %d for data %s' % (crc_val, packet.hex()))
+        # End CRC Check
+        ###########################################
+
+        packet_type = packet[0]
+        analog_start = 1 + self.switch_mask_bytes
+
+        if packet_type == self.PACKET_INPUTS:
+            if len(packet) != self.inputs_packet_len:
+                raise DataIntegrityError('Packet length is incorrect. Saw %d, Expected %d. Original data: %s' %
+                                         (len(packet), self.inputs_packet_len, packet.hex()))
+
+            # One byte per analog value
+            analog_values = packet[analog_start:-2]
+
+        elif packet_type == self.PACKET_INPUT_DELTA:
+            if len(packet) < self.input_delta_min_len:
+                raise DataIntegrityError('Input delta packet is too short. Saw %d, Expected at least %d. '
+                                         'Original data: %s' % (len(packet), self.input_delta_min_len, packet.hex()))
+            changed_values = packet[analog_start + self.analog_mask_bytes:-2]
+            changed = int.from_bytes(packet[analog_start:analog_start + self.analog_mask_bytes], 'little')
+            if changed >> self.ANALOG_INPUTS or len(changed_values) != bin(changed).count('1'):
+                raise DataIntegrityError('Input delta packet does not match its change mask. Original data: %s' %
+                                         packet.hex())
+            changed_channels = [analog_num for analog_num in range(self.ANALOG_INPUTS) if changed & (1 << analog_num)]
+
+            # One byte per changed analog value, applied to the last values received
+            analog_array = bytearray(self.received_analogs)
+            for analog_num, value in zip(changed_channels, changed_values):
+                analog_array[analog_num] = value
+            analog_values = bytes(analog_array)
+
+        else:
+            raise DataIntegrityError('Unexpected packet type 0x%02X' % packet_type)
+
+        # At this point, we know the data is valid
+        self.received_analogs = analog_values
+
+        # The switch mask is already bit n = switch n
+        switch_mask = int.from_bytes(packet[1:analog_start], 'little') & ((1 << self.SWITCH_INPUTS) - 1)
+
+        # Return the packet type, sequence number, switch and analog data
+        return packet_type, packet[-2], switch_mask, analog_values
@@ -0,0 +1,26 @@
+import sys
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.ControlBoardSerialBaseFw2 import ControlBoardSerialBaseFw2
+else:
+    # Test Mode
+    from cbhal.ControlBoardSerialBaseFw2 import ControlBoardSerialBaseFw2
+
+CB_SNAME = 'ControlBoard_1v1_Fw2'
+CB_LNAME = 'Control Board v1.1 (Firmware v2)'
+
+
+class HardwareAbstractionLayer(ControlBoardSerialBaseFw2):
+    """
+    ControlBoard_1v1 HAL - Uses ControlBoardSerialBaseFw2
+    """
+    CB_LNAME = CB_LNAME
+    CB_SNAME = CB_SNAME
+    LED_OUTPUTS = 16
+    PWM_OUTPUTS = 11
+    ANALOG_INPUTS = 16
+    SWITCH_INPUTS = 16
+
+    # USB Identifiers
+    PID = 24577
+    VID = 1027
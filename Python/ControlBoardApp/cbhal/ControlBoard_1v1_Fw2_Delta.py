@@ -0,0 +1,20 @@
+import sys
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.ControlBoard_1v1_Fw2 import HardwareAbstractionLayer as ControlBoard_1v1_Fw2
+else:
+    # Test Mode
+    from cbhal.ControlBoard_1v1_Fw2 import HardwareAbstractionLayer as ControlBoard_1v1_Fw2
+
+CB_SNAME = 'ControlBoard_1v1_Fw2_Delta'
+CB_LNAME = 'Control Board v1.1 (Firmware v2, Delta Mode)'
+
+
+class HardwareAbstractionLayer(ControlBoard_1v1_Fw2):
+    """
+    ControlBoard_1v1 HAL - Uses ControlBoardSerialBaseFw2 in delta mode, so outputs are only sent when they change and
+    the board only reports the inputs that changed
+    """
+    CB_LNAME = CB_LNAME
+    CB_SNAME = CB_SNAME
+    DELTA_MODE = True
@@ -0,0 +1,112 @@
+import sys
+import timeit
+
+
+def _build_table(polynomial=0x8C):
+    """
+    Builds the 256 entry lookup table for a reflected CRC-8.
+
+    :param polynomial: int - the reflected polynomial (0x8C for CRC-8/Maxim, 0x31 unreflected)
+    :return: tuple(int) - the lookup table
+    """
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 0x01:
+                crc = (crc >> 1) ^ polynomial
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+class Crc8MaximTable:
+    """
+    Table driven CRC-8/Maxim (Dallas 1-Wire) engine. Gives the same results as crccheck.crc.Crc8Maxim, but uses a
+    precomputed table so each byte costs a single lookup.
+
+    Use calc() for a whole packet, or process() and final() to update the CRC across multiple chunks.
+    """
+    TABLE = _build_table()
+
+    def __init__(self, initvalue=0):
+        """
+        :param initvalue: int - the initial CRC value
+        """
+        self.initvalue = initvalue
+        self.crc = initvalue
+
+    def reset(self):
+        """
+        Resets the CRC to its initial value.
+
+        :return:
+        """
+        self.crc = self.initvalue
+
+    def process(self, data):
+        """
+        Adds a chunk of data to the CRC.
+
+        :param data: bytes, bytearray or memoryview - the data
+        :return: Crc8MaximTable - self, so calls can be chained
+        """
+        self.crc = self.calc(data, self.crc)
+        return self
+
+    def final(self):
+        """
+        Returns the CRC of all the data processed so far.
+
+        :return: int - the CRC value
+        """
+        return self.crc
+
+    @classmethod
+    def calc(cls, data, initvalue=0):
+        """
+        Calculates the CRC of the data.
+
+        :param data: bytes, bytearray or memoryview - the data
+        :param initvalue: int - the initial CRC value, or the CRC of the previous chunk
+        :return: int - the CRC value
+        """
+        table = cls.TABLE
+        crc = initvalue
+        for byte in data:
+            crc = table[crc ^ byte]
+        return crc
+
+
+def benchmark(iterations=20000):
+    """
+    Compares the cost per packet of the table engine against crccheck's Crc8Maxim, using packets the size of the ones
+    exchanged with a Control Board v1.1.
+
+    :param iterations: int - number of CRC calculations per measurement
+    :return: dict - packet name to (packet length, crccheck usec/packet, table usec/packet)
+    """
+    from crccheck.crc import Crc8Maxim
+
+    packets = {
+        'Fw1v0 outputs': b'LED:65535;PWM:255,255,255,255,255,255,255,255,255,255,255;',
+        'Fw1v0 inputs': b'SW:ffff;ANA:255,255,255,255,255,255,255,255,255,255,255,255,255,255,255,255;',
+        'Fw2 outputs': bytes(range(1, 15)),
+        'Fw2 inputs': bytes(range(1, 20)),
+    }
+
+    results = {}
+    for name, packet in packets.items():
+        assert Crc8MaximTable.calc(packet) == Crc8Maxim.calc(packet, 0), 'CRC mismatch for %s' % name
+        crccheck_time = timeit.timeit(lambda: Crc8Maxim.calc(packet, 0), number=iterations)
+        table_time = timeit.timeit(lambda: Crc8MaximTable.calc(packet), number=iterations)
+        results.update({name: (len(packet), crccheck_time / iterations * 1e6, table_time / iterations * 1e6)})
+
+    return results
+
+
+if __name__ == '__main__':
+    print('%-16s %6s %18s %18s' % ('Packet', 'Bytes', 'crccheck (usec)', 'table (usec)'))
+    for packet_name, (length, crccheck_usec, table_usec) in benchmark(*map(int, sys.argv[1:2])).items():
+        print('%-16s %6d %18.2f %18.2f' % (packet_name, length, crccheck_usec, table_usec))
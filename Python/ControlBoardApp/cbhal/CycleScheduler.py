@@ -0,0 +1,136 @@
+import time
+
+
+class CycleScheduler:
+    """
+    Paces the HAL run loop at a fixed cycle rate. Deadlines are kept on a grid of monotonic times (deadline n = start +
+    n * period), so time lost to sleep overshoot or a slow cycle does not add up over the following cycles.
+
+    wait() sleeps until the next deadline. When busy_wait is set, the last busy_wait seconds are spent spinning on the
+    clock instead of sleeping, which trades some CPU time for a more precise wake up. A cycle that starts after its
+    deadline is counted as a missed deadline; if it is late by a whole period or more, the grid restarts from now
+    instead of running the skipped cycles back to back.
+
+    A cycle rate of None disables the scheduler, so the loop runs as fast as update() returns.
+    """
+
+    def __init__(self, cycle_rate=None, busy_wait=0.0):
+        """
+        :param cycle_rate: float - target cycles per second; None to free run
+        :param busy_wait: float - seconds before each deadline to stop sleeping and spin
+        """
+        self.cycle_rate = None
+        self.period_ns = None
+        self.busy_wait_ns = 0
+        self.deadline_ns = None
+        self.missed_deadlines = 0
+        self.skipped_cycles = 0
+        self.max_lateness_ns = 0
+        self.set_cycle_rate(cycle_rate)
+        self.set_busy_wait(busy_wait)
+
+    def set_cycle_rate(self, cycle_rate):
+        """
+        Changes the target cycle rate. The next call to wait() starts a new deadline grid.
+
+        :param cycle_rate: float - target cycles per second; None to free run
+        :return:
+        """
+        if cycle_rate is not None and cycle_rate <= 0:
+            raise ValueError('The cycle rate must be greater than 0 Hz, got %s' % cycle_rate)
+        self.cycle_rate = cycle_rate
+        self.period_ns = None if cycle_rate is None else int(round(1e9 / cycle_rate))
+        self.deadline_ns = None
+
+    def set_busy_wait(self, busy_wait):
+        """
+        Changes how long before each deadline wait() stops sleeping and spins.
+
+        :param busy_wait: float - seconds; 0 to only sleep
+        :return:
+        """
+        if busy_wait < 0:
+            raise ValueError('The busy wait time can not be negative, got %s' % busy_wait)
+        self.busy_wait_ns = int(busy_wait * 1e9)
+
+    def reset(self):
+        """
+        Restarts the deadline grid and clears the counters. Called when the board is reset.
+
+        :return:
+        """
+        self.deadline_ns = None
+        self.missed_deadlines = 0
+        self.skipped_cycles = 0
+        self.max_lateness_ns = 0
+
+    def wait(self):
+        """
+        Waits for the start of the next cycle. Returns immediately when free running, on the first call after a reset,
+        and when the deadline has already passed.
+
+        :return:
+        """
+        self.wait_until(self.next_deadline())
+
+    def next_deadline(self):
+        """
+        Moves on to the next cycle and returns the time it should start. Does not wait, so the asyncio engine can wait
+        for the deadline on its event loop.
+
+        :return: int - perf_counter_ns() time to start the cycle at; None to start it now
+        """
+        period_ns = self.period_ns
+        if period_ns is None:
+            return None
+
+        now_ns = time.perf_counter_ns()
+        deadline_ns = self.deadline_ns
+        if deadline_ns is None:
+            # First cycle, start the grid now
+            self.deadline_ns = now_ns + period_ns
+            return None
+
+        lateness_ns = now_ns - deadline_ns
+        self.deadline_ns = deadline_ns + period_ns
+        if lateness_ns <= 0:
+            return deadline_ns
+
+        # The last cycle ran past this cycle's deadline
+        self.missed_deadlines += 1
+        if lateness_ns > self.max_lateness_ns:
+            self.max_lateness_ns = lateness_ns
+        if lateness_ns >= period_ns:
+            # Drop the cycles that were skipped rather than catching up on them
+            self.skipped_cycles += lateness_ns // period_ns
+            self.deadline_ns = now_ns + period_ns
+        return None
+
+    def wait_until(self, deadline_ns):
+        """
+        Sleeps until a deadline, spinning for the last busy_wait seconds.
+
+        :param deadline_ns: int - perf_counter_ns() time to wait for; None to return immediately
+        :return:
+        """
+        if deadline_ns is None:
+            return
+        sleep_ns = deadline_ns - time.perf_counter_ns() - self.busy_wait_ns
+        if sleep_ns > 0:
+            time.sleep(sleep_ns / 1e9)
+        if self.busy_wait_ns:
+            while time.perf_counter_ns() < deadline_ns:
+                pass
+
+    def get_status(self):
+        """
+        Returns the scheduler settings and counters.
+
+        :return: dict - TargetRate (Hz, None if free running), BusyWait (s), Missed (deadlines), Skipped (cycles) and
+                 MaxLateness (ms)
+        """
+        return {'TargetRate': self.cycle_rate,
+                'BusyWait': self.busy_wait_ns / 1e9,
+                'Missed': self.missed_deadlines,
+                'Skipped': self.skipped_cycles,
+                'MaxLateness': self.max_lateness_ns / 1e6}
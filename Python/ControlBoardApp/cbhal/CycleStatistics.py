@@ -0,0 +1,147 @@
+import array
+import math
+import threading
+import time
+
+
+class CycleStatistics:
+    """
+    Fixed size ring buffer of HAL cycle times. The HAL thread calls record() once per cycle, which only stores the time
+    since the last call. The rate is kept as a running sum, so get_rate() costs the same for any window. Percentiles
+    and jitter are only calculated when get_statistics() is called, on the caller's thread. A lock keeps the buffer
+    consistent when the window is changed or the statistics are read from another thread.
+    """
+    DEFAULT_WINDOW = 1000
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        """
+        :param window: int - number of cycle times to keep
+        """
+        self.lock = threading.Lock()
+        self.window = 0
+        self.cycle_times = array.array('q')
+        self.index = 0
+        self.count = 0
+        self.total_ns = 0
+        self.last_time_ns = None
+        self.set_window(window)
+
+    def set_window(self, window):
+        """
+        Changes the number of cycle times to keep. Clears the recorded cycle times.
+
+        :param window: int - number of cycle times to keep
+        :return:
+        """
+        if window < 1:
+            raise ValueError('The cycle statistics window must hold at least 1 cycle, got %d' % window)
+        cycle_times = array.array('q', bytes(8 * int(window)))
+        with self.lock:
+            self.window = int(window)
+            self.cycle_times = cycle_times
+            self.clear()
+
+    def reset(self):
+        """
+        Clears the recorded cycle times. The next call to record() starts a new cycle.
+
+        :return:
+        """
+        with self.lock:
+            self.clear()
+
+    def clear(self):
+        """
+        Clears the recorded cycle times. The caller must hold the lock.
+
+        :return:
+        """
+        self.index = 0
+        self.count = 0
+        self.total_ns = 0
+        self.last_time_ns = None
+
+    def record(self):
+        """
+        Records the end of a cycle. Called by the HAL thread.
+
+        :return:
+        """
+        now_ns = time.perf_counter_ns()
+        with self.lock:
+            if self.last_time_ns is not None:
+                cycle_time_ns = now_ns - self.last_time_ns
+                index = self.index
+                if self.count < self.window:
+                    self.count += 1
+                else:
+                    self.total_ns -= self.cycle_times[index]
+                self.cycle_times[index] = cycle_time_ns
+                self.total_ns += cycle_time_ns
+                self.index = (index + 1) % self.window
+            self.last_time_ns = now_ns
+
+    def get_rate(self):
+        """
+        Returns the mean cycle rate over the window. None if no cycle has been recorded.
+
+        :return: float - cycles per second; None if not ready.
+        """
+        with self.lock:
+            count = self.count
+            total_ns = self.total_ns
+        if count == 0 or total_ns <= 0:
+            return None
+        return count * 1e9 / total_ns
+
+    def get_cycle_times(self):
+        """
+        Returns a copy of the recorded cycle times, oldest first.
+
+        :return: list(int) - cycle times in nanoseconds
+        """
+        with self.lock:
+            count = self.count
+            index = self.index
+            window = self.window
+            cycle_times = self.cycle_times.tolist()
+        if count < window:
+            return cycle_times[:count]
+        return cycle_times[index:] + cycle_times[:index]
+
+    @staticmethod
+    def percentile(sorted_values, fraction):
+        """
+        Returns a percentile of sorted values, using the nearest rank.
+
+        :param sorted_values: list - values in ascending order, not empty
+        :param fraction: float - percentile as a fraction, 0.0 to 1.0
+        :return: the value at the percentile
+        """
+        rank = int(math.ceil(fraction * len(sorted_values))) - 1
+        return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the recorded cycle times. Times are in milliseconds, jitter is the standard deviation
+        of the cycle time. All values except Samples and Window are None if no cycle has been recorded.
+
+        :return: dict - cycle statistics
+        """
+        cycle_times = self.get_cycle_times()
+        stats = {'Samples': len(cycle_times), 'Window': self.window, 'Rate': None, 'Mean': None, 'P50': None,
+                 'P95': None, 'P99': None, 'Max': None, 'Jitter': None}
+        if not cycle_times:
+            return stats
+
+        sorted_times = sorted(cycle_times)
+        mean_ns = sum(sorted_times) / len(sorted_times)
+        variance = sum((cycle_time - mean_ns) ** 2 for cycle_time in sorted_times) / len(sorted_times)
+        stats.update({'Rate': 1e9 / mean_ns if mean_ns > 0 else None,
+                      'Mean': mean_ns / 1e6,
+                      'P50': self.percentile(sorted_times, 0.50) / 1e6,
+                      'P95': self.percentile(sorted_times, 0.95) / 1e6,
+                      'P99': self.percentile(sorted_times, 0.99) / 1e6,
+                      'Max': sorted_times[-1] / 1e6,
+                      'Jitter': math.sqrt(variance) / 1e6})
+        return stats
@@ -0,0 +1,271 @@
+import collections
+import logging
+import threading
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class EventSubscription:
+    """
+    A callback subscribed to one type of event. Holds the latest value published to it until its dispatcher delivers
+    it, so a subscriber that falls behind only ever sees the newest value.
+    """
+
+    def __init__(self, event_type, callback, dispatcher):
+        """
+        :param event_type: str - the event type, one of EventBus.EVENTS
+        :param callback: function - called with the event value
+        :param dispatcher: EventDispatcher - the dispatcher that delivers the values
+        """
+        self.event_type = event_type
+        self.callback = callback
+        self.dispatcher = dispatcher
+        self.value = None
+        self.pending = False
+        self.active = True
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_error = None
+
+    def get_status(self):
+        """
+        Returns the subscription counters.
+
+        :return: dict - Published, Delivered, Coalesced (values replaced before they were delivered) and Errors
+        """
+        return {'Published': self.published,
+                'Delivered': self.delivered,
+                'Coalesced': self.coalesced,
+                'Errors': self.errors}
+
+
+class EventDispatcher:
+    """
+    Delivers the subscriptions of one subscriber on its own thread, so a slow subscriber only delays itself.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: str - name of the dispatcher thread
+        """
+        self.name = name
+        self.subscriptions = 0
+        self.ready = collections.deque()
+        self.condition = threading.Condition()
+        self.run_thread = False
+        self.thread = None
+
+    def post(self, subscription, value):
+        """
+        Stores the latest value of a subscription and wakes the dispatcher thread.
+
+        :param subscription: EventSubscription - the subscription
+        :param value: the event value
+        :return:
+        """
+        with self.condition:
+            subscription.published += 1
+            subscription.value = value
+            if subscription.pending:
+                subscription.coalesced += 1
+            else:
+                subscription.pending = True
+                self.ready.append(subscription)
+                self.condition.notify()
+
+    def start(self):
+        """
+        Starts the dispatcher thread.
+
+        :return:
+        """
+        if self.run_thread:
+            return
+        self.run_thread = True
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the dispatcher thread. Values that were not delivered yet are dropped, so the subscriptions get the next
+        value published after a restart.
+
+        :return:
+        """
+        if self.run_thread:
+            with self.condition:
+                self.run_thread = False
+                for subscription in self.ready:
+                    subscription.pending = False
+                    subscription.value = None
+                self.ready.clear()
+                self.condition.notify()
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+
+    def run(self):
+        """
+        Dispatcher thread. Delivers the latest value of each ready subscription, oldest first.
+
+        :return:
+        """
+        while True:
+            with self.condition:
+                while self.run_thread and not self.ready:
+                    self.condition.wait()
+                if not self.run_thread:
+                    break
+                subscription = self.ready.popleft()
+                subscription.pending = False
+                value = subscription.value
+                subscription.value = None
+
+            if not subscription.active:
+                continue
+            try:
+                subscription.callback(value)
+                subscription.delivered += 1
+                subscription.last_error = None
+            except Exception as e:
+                subscription.errors += 1
+                if str(e) != str(subscription.last_error):
+                    logger.error('Event subscriber for %s failed: \n %s' % (subscription.event_type,
+                                                                              traceback.format_exc()))
+                    subscription.last_error = e
+
+
+class EventBus:
+    """
+    Delivers HAL events to subscribers on dispatcher threads, so slow subscribers can not stall the HAL thread.
+
+    Each subscriber (callback) gets its own dispatcher thread, so a slow subscriber, such as the Network Table
+    publisher, does not delay the others, such as the GUI. publish() only stores the value in each subscription and
+    wakes its dispatcher. If a subscription has not been delivered yet, its value is replaced (latest value wins), so
+    the amount of queued work never grows past one value per subscription.
+    """
+    # Event types. All events carry the ControlBoardSnapshot that caused them.
+    EVENT_STATE_CHANGED = 'StateChanged'  # HAL state or running flag changed
+    EVENT_NEW_INPUTS = 'NewInputs'  # A HAL cycle completed with new input values
+    EVENT_OUTPUTS_CHANGED = 'OutputsChanged'  # The LED or PWM values sent to the board changed
+    EVENTS = (EVENT_STATE_CHANGED, EVENT_NEW_INPUTS, EVENT_OUTPUTS_CHANGED)
+
+    def __init__(self, name='EventBus'):
+        """
+        :param name: str - name prefix of the dispatcher threads
+        """
+        self.name = name
+        self.subscriptions = {event_type: () for event_type in self.EVENTS}
+        self.dispatchers = {}
+        self.lock = threading.Lock()
+        self.run_thread = False
+
+    def subscribe(self, event_type, callback):
+        """
+        Subscribes a callback to an event type. The callback is called on its dispatcher thread with the event value.
+        Subscribing the same callback to several event types shares one dispatcher thread, so its events stay in order.
+
+        :param event_type: str - one of EVENTS
+        :param callback: function - called with the event value
+        :return: EventSubscription - the subscription, used to unsubscribe
+        """
+        if event_type not in self.subscriptions:
+            raise KeyError('Invalid event type \"%s\"' % event_type)
+        with self.lock:
+            dispatcher = self.dispatchers.get(callback)
+            if dispatcher is None:
+                name = getattr(callback, '__name__', type(callback).__name__)
+                dispatcher = EventDispatcher(name='%s: %s' % (self.name, name))
+                self.dispatchers[callback] = dispatcher
+                if self.run_thread:
+                    dispatcher.start()
+            dispatcher.subscriptions += 1
+            subscription = EventSubscription(event_type, callback, dispatcher)
+            # Replace the tuple instead of appending, so publish() can read the subscriptions without the lock
+            self.subscriptions[event_type] += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Removes a subscription. A value that is waiting to be delivered is dropped. The subscriber's dispatcher thread
+        is stopped when its last subscription is removed.
+
+        :param subscription: EventSubscription - returned by subscribe()
+        :return:
+        """
+        with self.lock:
+            if not subscription.active:
+                return
+            subscription.active = False
+            self.subscriptions[subscription.event_type] = tuple(
+                sub for sub in self.subscriptions[subscription.event_type] if sub is not subscription)
+            dispatcher = subscription.dispatcher
+            dispatcher.subscriptions -= 1
+            if dispatcher.subscriptions:
+                dispatcher = None
+            else:
+                del self.dispatchers[subscription.callback]
+        if dispatcher is not None:
+            dispatcher.stop()
+
+    def unsubscribe_all(self):
+        """
+        Removes all subscriptions and stops their dispatcher threads.
+
+        :return:
+        """
+        with self.lock:
+            for event_type, subscriptions in self.subscriptions.items():
+                for subscription in subscriptions:
+                    subscription.active = False
+                self.subscriptions[event_type] = ()
+            dispatchers = list(self.dispatchers.values())
+            self.dispatchers.clear()
+        for dispatcher in dispatchers:
+            dispatcher.stop()
+
+    def publish(self, event_type, value):
+        """
+        Publishes an event to its subscribers. Never waits for a subscriber.
+
+        :param event_type: str - one of EVENTS
+        :param value: the event value
+        :return:
+        """
+        for subscription in self.subscriptions[event_type]:
+            subscription.dispatcher.post(subscription, value)
+
+    def start(self):
+        """
+        Starts the dispatcher threads. Subscribers added later start their dispatcher when they subscribe.
+
+        :return:
+        """
+        with self.lock:
+            self.run_thread = True
+            dispatchers = list(self.dispatchers.values())
+        for dispatcher in dispatchers:
+            dispatcher.start()
+
+    def stop(self):
+        """
+        Stops the dispatcher threads. Values that were not delivered yet are dropped.
+
+        :return:
+        """
+        with self.lock:
+            self.run_thread = False
+            dispatchers = list(self.dispatchers.values())
+        for dispatcher in dispatchers:
+            dispatcher.stop()
+
+    def get_status(self):
+        """
+        Returns the counters of each subscription, grouped by event type.
+
+        :return: dict - event type to a list of subscription counters
+        """
+        return {event_type: [subscription.get_status() for subscription in subscriptions]
+                for event_type, subscriptions in self.subscriptions.items()}
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HotplugWatcher:
+    """
+    Decides when a disconnected serial HAL should try to connect again.
+
+    After a failed attempt, the next one waits for a backoff time that doubles with every failure, up to MAX_BACKOFF,
+    so an unplugged board does not keep the HAL enumerating ports. The wait ends early when a serial device is plugged
+    in. On Linux, that is seen by listing /sys/class/tty every POLL_PERIOD, which only reads a directory, instead of
+    enumerating the ports with their USB details. On other systems only the backoff is used.
+    """
+    POLL_PERIOD = 0.02  # second(s), how often to check for a plugged in device
+    MIN_BACKOFF = 0.05  # second(s), wait after the first failed attempt
+    MAX_BACKOFF = 2.0  # second(s), longest wait between attempts
+    TTY_CLASS_PATH = '/sys/class/tty'
+
+    def __init__(self):
+        self.signature = None
+        self.backoff = self.MIN_BACKOFF
+        self.next_attempt_time = 0.0
+        self.attempts = 0
+        self.failures = 0
+        self.hotplugs = 0
+        self.failure_time = None
+        self.last_outage = None
+
+    @classmethod
+    def get_signature(cls):
+        """
+        Returns a value that changes when a serial device is plugged in or removed.
+
+        :return: tuple - the serial device names; None if devices can not be watched on this system
+        """
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            return tuple(sorted(os.listdir(cls.TTY_CLASS_PATH)))
+        except OSError:
+            return None
+
+    def is_attempt_due(self):
+        """
+        Returns True if the next connection attempt should be made now: the backoff time is over, or the serial
+        devices changed since the last failure.
+
+        :return: bool
+        """
+        if time.perf_counter() >= self.next_attempt_time:
+            return True
+        signature = self.get_signature()
+        if signature is not None and signature != self.signature:
+            logger.debug('Serial devices changed, trying to connect now')
+            self.hotplugs += 1
+            self.signature = signature
+            return True
+        return False
+
+    def wait(self, keep_waiting):
+        """
+        Waits until the next connection attempt is due.
+
+        :param keep_waiting: function - returns False to stop waiting, such as when the HAL is stopped
+        :return:
+        """
+        while keep_waiting() and not self.is_attempt_due():
+            time.sleep(self.POLL_PERIOD)
+
+    async def async_wait(self, keep_waiting):
+        """
+        asyncio version of wait().
+
+        :param keep_waiting: function - returns False to stop waiting, such as when the HAL is stopped
+        :return:
+        """
+        while keep_waiting() and not self.is_attempt_due():
+            await asyncio.sleep(self.POLL_PERIOD)
+
+    def record_attempt(self):
+        """
+        Counts a connection attempt. Called before connecting.
+
+        :return:
+        """
+        self.attempts += 1
+        if self.failure_time is None:
+            self.failure_time = time.perf_counter()
+
+    def record_failure(self):
+        """
+        Counts a failed connection attempt and backs off before the next one.
+
+        :return:
+        """
+        self.failures += 1
+        self.signature = self.get_signature()
+        self.next_attempt_time = time.perf_counter() + self.backoff
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+
+    def record_success(self):
+        """
+        Records a successful connection. The next disconnection starts again without a backoff.
+
+        :return:
+        """
+        if self.failure_time is not None:
+            self.last_outage = time.perf_counter() - self.failure_time
+            self.failure_time = None
+        self.backoff = self.MIN_BACKOFF
+        self.next_attempt_time = 0.0
+
+    def get_status(self):
+        """
+        Returns the reconnection counters.
+
+        :return: dict - Attempts, Failures, Hotplugs (attempts started by a device change), Backoff (s, next wait
+                 after a failure) and LastOutage (s from the first attempt to the connection, None before the first)
+        """
+        return {'Attempts': self.attempts,
+                'Failures': self.failures,
+                'Hotplugs': self.hotplugs,
+                'Backoff': self.backoff,
+                'LastOutage': self.last_outage}
@@ -0,0 +1,125 @@
+import logging
+import sys
+import threading
+import time
+
+import serial.tools.list_ports as lp
+
+logger = logging.getLogger(__name__)
+
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.HotplugWatcher import HotplugWatcher
+else:
+    # Test Mode
+    from cbhal.HotplugWatcher import HotplugWatcher
+
+
+class SerialPortIndex:
+    """
+    Cached list of the serial ports, shared by all the serial HALs.
+
+    lp.comports() walks sysfs (or the registry) and reads the USB details of every port, so it is only called again
+    when the serial devices change. On Linux, changes are seen with the same cheap /sys/class/tty listing the
+    HotplugWatcher uses. On other systems, the cache expires after MAX_AGE instead. invalidate() forces a new scan,
+    such as after a port failed to open.
+
+    The index also remembers the last port each board connected on, so a reconnect tries that port first.
+    """
+    MAX_AGE = 2.0  # second(s), how long the cache is used when the devices can not be watched
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ports = ()
+        self.signature = None
+        self.scan_time = None
+        self.last_good_ports = {}
+        self.scans = 0
+        self.cache_hits = 0
+
+    def invalidate(self):
+        """
+        Forces a new scan on the next lookup.
+
+        :return:
+        """
+        with self.lock:
+            self.scan_time = None
+
+    def get_ports(self):
+        """
+        Returns the serial ports, scanning them again only if the devices changed.
+
+        :return: tuple(ListPortInfo) - the ports
+        """
+        signature = HotplugWatcher.get_signature()
+        with self.lock:
+            now = time.perf_counter()
+            if self.scan_time is not None and signature == self.signature and \
+                    (signature is not None or now - self.scan_time < self.MAX_AGE):
+                self.cache_hits += 1
+                return self.ports
+
+            self.ports = tuple(lp.comports())
+            self.signature = signature
+            self.scan_time = now
+            self.scans += 1
+            return self.ports
+
+    def find(self, vid=None, pid=None, serial_number=None, location=None):
+        """
+        Returns the ports that match all the given USB details.
+
+        :param vid: int - USB VID; None to accept any
+        :param pid: int - USB PID; None to accept any
+        :param serial_number: str - USB serial number; None to accept any
+        :param location: str - USB location, such as 1-1.2:1.0; None to accept any
+        :return: list(ListPortInfo) - the matching ports, in the order they were enumerated
+        """
+        return [port for port in self.get_ports()
+                if (vid is None or port.vid == vid) and
+                (pid is None or port.pid == pid) and
+                (serial_number is None or port.serial_number == serial_number) and
+                (location is None or port.location == location)]
+
+    @staticmethod
+    def get_key(vid, pid, serial_number=None, location=None):
+        """
+        Returns the key a board's last good port is remembered under.
+
+        :param vid: int - USB VID
+        :param pid: int - USB PID
+        :param serial_number: str - USB serial number the board is bound to; None if not bound
+        :param location: str - USB location the board is bound to; None if not bound
+        :return: tuple - the key
+        """
+        return vid, pid, serial_number, location
+
+    def remember(self, key, port_name):
+        """
+        Remembers the port a board connected on.
+
+        :param key: tuple - from get_key()
+        :param port_name: str - the port name
+        :return:
+        """
+        self.last_good_ports[key] = port_name
+
+    def get_last_good(self, key):
+        """
+        Returns the port a board last connected on.
+
+        :param key: tuple - from get_key()
+        :return: str - the port name; None if the board has not connected yet
+        """
+        return self.last_good_ports.get(key)
+
+    def get_status(self):
+        """
+        Returns the index counters.
+
+        :return: dict - Ports (number of ports), Scans (lp.comports() calls) and CacheHits (lookups served from the cache)
+        """
+        return {'Ports': len(self.ports),
+                'Scans': self.scans,
+                'CacheHits': self.cache_hits}
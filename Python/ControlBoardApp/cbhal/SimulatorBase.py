@@ -17,6 +17,9 @@ else:
 class SimulatorBase(ControlBoardBase):
     """ Simulator base class for using a simulated control board"""
 
+    # CPU Saver - The simulator answers instantly, so the scheduler is the only bound on how fast it updates.
+    CYCLE_RATE = 50  # Hz
+
     def __init__(self):
         super(SimulatorBase, self).__init__()
         self.connected = False
@@ -65,10 +68,9 @@ class SimulatorBase(ControlBoardBase):
 
             # Update screen
             self.sim.update_indicators()
-            # CPU Saver - This is the only bound on how fast the simulator updates.
-            time.sleep(20e-3)
 
             # Get inputs
+            self.record_input_time()
             self.putAnalogvalues(self.sim.get_analogs())
             self.putSwitchvalues(self.sim.get_switches())
         else:
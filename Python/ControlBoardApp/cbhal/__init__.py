@@ -1,3 +1,5 @@
+import collections
+import functools
 import logging
 import os
 import importlib
@@ -6,19 +8,24 @@ import importlib
 class ControlBoardHalInterfaceHandler:
     """
     This class parses the cbhal folder to look for different control board interfaces. It handles setting up the class
-    instance as well as starting and stopping the Control Board Hardware Abstraction Layer (CBHAL)
+    instances as well as starting and stopping the Control Board Hardware Abstraction Layers (CBHAL)
+
+    Several control boards can run at once. Each board has a name and its own CBHAL, running its own acquisition loop.
+    The primary board (PRIMARY_BOARD) is the one selected with init_cbtype_inst(), and is the default for all the
+    methods that take a board name.
     """
+    PRIMARY_BOARD = ''
 
     def __init__(self):
         self.logger = logging.getLogger('ControlBoardHalInterfaceHandler')
         self.main_window = None
         self.cbtypes = {}
-        self.cbhal_inst = None
         self.scan_for_hal_interfaces()
-        self.event_handler = None
-        self.cb_sname = None
-        self.cbhal = None
-        self.sim = None
+        self.subscriptions = []
+        self.engine = None
+        # Board name to a dictionary with the board type short name [sname], long name [name], module [module],
+        # CBHAL instance [cbhal], simulator frame [sim], port [port] and USB serial number [serial_number]
+        self.boards = collections.OrderedDict()
 
     def scan_for_hal_interfaces(self):
         """
@@ -58,70 +65,148 @@ class ControlBoardHalInterfaceHandler:
         else:
             raise (IndexError('No control board plugin instances found.'))
 
-    def set_event_handler(self, event_handler):
+    def subscribe(self, event_type, callback):
+        """
+        Subscribes a callback to a CBHAL event. The subscription is applied to every CBHAL started from here on.
+        :param event_type: str - EventBus.EVENT_STATE_CHANGED, EVENT_NEW_INPUTS or EVENT_OUTPUTS_CHANGED
+        :param callback: The function to call with the board name and the snapshot that caused the event.
+        :return: 
+        """
+        self.subscriptions.append((event_type, callback))
+
+    def unsubscribe_all(self):
+        """
+        Removes all event subscriptions, including the ones of the running CBHALs.
+        :return: 
+        """
+        self.subscriptions.clear()
+        for board in self.boards.values():
+            board['cbhal'].event_bus.unsubscribe_all()
+
+    def set_async_engine(self, engine):
         """
-        Sets the event handler to process new data.
-        :param event_handler: The function to call when new data arrives.
+        Runs the CBHALs started from here on as tasks on an asyncio engine, instead of a thread each.
+        :param engine: AsyncEngine - the engine; None to use a thread per CBHAL
         :return: 
         """
-        self.event_handler = event_handler
+        self.engine = engine
 
-    def start_cbhal(self):
+    def start_cbhal(self, board_name=None):
         """
-        Starts the CBHAL
+        Starts a CBHAL
+        :param board_name: str - the board to start; None to start all the boards
         :return: 
         """
-        if self.cbhal_inst is None:
+        if self.PRIMARY_BOARD not in self.boards:
             raise ReferenceError('The init_cbtype_inst method must be called prior to start_cbhal')
 
-        if self.event_handler is None:
-            raise ReferenceError('The event responder must be set before instantiating a new CB HAL')
+        if not self.subscriptions:
+            raise ReferenceError('The event subscriptions must be set before instantiating a new CB HAL')
 
-        self.cbhal.set_event_handler(self.event_handler)
-        self.cbhal.start()
+        for name in (self.get_board_names() if board_name is None else [board_name]):
+            board = self.get_board(name)
+            cbhal = board['cbhal']
+            if cbhal.is_cbhal_running():
+                continue
 
-        # If HAL is simulated, show the simulator window
-        if self.cbhal.is_simulator():
-            self.sim = self.get_module().SimulatorFrame(self.main_window, self.cbhal, self.get_cbhal_inst_name())
-            self.cbhal.set_sim_connection(self.sim)
-            self.sim.Show()
+            cbhal.event_bus.unsubscribe_all()
+            for event_type, callback in self.subscriptions:
+                cbhal.subscribe(event_type, functools.partial(callback, name))
+            if self.engine is not None:
+                self.engine.start_hal(cbhal)
+            else:
+                cbhal.engine = None
+                cbhal.start()
 
-    def shutdown_cbhal(self):
+            # If HAL is simulated, show the simulator window
+            if cbhal.is_simulator():
+                title = board['name'] if name == self.PRIMARY_BOARD else '%s - %s' % (name, board['name'])
+                board['sim'] = board['module'].SimulatorFrame(self.main_window, cbhal, title)
+                cbhal.set_sim_connection(board['sim'])
+                board['sim'].Show()
+
+    def shutdown_cbhal(self, board_name=None):
         """
-        Shuts down the CBHAL
+        Shuts down a CBHAL. The board is kept, so it can be started again.
+        :param board_name: str - the board to shut down; None to shut down all the boards
         :return: 
         """
-        if self.cbhal_inst is not None:
-            self.logger.info('Shutting down HAL interface: %s')
-
-        else:
+        if not self.boards:
             self.logger.warning('Shutdown called when no CB Instance was found')
             return
 
-        if self.cbhal.is_simulator():
-            self.sim.Hide()
+        for name in (self.get_board_names() if board_name is None else [board_name]):
+            board = self.get_board(name)
+            self.logger.info('Shutting down HAL interface: %s' % (name if name else board['name']))
+
+            if board['sim'] is not None:
+                board['sim'].Hide()
 
-        self.cbhal.stop()
-        del self.cbhal
-        self.cbhal = None
-        self.cbhal_inst = None
+            board['cbhal'].stop()
 
-    def init_cbtype_inst(self, cb_sname):
+    def init_cbtype_inst(self, cb_sname, port_name='auto', serial_number=None):
         """
-        Initializes the CBHAL
+        Initializes the primary CBHAL, replacing the current one.
         :param cb_sname: 
+        :param port_name: str - port the board is connected to, such as COM1, or 'auto'
+        :param serial_number: str - USB serial number of the board; None to accept any
+        :return: 
+        """
+        self.add_board(cb_sname, self.PRIMARY_BOARD, port_name, serial_number)
+
+    def add_board(self, cb_sname, board_name, port_name='auto', serial_number=None):
+        """
+        Initializes a CBHAL for a board. A board with the same name is shut down and replaced.
+        :param cb_sname: str - the board type short name (CB_SNAME)
+        :param board_name: str - name of the board, PRIMARY_BOARD for the primary board
+        :param port_name: str - port the board is connected to, such as COM1, or 'auto'
+        :param serial_number: str - USB serial number of the board; None to accept any
         :return: 
         """
         if cb_sname not in self.cbtypes:
             raise KeyError('Invalid CB type \"%s\"' % cb_sname)
 
-        self.cb_sname = cb_sname
+        if board_name in self.boards:
+            self.shutdown_cbhal(board_name)
 
-        if self.cbhal_inst is not None:
-            self.shutdown_cbhal()
+        cbhal = self.cbtypes[cb_sname]['module'].HardwareAbstractionLayer()
+        cbhal.set_port_binding(port_name, serial_number)
+        self.boards[board_name] = {'sname': cb_sname,
+                                   'name': self.cbtypes[cb_sname]['name'],
+                                   'module': self.cbtypes[cb_sname]['module'],
+                                   'cbhal': cbhal,
+                                   'sim': None,
+                                   'port': port_name,
+                                   'serial_number': serial_number}
 
-        self.cbhal_inst = self.cbtypes[self.cb_sname]
-        self.cbhal = self.get_module().HardwareAbstractionLayer()
+    def remove_board(self, board_name):
+        """
+        Shuts down a board and removes it.
+        :param board_name: str - name of the board
+        :return: 
+        """
+        self.shutdown_cbhal(board_name)
+        del self.boards[board_name]
+
+    def get_board_names(self):
+        """
+        Returns the names of all the boards, primary board first.
+        :return: list(str)
+        """
+        return list(self.boards.keys())
+
+    def get_board(self, board_name=PRIMARY_BOARD):
+        """
+        Returns a board's dictionary.
+        :param board_name: str - name of the board
+        :return: dict
+        """
+        if board_name in self.boards:
+            return self.boards[board_name]
+        elif board_name == self.PRIMARY_BOARD:
+            raise UnboundLocalError('The cbhal is still null. Please call init_cbhal(\'CB_SNAME\') first.')
+        else:
+            raise KeyError('No control board named \"%s\"' % board_name)
 
     def set_main_window(self, frame):
         """
@@ -131,49 +216,41 @@ class ControlBoardHalInterfaceHandler:
         """
         self.main_window = frame
 
-    def get_module(self):
+    def get_module(self, board_name=PRIMARY_BOARD):
         """
-        Returns the current CBHAL module. Used to start the SimulatorFrame.
+        Returns a board's CBHAL module. Used to start the SimulatorFrame.
+        :param board_name: str - name of the board
         :return: module
         """
-        if self.cbhal_inst is not None:
-            return self.cbhal_inst['module']
-        else:
-            raise UnboundLocalError('The cbhal is still null. Please call init_cbhal(\'CB_SNAME\') first.')
+        return self.get_board(board_name)['module']
 
-    def get_cbhal(self):
+    def get_cbhal(self, board_name=PRIMARY_BOARD):
         """
-        Returns the current CBHAL instance
+        Returns a board's CBHAL instance
+        :param board_name: str - name of the board
         :return: ControlBoardBase
         """
-        if self.cbhal_inst is not None:
-            return self.cbhal
-        else:
-            raise UnboundLocalError('The cbhal is still null. Please call init_cbhal(\'CB_SNAME\') first.')
+        return self.get_board(board_name)['cbhal']
 
-    def get_cbhal_inst_name(self):
+    def get_cbhal_inst_name(self, board_name=PRIMARY_BOARD):
         """
-        Returns the CBHAL Long Name
+        Returns a board's CBHAL Long Name
+        :param board_name: str - name of the board
         :return: str
         """
-        if self.cbhal_inst is not None:
-            return self.cbhal_inst['name']
-        else:
-            raise UnboundLocalError('The cbhal_inst is still null. Please call start_cbhal(\'CB_SNAME\') first.')
+        return self.get_board(board_name)['name']
 
-    def get_cbhal_inst_sname(self):
+    def get_cbhal_inst_sname(self, board_name=PRIMARY_BOARD):
         """
-        Returns the CBHAL Short Name
+        Returns a board's CBHAL Short Name
+        :param board_name: str - name of the board
         :return: str
         """
-        if self.cbhal_inst is not None:
-            return self.cb_sname
-        else:
-            raise UnboundLocalError('The cbhal_inst is still null. Please call start_cbhal(\'CB_SNAME\') first.')
+        return self.get_board(board_name)['sname']
 
     def is_valid(self):
         """
-        Returns if the CBHAL is valid. 
+        Returns if the primary CBHAL is valid. 
         :return: bool
         """
-        return self.cbhal is not None
+        return self.PRIMARY_BOARD in self.boards
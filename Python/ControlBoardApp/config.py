@@ -76,6 +76,68 @@ class ConfigFile:
         logger.info('Loaded NT server address from config: %s' % nt_address)
         return nt_address
 
+    def get_nt_publish_rate(self):
+        """
+        Returns the saved NT publish rate, how often the Network Table is updated at most.
+        
+        :return: float - updates per second; None to publish every HAL update
+        """
+        publish_rate = self._get_attribute_from_element_path('NetworkTableConfig', 'PublishRate', '100')
+        try:
+            publish_rate = float(publish_rate) if publish_rate.lower() != 'none' else None
+            if publish_rate is not None and publish_rate <= 0:
+                raise ValueError('must be greater than 0')
+        except ValueError:
+            logger.error('Invalid NT publish rate in config: %s. Using 100 Hz.' % publish_rate)
+            publish_rate = 100.0
+        logger.info('Loaded NT publish rate from config: %s' % publish_rate)
+        return publish_rate
+
+    def get_nt_min_flush_interval(self):
+        """
+        Returns the saved shortest time between two NT edge flushes. The config value is in milliseconds.
+        
+        :return: float - seconds; None to disable the low latency mode
+        """
+        interval = self._get_attribute_from_element_path('NetworkTableConfig', 'MinFlushInterval', '20')
+        try:
+            interval = float(interval) / 1000.0 if interval.lower() != 'none' else None
+            if interval is not None and interval < 10e-3:
+                raise ValueError('must be at least 10 ms')
+        except ValueError:
+            logger.error('Invalid NT minimum flush interval in config: %s. Using 20 ms.' % interval)
+            interval = 20e-3
+        logger.info('Loaded NT minimum flush interval from config: %s' % interval)
+        return interval
+
+    def get_nt_analog_flush_delta(self):
+        """
+        Returns the saved analog change that flushes the Network Table right away in low latency mode.
+        
+        :return: int - analog counts; None to only flush on switch changes
+        """
+        delta = self._get_attribute_from_element_path('NetworkTableConfig', 'AnalogFlushDelta', 'none')
+        try:
+            delta = int(delta) if delta.lower() != 'none' else None
+            if delta is not None and delta <= 0:
+                raise ValueError('must be greater than 0')
+        except ValueError:
+            logger.error('Invalid NT analog flush delta in config: %s. Only flushing on switch changes.' % delta)
+            delta = None
+        logger.info('Loaded NT analog flush delta from config: %s' % delta)
+        return delta
+
+    def get_nt_latency_trace(self):
+        """
+        Returns whether the input latency is traced.
+        
+        :return: bool - True to trace the input latency
+        """
+        latency_trace = self._get_attribute_from_element_path('NetworkTableConfig', 'LatencyTrace', 'True')
+        latency_trace = latency_trace.lower() != 'false'
+        logger.info('Loaded NT latency trace from config: %s' % latency_trace)
+        return latency_trace
+
     def set_nt_server_address(self, nt_address):
         """
         Sets the NT server address to the config file.
@@ -107,6 +169,50 @@ class ConfigFile:
         self._set_attribute_from_element_path('ControlBoardConfig', 'Type', cb_type)
         self.save_config()
 
+    def get_cb_binding(self):
+        """
+        Returns the saved port binding of the control board.
+        
+        :return: tuple(str, str) - port name ('auto' if not set) and USB serial number (None if not set)
+        """
+        port_name = self._get_attribute_from_element_path('ControlBoardConfig', 'Port', 'auto')
+        serial_number = self._get_attribute_from_element_path('ControlBoardConfig', 'SerialNumber', '')
+        return port_name, serial_number if serial_number else None
+
+    def get_hal_engine(self):
+        """
+        Returns how the CBHALs are run: 'thread' for a thread per control board, or 'asyncio' for one shared asyncio
+        event loop.
+        
+        :return: str - 'thread' (default) or 'asyncio'
+        """
+        engine = self._get_attribute_from_element_path('ControlBoardConfig', 'Engine', 'thread').lower()
+        if engine not in ('thread', 'asyncio'):
+            logger.error('Unknown HAL engine in config: %s. Using thread.' % engine)
+            engine = 'thread'
+        logger.info('Loaded HAL engine from config: %s' % engine)
+        return engine
+
+    def get_additional_boards(self):
+        """
+        Returns the additional control boards, which run alongside the selected control board. Each one is a Board
+        element in ControlBoardConfig, such as:
+        
+            <Board Name="ButtonBox" Type="ArduinoUno_Fw2" Port="auto" SerialNumber="85739313..." />
+        
+        :return: list(dict) - Name, Type, Port ('auto' if not set) and SerialNumber (None if not set) of each board
+        """
+        boards = []
+        cb_config = self._get_element_from_path('ControlBoardConfig', pass_on_error=True)
+        if cb_config is not None:
+            for board in cb_config.findall('Board'):
+                boards.append({'Name': self._get_attribute(board, 'Name', ''),
+                               'Type': self._get_attribute(board, 'Type', ''),
+                               'Port': self._get_attribute(board, 'Port', 'auto'),
+                               'SerialNumber': self._get_attribute(board, 'SerialNumber', '') or None})
+                logger.info('Loaded additional control board from config: %s' % str(boards[-1]))
+        return boards
+
     @staticmethod
     def get_logging_levels():
         """
@@ -0,0 +1,672 @@
+"""
+Emulates the Control Board firmware on a pseudo-terminal, so the serial HALs can be run, benchmarked and tested on a
+Linux machine without any hardware. The tests in the tests folder drive the HALs through it.
+
+Usage (from the ControlBoardApp folder):
+    python firmware_emulator.py ControlBoard_1v1 --duration 10
+    python firmware_emulator.py ControlBoard_1v1 --legacy
+    python firmware_emulator.py ControlBoard_1v1_Fw2 --byte-delay 87e-6 --corrupt-rate 0.01
+    python firmware_emulator.py ControlBoard_1v1_Fw2 --asyncio
+    python firmware_emulator.py ControlBoard_1v1_Fw2 --delta
+"""
+import argparse
+import importlib
+import logging
+import os
+import random
+import select
+import sys
+import threading
+import time
+
+import serial
+
+try:
+    # Pseudo-terminals are only available on Linux and macOS. This module is also bundled with the Windows build.
+    import pty
+    import tty
+except ImportError:
+    pty = None
+    tty = None
+
+logger = logging.getLogger(__name__)
+
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.AsyncEngine import AsyncEngine
+    from ControlBoardApp.cbhal.ControlBoardSerialBaseFw2 import ControlBoardSerialBaseFw2
+    from ControlBoardApp.cbhal.Crc8MaximTable import Crc8MaximTable
+else:
+    # Test Mode
+    from cbhal.AsyncEngine import AsyncEngine
+    from cbhal.ControlBoardSerialBaseFw2 import ControlBoardSerialBaseFw2
+    from cbhal.Crc8MaximTable import Crc8MaximTable
+
+
+class EmulatedSerial(serial.Serial):
+    """
+    Serial port for a pseudo-terminal created by FirmwareEmulator. A pseudo-terminal has no modem lines, so asserting
+    DTR is passed on to the emulator as a reset instead. Opening the port does not reset the emulator, as if the board
+    had finished booting before the HAL pulses DTR.
+    """
+
+    def _update_dtr_state(self):
+        emulator = FirmwareEmulator.instances.get(self.port)
+        if emulator is not None and self.is_open and self._dtr_state:
+            emulator.reset()
+
+    def _update_rts_state(self):
+        pass
+
+
+class Fw1v0Protocol:
+    """ Emulates the ASCII line protocol of firmware v1.0. """
+    WELCOME_MESSAGE = b'FRC Control Board\r\n'
+    TERMINATOR = b'\n'
+
+    def __init__(self, emulator):
+        """
+        :param emulator: FirmwareEmulator - the emulated board
+        """
+        self.emulator = emulator
+
+    def reset(self):
+        """
+        Called when the board resets.
+
+        :return:
+        """
+        pass
+
+    def process(self, frame):
+        """
+        Processes a line from the host. The inputs are sent back even if the CRC check fails, like the firmware does.
+
+        :param frame: bytes - the line, without the terminator
+        :return: list(bytes) - replies
+        """
+        data, _, crc_string = frame.partition(b'CRC:')
+        crc_digits = crc_string.strip(b'\r;')
+        if crc_digits.isdigit() and int(crc_digits) == Crc8MaximTable.calc(data, 0):
+            try:
+                led_string = data[data.index(b'LED:') + len(b'LED:'):data.index(b';')]
+                pwm_string = data[data.index(b'PWM:') + len(b'PWM:'):].rstrip(b';')
+                led_mask = int(led_string) >> (16 - self.emulator.led_outputs)
+                pwms = [int(pwm) & 0xFF for pwm in pwm_string.split(b',')]
+                self.emulator.set_outputs([bool(led_mask & (1 << led_num))
+                                           for led_num in range(self.emulator.led_outputs)], pwms)
+            except ValueError:
+                self.emulator.count('ParseErrors')
+        else:
+            self.emulator.count('CrcErrors')
+
+        return [self.inputs_line()]
+
+    def poll(self):
+        """
+        Called periodically. Firmware v1.0 only sends when it receives.
+
+        :return: list(bytes) - replies
+        """
+        return []
+
+    def inputs_line(self):
+        """
+        Builds the inputs line from the emulated inputs.
+
+        :return: bytes - the line, including the line ending
+        """
+        switches, analogs = self.emulator.get_inputs()
+        switch_mask = sum(1 << switch_num for switch_num, switch in enumerate(switches) if switch)
+        data = ('SW:%x;ANA:%s;' % (switch_mask, ','.join(map(str, analogs)))).encode()
+        return data + b'CRC:' + str(Crc8MaximTable.calc(data, 0)).encode() + b';\r\n'
+
+
+class Fw2Protocol:
+    """ Emulates the binary framed protocol of firmware v2, including delta mode. """
+    WELCOME_MESSAGE = ControlBoardSerialBaseFw2.WELCOME_MESSAGE.encode()
+    TERMINATOR = bytes([ControlBoardSerialBaseFw2.FRAME_END])
+
+    # Same as binaryProtocol.h
+    FULL_SYNC_PERIOD = 0.1  # second(s)
+    INPUT_DELTA_PERIOD = 5e-3  # second(s)
+    ANALOG_DELTA_THRESHOLD = 2
+
+    def __init__(self, emulator):
+        """
+        :param emulator: FirmwareEmulator - the emulated board
+        """
+        self.emulator = emulator
+        self.led_mask_bytes = (emulator.led_outputs + 7) // 8
+        self.switch_mask_bytes = (emulator.switch_inputs + 7) // 8
+        self.analog_mask_bytes = (emulator.analog_inputs + 7) // 8
+        self.outputs_packet_len = 1 + self.led_mask_bytes + emulator.pwm_outputs + 2
+        self.mode = None
+        self.sequence = None
+        self.last_sync_time = None
+        self.last_delta_time = None
+        self.last_switch_mask = None
+        self.last_analogs = None
+        self.reset()
+
+    def reset(self):
+        """
+        Called when the board resets, or times out waiting for the host.
+
+        :return:
+        """
+        self.mode = ControlBoardSerialBaseFw2.MODE_REQUEST_RESPONSE
+        self.sequence = 0
+        self.last_sync_time = time.perf_counter()
+        self.last_delta_time = time.perf_counter()
+        self.last_switch_mask = 0
+        self.last_analogs = [0] * self.emulator.analog_inputs
+
+    def process(self, frame):
+        """
+        Processes a frame from the host, the same way as runBinaryProtocol() in the firmware.
+
+        :param frame: bytes - the frame, without the terminator
+        :return: list(bytes) - replies
+        """
+        if not frame:
+            return []
+
+        packet = ControlBoardSerialBaseFw2.unstuff_frame(frame)
+        valid_crc = len(packet) >= 2 and packet[-1] == Crc8MaximTable.calc(packet[:-1], 0)
+        self.sequence = packet[-2] if len(packet) >= 2 else 0
+
+        if packet[0] == ControlBoardSerialBaseFw2.PACKET_CONFIG:
+            if valid_crc and len(packet) == 4:
+                self.mode = packet[1]
+            else:
+                self.emulator.count('CrcErrors')
+            return [self.inputs_packet()]
+
+        valid = valid_crc and packet[0] == ControlBoardSerialBaseFw2.PACKET_OUTPUTS and \
+            len(packet) == self.outputs_packet_len
+        if valid:
+            led_mask = int.from_bytes(packet[1:1 + self.led_mask_bytes], 'little')
+            self.emulator.set_outputs([bool(led_mask & (1 << led_num)) for led_num in range(self.emulator.led_outputs)],
+                                      list(packet[1 + self.led_mask_bytes:-2]))
+        else:
+            self.emulator.count('CrcErrors')
+
+        if self.mode != ControlBoardSerialBaseFw2.MODE_DELTA or not valid:
+            return [self.inputs_packet()]
+        return []
+
+    def poll(self):
+        """
+        Called periodically. Sends the input delta and full sync packets in delta mode.
+
+        :return: list(bytes) - replies
+        """
+        if self.mode != ControlBoardSerialBaseFw2.MODE_DELTA:
+            return []
+
+        now = time.perf_counter()
+        if now - self.last_sync_time >= self.FULL_SYNC_PERIOD:
+            return [self.inputs_packet()]
+        if now - self.last_delta_time >= self.INPUT_DELTA_PERIOD:
+            packet = self.input_delta_packet()
+            if packet is not None:
+                self.last_delta_time = now
+                return [packet]
+        return []
+
+    def inputs_packet(self):
+        """
+        Builds a full inputs packet from the emulated inputs.
+
+        :return: bytes - the frame
+        """
+        switches, analogs = self.emulator.get_inputs()
+        self.last_switch_mask = sum(1 << switch_num for switch_num, switch in enumerate(switches) if switch)
+        self.last_analogs = list(analogs)
+        self.last_sync_time = time.perf_counter()
+
+        packet = bytearray([ControlBoardSerialBaseFw2.PACKET_INPUTS])
+        packet += self.last_switch_mask.to_bytes(self.switch_mask_bytes, 'little')
+        packet += bytes(analogs)
+        return self.finish_packet(packet)
+
+    def input_delta_packet(self):
+        """
+        Builds an input delta packet if the inputs changed since the last packet.
+
+        :return: bytes - the frame, or None if nothing changed
+        """
+        switches, analogs = self.emulator.get_inputs()
+        switch_mask = sum(1 << switch_num for switch_num, switch in enumerate(switches) if switch)
+        changed = [analog_num for analog_num, analog in enumerate(analogs)
+                   if abs(analog - self.last_analogs[analog_num]) >= self.ANALOG_DELTA_THRESHOLD]
+        if switch_mask == self.last_switch_mask and not changed:
+            return None
+
+        analog_mask = sum(1 << analog_num for analog_num in changed)
+        packet = bytearray([ControlBoardSerialBaseFw2.PACKET_INPUT_DELTA])
+        packet += switch_mask.to_bytes(self.switch_mask_bytes, 'little')
+        packet += analog_mask.to_bytes(self.analog_mask_bytes, 'little')
+        for analog_num in changed:
+            packet.append(analogs[analog_num])
+            self.last_analogs[analog_num] = analogs[analog_num]
+        self.last_switch_mask = switch_mask
+        return self.finish_packet(packet)
+
+    def finish_packet(self, packet):
+        """
+        Adds the sequence number and CRC, then byte stuffs the packet.
+
+        :param packet: bytearray - type and data
+        :return: bytes - the frame
+        """
+        packet.append(self.sequence)
+        packet.append(Crc8MaximTable.calc(packet, 0))
+        return ControlBoardSerialBaseFw2.stuff_frame(packet)
+
+
+class FirmwareEmulator:
+    """
+    Emulates a Control Board on a pseudo-terminal. The board is reset (and sends its welcome message) when the HAL
+    pulses DTR, checks the CRC of the outputs it receives, and replies with the emulated inputs.
+
+    Use hal_class() to get a HAL class that connects to the emulator instead of searching for a USB device.
+    """
+    # Emulators by port name, used by EmulatedSerial to pass on DTR resets
+    instances = {}
+
+    # Same as SERIAL_TIMEOUT and the supported baud rates in the firmware
+    HOST_TIMEOUT = 0.5  # second(s)
+    BAUD_RATES = (1000000, 500000, 250000, 115200)
+    POLL_PERIOD = 1e-3  # second(s)
+
+    def __init__(self, hal_class, byte_delay=0.0, corrupt_rate=0.0, drop_rate=0.0, boot_delay=0.0, seed=None,
+                 baud_rates=BAUD_RATES, unreliable_baud_rates=(), legacy_firmware=False):
+        """
+        :param hal_class: class - the HAL to emulate the board for. Sets the number of I/O and the protocol.
+        :param byte_delay: float - seconds per byte in each direction at the HAL's BAUD_RATE, scaled when a different
+                           baud rate is negotiated. 10 / 115200 is the real link's byte time.
+        :param corrupt_rate: float - probability (0.0 - 1.0) of flipping a bit in a reply
+        :param drop_rate: float - probability (0.0 - 1.0) of not sending a reply
+        :param boot_delay: float - seconds between a DTR reset and the welcome message
+        :param seed: - random seed for the error injection
+        :param baud_rates: tuple(int) - baud rates the board accepts in a baud rate request
+        :param unreliable_baud_rates: tuple(int) - baud rates at which every reply is corrupted
+        :param legacy_firmware: bool - True to emulate firmware without baud rate negotiation, like the v1.0 sketch.
+                                Baud rate requests are then handled as normal frames.
+        """
+        self.led_outputs = hal_class.LED_OUTPUTS
+        self.pwm_outputs = hal_class.PWM_OUTPUTS
+        self.analog_inputs = hal_class.ANALOG_INPUTS
+        self.switch_inputs = hal_class.SWITCH_INPUTS
+        self.base_hal_class = hal_class
+
+        self.initial_baud_rate = hal_class.BAUD_RATE
+        self.baud_rate = hal_class.BAUD_RATE
+        self.baud_rates = baud_rates
+        self.unreliable_baud_rates = unreliable_baud_rates
+        self.legacy_firmware = legacy_firmware
+
+        self.byte_delay = byte_delay
+        self.corrupt_rate = corrupt_rate
+        self.drop_rate = drop_rate
+        self.boot_delay = boot_delay
+        self.random = random.Random(seed)
+
+        if pty is None:
+            raise RuntimeError('The firmware emulator needs pseudo-terminals, which this platform does not have.')
+
+        if issubclass(hal_class, ControlBoardSerialBaseFw2):
+            self.protocol = Fw2Protocol(self)
+        else:
+            self.protocol = Fw1v0Protocol(self)
+
+        # The slave end is kept open, so the HAL can close and reopen the port
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+
+        self.data_lock = threading.Lock()
+        self.switches = [False] * self.switch_inputs
+        self.analogs = [0] * self.analog_inputs
+        self.leds = [False] * self.led_outputs
+        self.pwms = [0] * self.pwm_outputs
+        self.counters = {'Resets': 0,
+                         'FramesReceived': 0,
+                         'CrcErrors': 0,
+                         'ParseErrors': 0,
+                         'HostTimeouts': 0,
+                         'BaudRateChanges': 0,
+                         'RepliesSent': 0,
+                         'RepliesCorrupted': 0,
+                         'RepliesDropped': 0}
+
+        self.reset_event = threading.Event()
+        self.run_thread = False
+        self.thread = None
+        self.instances[self.port_name] = self
+
+    def hal_class(self):
+        """
+        Returns a subclass of the HAL that connects to this emulator.
+
+        :return: class - the HAL class
+        """
+        emulator = self
+
+        class EmulatedHardwareAbstractionLayer(self.base_hal_class):
+            SERIAL_CLASS = EmulatedSerial
+
+            def find_com_port(self):
+                return emulator.port_name
+
+        return EmulatedHardwareAbstractionLayer
+
+    def start(self):
+        """
+        Starts the emulator thread.
+
+        :return:
+        """
+        self.run_thread = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the emulator thread and closes the pseudo-terminal.
+
+        :return:
+        """
+        if self.run_thread is True:
+            self.run_thread = False
+            self.thread.join()
+        self.instances.pop(self.port_name, None)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def reset(self):
+        """
+        Resets the emulated board. Called when the HAL asserts DTR.
+
+        :return:
+        """
+        self.reset_event.set()
+
+    def set_inputs(self, switches=None, analogs=None):
+        """
+        Sets the inputs the emulated board reports.
+
+        :param switches: list(bool) - switch values, None to leave them unchanged
+        :param analogs: list(int) - analog values (0-255), None to leave them unchanged
+        :return:
+        """
+        if switches is not None and len(switches) != self.switch_inputs:
+            raise IndexError('Number of switch inputs does not match. Expected %d, Got %d' %
+                             (self.switch_inputs, len(switches)))
+        if analogs is not None and len(analogs) != self.analog_inputs:
+            raise IndexError('Number of analog inputs does not match. Expected %d, Got %d' %
+                             (self.analog_inputs, len(analogs)))
+
+        with self.data_lock:
+            if switches is not None:
+                self.switches = [bool(switch) for switch in switches]
+            if analogs is not None:
+                self.analogs = [int(analog) & 0xFF for analog in analogs]
+
+    def get_inputs(self):
+        """
+        Returns the inputs the emulated board reports.
+
+        :return: tuple - switch values (list), analog values (list)
+        """
+        with self.data_lock:
+            return list(self.switches), list(self.analogs)
+
+    def set_outputs(self, leds, pwms):
+        """
+        Stores the outputs received from the host.
+
+        :param leds: list(bool) - LED values
+        :param pwms: list(int) - PWM values
+        :return:
+        """
+        with self.data_lock:
+            self.leds = leds
+            self.pwms = pwms
+
+    def get_outputs(self):
+        """
+        Returns the outputs last received from the host.
+
+        :return: tuple - LED values (list), PWM values (list)
+        """
+        with self.data_lock:
+            return list(self.leds), list(self.pwms)
+
+    def count(self, counter):
+        """
+        Increments one of the emulator's counters.
+
+        :param counter: str - counter name
+        :return:
+        """
+        with self.data_lock:
+            self.counters[counter] += 1
+
+    def get_counters(self):
+        """
+        Returns the emulator's counters.
+
+        :return: dict - counter name to count
+        """
+        with self.data_lock:
+            return dict(self.counters)
+
+    def send(self, reply):
+        """
+        Writes a reply to the host, injecting errors and emulating the byte time.
+
+        :param reply: bytes - the reply
+        :return:
+        """
+        if self.random.random() < self.drop_rate:
+            self.count('RepliesDropped')
+            return
+
+        if self.random.random() < self.corrupt_rate or self.baud_rate in self.unreliable_baud_rates:
+            # Leave the terminator alone, so the host sees one bad frame rather than two merged ones
+            reply = bytearray(reply)
+            reply[self.random.randrange(max(len(reply) - 2, 1))] ^= 1 << self.random.randrange(8)
+            self.count('RepliesCorrupted')
+
+        byte_delay = self.get_byte_delay()
+        if byte_delay > 0:
+            start_time = time.perf_counter()
+            for byte_num in range(len(reply)):
+                os.write(self.master_fd, reply[byte_num:byte_num + 1])
+                time.sleep(max(start_time + (byte_num + 1) * byte_delay - time.perf_counter(), 0))
+        else:
+            os.write(self.master_fd, bytes(reply))
+        self.count('RepliesSent')
+
+    def get_byte_delay(self):
+        """
+        Returns the time per byte at the current baud rate.
+
+        :return: float - seconds per byte
+        """
+        return self.byte_delay * self.initial_baud_rate / self.baud_rate
+
+    def process_baud_request(self, line):
+        """
+        Answers a baud rate request at the current baud rate, then switches, like processBaudRequest() in the
+        firmware.
+
+        :param line: bytes - the request, without the terminator
+        :return:
+        """
+        data, _, crc_string = line.partition(b'CRC:')
+        baud_rate = 0
+        if data.startswith(b'BAUD:') and crc_string.strip(b'\r;') == str(Crc8MaximTable.calc(data, 0)).encode():
+            requested_baud_rate = int(data[len(b'BAUD:'):].rstrip(b';') or 0)
+            if requested_baud_rate in self.baud_rates:
+                baud_rate = requested_baud_rate
+        else:
+            self.count('CrcErrors')
+
+        reply = b'BAUD:%d;' % baud_rate
+        self.send(reply + b'CRC:' + str(Crc8MaximTable.calc(reply, 0)).encode() + b';\r\n')
+        if baud_rate != 0 and baud_rate != self.baud_rate:
+            self.baud_rate = baud_rate
+            self.count('BaudRateChanges')
+
+    def run(self):
+        """
+        Emulator thread. Splits the data from the host into frames and passes them to the protocol.
+
+        :return:
+        """
+        rx_buffer = b''
+        connected = False
+        last_rx_time = time.perf_counter()
+        terminator = self.protocol.TERMINATOR
+
+        while self.run_thread:
+            if self.reset_event.is_set():
+                self.reset_event.clear()
+                time.sleep(self.boot_delay)
+                rx_buffer = b''
+                connected = False
+                self.baud_rate = self.initial_baud_rate
+                self.set_outputs([False] * self.led_outputs, [0] * self.pwm_outputs)
+                self.protocol.reset()
+                self.count('Resets')
+                os.write(self.master_fd, self.protocol.WELCOME_MESSAGE)
+
+            readable, _, _ = select.select([self.master_fd], [], [], self.POLL_PERIOD)
+            if readable:
+                data = os.read(self.master_fd, 4096)
+                time.sleep(len(data) * self.get_byte_delay())
+                rx_buffer += data
+                last_rx_time = time.perf_counter()
+
+                # Baud rate requests are only handled while waiting for the host
+                if not self.legacy_firmware:
+                    while not connected and rx_buffer.startswith(b'B') and b'\n' in rx_buffer:
+                        line, _, rx_buffer = rx_buffer.partition(b'\n')
+                        self.process_baud_request(line)
+                    if not connected and rx_buffer.startswith(b'B'):
+                        continue
+                connected = bool(rx_buffer) or connected
+
+                *frames, rx_buffer = rx_buffer.split(terminator)
+                for frame in frames:
+                    self.count('FramesReceived')
+                    for reply in self.protocol.process(frame):
+                        self.send(reply)
+
+            elif connected and time.perf_counter() - last_rx_time > self.HOST_TIMEOUT:
+                # The firmware turns the outputs off and waits for the host again
+                connected = False
+                self.set_outputs([False] * self.led_outputs, [0] * self.pwm_outputs)
+                self.protocol.reset()
+                self.count('HostTimeouts')
+
+            if connected:
+                for reply in self.protocol.poll():
+                    self.send(reply)
+
+
+def benchmark(hal_class, duration=5.0, cycle_rate=None, use_asyncio=False, delta_mode=None, **emulator_kwargs):
+    """
+    Runs the HAL against an emulated board and measures the update rate.
+
+    :param hal_class: class - the HAL to benchmark
+    :param duration: float - measurement time in seconds, after the HAL starts running
+    :param cycle_rate: float - HAL cycle rate in Hz; None to run as fast as the emulator answers
+    :param use_asyncio: bool - run the HAL on an AsyncEngine instead of its own thread
+    :param delta_mode: bool - True or False to select the firmware v2 delta mode; None to keep the HAL's default
+    :param emulator_kwargs: - passed to FirmwareEmulator
+    :return: dict - Cycles, Rate (Hz), Status (HAL status) and Emulator (emulator counters)
+    """
+    emulator = FirmwareEmulator(hal_class, **emulator_kwargs)
+    emulator.start()
+    hal = emulator.hal_class()()
+
+    engine = AsyncEngine() if use_asyncio else None
+
+    hal.set_cycle_rate(cycle_rate)
+    if delta_mode is not None:
+        if not isinstance(hal, ControlBoardSerialBaseFw2):
+            emulator.stop()
+            raise ValueError('Delta mode needs a firmware v2 HAL, got %s' % hal.NAME)
+        hal.set_delta_mode(delta_mode)
+    if engine is not None:
+        engine.start_hal(hal)
+    else:
+        hal.start()
+    try:
+        while not hal.is_control_board_running():
+            time.sleep(0.1)
+        start_cycle = hal.get_snapshot().cycle
+        start_time = time.perf_counter()
+        time.sleep(duration)
+        cycle_count = hal.get_snapshot().cycle - start_cycle
+        elapsed = time.perf_counter() - start_time
+        status = hal.get_status()
+    finally:
+        hal.stop()
+        if engine is not None:
+            engine.stop()
+        emulator.stop()
+
+    return {'Cycles': cycle_count,
+            'Rate': cycle_count / elapsed,
+            'Status': status,
+            'Emulator': emulator.get_counters()}
+
+
+def main():
+    """
+    Benchmarks a serial HAL plugin against the emulator.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Benchmark a serial HAL against an emulated control board.')
+    parser.add_argument('cb_type', help='HAL plugin short name, such as ControlBoard_1v1 or ArduinoUno_Fw2')
+    parser.add_argument('--duration', type=float, default=5.0, help='measurement time in seconds')
+    parser.add_argument('--cycle-rate', type=float, default=None, help='HAL cycle rate in Hz, free runs if not given')
+    parser.add_argument('--byte-delay', type=float, default=0.0, help='seconds per byte, 87e-6 for 115200 baud')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help='probability of corrupting a reply')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='probability of dropping a reply')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the error injection')
+    parser.add_argument('--asyncio', action='store_true', help='run the HAL on the asyncio engine')
+    parser.add_argument('--delta', action='store_true', help='run a firmware v2 HAL in delta mode')
+    parser.add_argument('--legacy', action='store_true', help='emulate firmware without baud rate negotiation')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    package = 'ControlBoardApp.cbhal' if getattr(sys, 'frozen', False) else 'cbhal'
+    hal_class = importlib.import_module('%s.%s' % (package, args.cb_type)).HardwareAbstractionLayer
+
+    results = benchmark(hal_class, duration=args.duration, cycle_rate=args.cycle_rate, use_asyncio=args.asyncio,
+                        delta_mode=True if args.delta else None,
+                        byte_delay=args.byte_delay, corrupt_rate=args.corrupt_rate, drop_rate=args.drop_rate,
+                        seed=args.seed, legacy_firmware=args.legacy)
+
+    print('%s: %d cycles, %.1f Hz' % (args.cb_type, results['Cycles'], results['Rate']))
+    cycle_stats = results['Status']['CycleStats']
+    if cycle_stats['Samples'] > 0:
+        print('  Cycle time (ms): mean %.3f, p50 %.3f, p95 %.3f, p99 %.3f, max %.3f, jitter %.3f' %
+              tuple(cycle_stats[name] for name in ('Mean', 'P50', 'P95', 'P99', 'Max', 'Jitter')))
+    for name, value in sorted(results['Emulator'].items()):
+        print('  Emulator %s: %d' % (name, value))
+    for name in ('Scheduler', 'FrameCache', 'Pipeline', 'Delta'):
+        if name in results['Status']:
+            print('  %s: %s' % (name, results['Status'][name]))
+
+
+if __name__ == '__main__':
+    main()
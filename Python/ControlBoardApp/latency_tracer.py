@@ -0,0 +1,197 @@
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies, with fixed bins so recording a sample costs the same for any number of samples.
+    Percentiles are estimated as the upper edge of the bin they fall in.
+    """
+    # Upper bin edges in milliseconds. The last bin holds everything longer.
+    BIN_EDGES = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BIN_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        """
+        Records a sample.
+
+        :param latency: float - latency in milliseconds
+        :return:
+        """
+        for index, edge in enumerate(self.BIN_EDGES):
+            if latency <= edge:
+                break
+        else:
+            index = len(self.BIN_EDGES)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+
+    def get_percentile(self, percentile):
+        """
+        Returns the estimated latency below which a percentage of the samples fall.
+
+        :param percentile: float - percentage, 0 to 100
+        :return: float - latency in milliseconds, the upper edge of the bin or the longest sample if it is shorter;
+                 None if there are no samples
+        """
+        if self.count == 0:
+            return None
+        target = self.count * percentile / 100.0
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return min(self.BIN_EDGES[index], self.max) if index < len(self.BIN_EDGES) else self.max
+        return self.max
+
+    def get_statistics(self):
+        """
+        Returns the histogram statistics.
+
+        :return: dict - Count, Mean, P50, P99 and Max (ms, None if there are no samples)
+        """
+        return {'Count': self.count,
+                'Mean': self.total / self.count if self.count else None,
+                'P50': self.get_percentile(50),
+                'P99': self.get_percentile(99),
+                'Max': self.max if self.count else None}
+
+    def get_bins(self):
+        """
+        Returns the bins of the histogram.
+
+        :return: list(tuple) - (upper edge in ms, None for the last bin; number of samples)
+        """
+        return list(zip(self.BIN_EDGES + (None,), self.counts))
+
+
+class LatencyTracer:
+    """
+    Traces how long the control board inputs take to reach the robot.
+
+    Each snapshot carries the time its input frame was received from the serial port. The NTAL records the time the
+    snapshot is published to the Network Table (SerialToNt). When a switch change is published, the NTAL also puts the
+    snapshot's cycle number in the TraceSeq key. Robot code can put the number back into the TraceEcho key, and the
+    time the echo arrives completes the trace (NtToEcho and SerialToEcho). All times come from this PC's clock, so
+    the robot clock does not need to be in sync.
+    """
+    STAGE_SERIAL_TO_NT = 'SerialToNt'  # Input frame received to values put in the Network Table
+    STAGE_NT_TO_ECHO = 'NtToEcho'  # Values put in the Network Table to sequence number echoed by the robot
+    STAGE_SERIAL_TO_ECHO = 'SerialToEcho'  # Input frame received to sequence number echoed by the robot
+    STAGES = (STAGE_SERIAL_TO_NT, STAGE_NT_TO_ECHO, STAGE_SERIAL_TO_ECHO)
+
+    MAX_PENDING = 256  # Published sequence numbers waiting for an echo
+
+    def __init__(self, enabled=True):
+        """
+        :param enabled: bool - True to record the latencies
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.last_input_times = {}
+        self.pending = collections.OrderedDict()
+        self.unmatched_echoes = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the histograms and the traces waiting for an echo.
+
+        :return:
+        """
+        with self.lock:
+            self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+            self.last_input_times.clear()
+            self.pending.clear()
+            self.unmatched_echoes = 0
+
+    def record_publish(self, board_name, snapshot, traced):
+        """
+        Records the publish of a snapshot. Each input frame is only recorded the first time it is published. Called
+        by the NTAL after putting the values in the Network Table.
+
+        :param board_name: str - name of the board
+        :param snapshot: ControlBoardSnapshot - the published snapshot
+        :param traced: bool - True if the snapshot's cycle number was put in the TraceSeq key
+        :return:
+        """
+        input_time = snapshot.input_time
+        if not self.enabled or input_time is None:
+            return
+        publish_time = time.perf_counter_ns()
+        with self.lock:
+            if self.last_input_times.get(board_name) == input_time:
+                return
+            self.last_input_times[board_name] = input_time
+            self.histograms[self.STAGE_SERIAL_TO_NT].record((publish_time - input_time) / 1e6)
+            if traced:
+                self.pending[(board_name, snapshot.cycle)] = (input_time, publish_time)
+                if len(self.pending) > self.MAX_PENDING:
+                    self.pending.popitem(last=False)
+
+    def record_echo(self, board_name, sequence):
+        """
+        Records the echo of a sequence number by the robot. Called by the NTAL entry listener.
+
+        :param board_name: str - name of the board
+        :param sequence: float - the echoed sequence number
+        :return:
+        """
+        if not self.enabled:
+            return
+        echo_time = time.perf_counter_ns()
+        with self.lock:
+            times = self.pending.pop((board_name, int(sequence)), None)
+            if times is None:
+                self.unmatched_echoes += 1
+                return
+            input_time, publish_time = times
+            self.histograms[self.STAGE_NT_TO_ECHO].record((echo_time - publish_time) / 1e6)
+            self.histograms[self.STAGE_SERIAL_TO_ECHO].record((echo_time - input_time) / 1e6)
+
+    def get_statistics(self):
+        """
+        Returns the statistics of each stage.
+
+        :return: dict - stage to its histogram statistics, see LatencyHistogram.get_statistics(), plus Pending
+                 (traces waiting for an echo) and UnmatchedEchoes
+        """
+        with self.lock:
+            statistics = {stage: histogram.get_statistics() for stage, histogram in self.histograms.items()}
+            statistics['Pending'] = len(self.pending)
+            statistics['UnmatchedEchoes'] = self.unmatched_echoes
+        return statistics
+
+    def dump(self, path):
+        """
+        Writes the histograms to a CSV file.
+
+        :param path: str - file path
+        :return:
+        """
+        with self.lock:
+            histograms = {stage: (histogram.get_statistics(), histogram.get_bins())
+                          for stage, histogram in self.histograms.items()}
+        with open(path, 'w') as dump_file:
+            dump_file.write('Stage,UpperEdge_ms,Samples\n')
+            for stage, (statistics, bins) in histograms.items():
+                for edge, count in bins:
+                    dump_file.write('%s,%s,%d\n' % (stage, 'inf' if edge is None else edge, count))
+            dump_file.write('\nStage,Count,Mean_ms,P50_ms,P99_ms,Max_ms\n')
+            for stage, (statistics, bins) in histograms.items():
+                dump_file.write('%s,%d,%s,%s,%s,%s\n' % (stage, statistics['Count'], statistics['Mean'],
+                                                         statistics['P50'], statistics['P99'], statistics['Max']))
+        logger.info('Latency histograms written to %s' % path)
@@ -78,8 +78,11 @@ class MainWindow(wx.Frame):
         self.menu_file = wx.Menu()
         self.menu_file_hide = self.menu_file.Append(wx.ID_ANY, 'Hide',
                                                     'Hide this window. Application continues running in the background.')
+        self.menu_file_latency = self.menu_file.Append(wx.ID_ANY, 'Save Latency Histograms',
+                                                       'Save the input latency histograms to a CSV file')
         self.menu_file_quit = self.menu_file.Append(wx.ID_EXIT, 'Quit', 'Quit application')
         self.Bind(wx.EVT_MENU, self.hide_window, self.menu_file_hide)
+        self.Bind(wx.EVT_MENU, self.OnSaveLatency, self.menu_file_latency)
         self.Bind(wx.EVT_MENU, self.exit_app, self.menu_file_quit)
 
         # Settings menu
@@ -150,6 +153,18 @@ class MainWindow(wx.Frame):
         self.hal_status = wx.StaticText(self, label=self.DEFAULT_STATUS)
         self.tree.SetItemWindow(label, self.hal_status, 1)
 
+        label = self.tree.AppendItem(self.tree.GetRootItem(), 'Cycle Time')
+        self.hal_cycle_time = wx.StaticText(self, label=self.DEFAULT_STATUS)
+        self.tree.SetItemWindow(label, self.hal_cycle_time, 1)
+
+        # Additional control boards, which publish to their own NT sub-table
+        self.board_status = {}
+        for board_name in self.cbhal_handler.get_board_names():
+            if board_name != self.cbhal_handler.PRIMARY_BOARD:
+                label = self.tree.AppendItem(self.tree.GetRootItem(), 'Control Board \"%s\"' % board_name)
+                self.board_status[board_name] = wx.StaticText(self, label=self.DEFAULT_STATUS)
+                self.tree.SetItemWindow(label, self.board_status[board_name], 1)
+
         label = self.tree.AppendItem(self.tree.GetRootItem(), 'NT Server Address')
         self.nt_address = wx.StaticText(self, label=self.DEFAULT_STATUS)
         self.tree.SetItemWindow(label, self.nt_address, 1)
@@ -158,6 +173,14 @@ class MainWindow(wx.Frame):
         self.ntal_status = wx.StaticText(self, label=self.DEFAULT_STATUS)
         self.tree.SetItemWindow(label, self.ntal_status, 1)
 
+        label = self.tree.AppendItem(self.tree.GetRootItem(), 'NT Publisher')
+        self.nt_publisher_status = wx.StaticText(self, label=self.DEFAULT_STATUS)
+        self.tree.SetItemWindow(label, self.nt_publisher_status, 1)
+
+        label = self.tree.AppendItem(self.tree.GetRootItem(), 'Input Latency')
+        self.nt_latency_status = wx.StaticText(self, label=self.DEFAULT_STATUS)
+        self.tree.SetItemWindow(label, self.nt_latency_status, 1)
+
         # Create I/O Tree Objects
         self.io_object = {}
         self.create_io_tree()
@@ -182,6 +205,7 @@ class MainWindow(wx.Frame):
         self.OnTimerStart()
 
         self.busy_updating = False
+        self.pending_calls = set()
         self.update_indicators()
 
         self.SetAutoLayout(True)
@@ -363,6 +387,24 @@ class MainWindow(wx.Frame):
             self.logger.error('Could not open log: %s' % LOG_PATH)
             self.logger.error(traceback.format_exc())
 
+    def OnSaveLatency(self, _=None):
+        """
+        Responder for the Save Latency Histograms button.
+        
+        :param _: event - not used 
+        :return: 
+        """
+        with wx.FileDialog(self, 'Save Latency Histograms', wildcard='CSV files (*.csv)|*.csv',
+                           defaultFile='latency.csv', style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as file_dialog:
+            if file_dialog.ShowModal() == wx.ID_CANCEL:
+                return
+            path = file_dialog.GetPath()
+        try:
+            self.nt.dump_latency_histograms(path)
+        except Exception:
+            self.logger.error('Could not save the latency histograms: %s' % path)
+            self.logger.error(traceback.format_exc())
+
     def OnUpdateTimerEvent(self, _=None):
         """
         Responder for wxTimer expiration - updates the hyper tree list indicators
@@ -383,8 +425,10 @@ class MainWindow(wx.Frame):
 
         if self.test_mode_enabled:
             self.logger.info('Test mode disables NT server communication.')
+            self.nt.set_test_mode(True)
             self.nt.shutdownNtClient()
         else:
+            self.nt.set_test_mode(False)
             self.nt.startNtClient()
 
         self.update_test_elements()
@@ -475,8 +519,8 @@ class MainWindow(wx.Frame):
                     self.hal_type.SetLabelText(cbdlg.get_cb_type_name())
                     self.OnTimerStop()
                     self.cbhal_handler.shutdown_cbhal()
-                    self.cbhal_handler.init_cbtype_inst(cbdlg.get_cb_type_sel())
-                    self.nt.reset_table()
+                    self.cbhal_handler.init_cbtype_inst(cbdlg.get_cb_type_sel(), *self.config.get_cb_binding())
+                    self.nt.reset_table(self.cbhal_handler.PRIMARY_BOARD)
                     self.create_io_tree()
                     self.cbhal_handler.start_cbhal()
                     self.OnTimerStart()
@@ -530,7 +574,7 @@ class MainWindow(wx.Frame):
         """
         self.logger.info('User has requested to quit the ControlBoardApp')
         self.update_timer.Stop()
-        self.cbhal_handler.set_event_handler(None)
+        self.cbhal_handler.unsubscribe_all()
         self.cbhal_handler.shutdown_cbhal()
         self.tb_icon.Destroy()
         self.Hide()
@@ -557,17 +601,42 @@ class MainWindow(wx.Frame):
             cbhal.putPwmValues([val[1] for val in sorted([(pwm_obj['index'], pwm_obj['test'].GetValue()) for pwm_obj in
                                                           self.io_object[self.PWMS_LNAME]['branch_dict'].values()])])
 
-    def event_responder(self):
+    def event_responder(self, board_name=None, snapshot=None):
         """
-        The event handler which CBHAL calls when it has new data. 
+        The event handler which CBHAL calls when it has new data. Called on its CBHAL event dispatcher thread.
         
+        :param board_name: str - name of the board with new data
+        :param snapshot: ControlBoardSnapshot - the board's snapshot, posted to the NT publisher thread
         :return: 
         """
         if self.isTestModeEnabled():
-            wx.CallAfter(self.updateHalWithTestValues)
+            if board_name == self.cbhal_handler.PRIMARY_BOARD:
+                self.call_after_once(self.updateHalWithTestValues)
         else:
-            self.nt.update()
-        wx.CallAfter(self.update_indicators)
+            self.nt.post(board_name, snapshot)
+        self.call_after_once(self.update_indicators)
+
+    def call_after_once(self, func):
+        """
+        Calls a function on the GUI thread, unless a call to it is already waiting. Keeps the GUI event queue from
+        filling up when the CBHAL cycles faster than the GUI can update.
+
+        :param func: function - called with no arguments on the GUI thread
+        :return:
+        """
+        if func not in self.pending_calls:
+            self.pending_calls.add(func)
+            wx.CallAfter(self.run_pending_call, func)
+
+    def run_pending_call(self, func):
+        """
+        Runs a call posted by call_after_once(). Called on the GUI thread.
+
+        :param func: function - the function to call
+        :return:
+        """
+        self.pending_calls.discard(func)
+        func()
 
     @staticmethod
     def get_hal_status(is_running, state, update_rate):
@@ -587,6 +656,55 @@ class MainWindow(wx.Frame):
         else:
             return state
 
+    @staticmethod
+    def get_cycle_time_status(is_running, cycle_stats, scheduler):
+        """
+        Returns a cycle time status string.
+
+        :param is_running: bool - Is the CBHAL running?
+        :param cycle_stats: dict - The cycle statistics from the CBHAL status
+        :param scheduler: dict - The scheduler status from the CBHAL status
+        :return: str - cycle time status
+        """
+        if is_running and cycle_stats['Samples'] > 0:
+            return 'p50 %.2f / p95 %.2f / p99 %.2f / max %.2f ms, jitter %.2f ms (%d cycles), %d missed' % \
+                   (cycle_stats['P50'], cycle_stats['P95'], cycle_stats['P99'], cycle_stats['Max'],
+                    cycle_stats['Jitter'], cycle_stats['Samples'], scheduler['Missed'])
+        else:
+            return MainWindow.DEFAULT_STATUS
+
+    @staticmethod
+    def get_nt_publisher_status(publisher_status):
+        """
+        Returns an NT publisher status string.
+
+        :param publisher_status: dict - The NTAL publisher status
+        :return: str - NT publisher status
+        """
+        if publisher_status['Running']:
+            return 'Queue %d (max %d), %d published, %d dropped, %d edge flushes' % \
+                   (publisher_status['Depth'], publisher_status['MaxDepth'], publisher_status['Published'],
+                    publisher_status['Dropped'], publisher_status['Flushes'])
+        else:
+            return MainWindow.DEFAULT_STATUS
+
+    @staticmethod
+    def get_latency_status(latency_stats):
+        """
+        Returns an input latency status string.
+
+        :param latency_stats: dict - The NTAL latency statistics
+        :return: str - input latency status
+        """
+        to_nt = latency_stats['SerialToNt']
+        if to_nt['Count'] == 0:
+            return MainWindow.DEFAULT_STATUS
+        status = 'To NT p50 %s / p99 %s ms' % (to_nt['P50'], to_nt['P99'])
+        to_echo = latency_stats['SerialToEcho']
+        if to_echo['Count'] > 0:
+            status += ', robot echo p50 %s / p99 %s ms (%d)' % (to_echo['P50'], to_echo['P99'], to_echo['Count'])
+        return status
+
     @staticmethod
     def update_tree_status(wx_label, status):
         """
@@ -610,10 +728,15 @@ class MainWindow(wx.Frame):
 
             self.update_tree_status(self.nt_address, self.nt.getNtServerAddress())
             self.update_tree_status(self.ntal_status, self.nt.get_status())
+            self.update_tree_status(self.nt_publisher_status,
+                                    self.get_nt_publisher_status(self.nt.get_publisher_status()))
+            self.update_tree_status(self.nt_latency_status, self.get_latency_status(self.nt.get_latency_statistics()))
 
             if self.cbhal_handler.is_valid():
                 hal_status = self.cbhal_handler.get_cbhal().get_status()
-                self.tb_icon.update_icon(ctrlb_good=hal_status['IsRunning'],
+                boards_running = all(self.cbhal_handler.get_cbhal(board_name).is_control_board_running()
+                                     for board_name in self.board_status)
+                self.tb_icon.update_icon(ctrlb_good=hal_status['IsRunning'] and boards_running,
                                          nt_good=self.nt.get_status() == self.nt.STATUS_CLIENT_CONNECTED,
                                          test_mode=self.test_mode_enabled)
                 if self.IsShown():
@@ -621,6 +744,17 @@ class MainWindow(wx.Frame):
                     self.update_tree_status(self.hal_status, self.get_hal_status(is_running=hal_status['IsRunning'],
                                                                                  state=hal_status['State'],
                                                                                  update_rate=hal_status['UpdateRate']))
+                    self.update_tree_status(self.hal_cycle_time,
+                                            self.get_cycle_time_status(is_running=hal_status['IsRunning'],
+                                                                       cycle_stats=hal_status['CycleStats'],
+                                                                       scheduler=hal_status['Scheduler']))
+                    for board_name, board_label in self.board_status.items():
+                        cbhal = self.cbhal_handler.get_cbhal(board_name)
+                        self.update_tree_status(board_label, '%s: %s' % (
+                            self.cbhal_handler.get_cbhal_inst_name(board_name),
+                            self.get_hal_status(is_running=cbhal.is_control_board_running(),
+                                                state=cbhal.get_hal_state(),
+                                                update_rate=cbhal.getUpdateRate())))
 
                     # Update the statuses of the I/O
                     if hal_status['IsRunning']:
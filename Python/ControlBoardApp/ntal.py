@@ -1,13 +1,27 @@
+import collections
+import functools
 import logging
+import sys
+import threading
+import time
 import traceback
 
 from networktables import NetworkTables as NetworkTable
 
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.latency_tracer import LatencyTracer
+else:
+    # Test Mode
+    from latency_tracer import LatencyTracer
+
 class NetworkTableAbstractionLayer:
     SWITCH_OUT = 'Switch'
     ANALOG_OUT = 'Analog'
     PWM_IN = 'PWM'
     LED_IN = 'LED'
+    TRACE_SEQ = 'TraceSeq'  # Cycle number of the last switch change, for the robot to echo
+    TRACE_ECHO = 'TraceEcho'  # Cycle number echoed back by the robot
 
     STATUS_INIT = 'Initializing...'
     STATUS_CLIENT_STOPPING = 'Disabling...'
@@ -17,14 +31,34 @@ class NetworkTableAbstractionLayer:
     STATUS_CLIENT_CONNECTED = 'Connected'
     STATUS_ERROR = 'Error'
 
-    def __init__(self, address, cbhal_handler, flush_period=50e-3):
+    PUBLISH_RATE = 100  # Hz, how often the publisher thread updates the Network Table at most
+    MIN_FLUSH_INTERVAL = 20e-3  # second(s), shortest time between two edge flushes
+    NT_FLUSH_LIMIT = 10e-3  # second(s), NetworkTables ignores flushes that come sooner than this after the last one
+
+    def __init__(self, address, cbhal_handler, flush_period=50e-3, publish_rate=PUBLISH_RATE,
+                 min_flush_interval=MIN_FLUSH_INTERVAL, analog_flush_delta=None, latency_trace=True):
         """
         The Network Table Abstraction Layer
         Provides methods for the CBHAL and GUI to interact with the Network Table server. 
         
+        The Network Table is updated by a publisher thread, so a slow Network Table call never holds up a CBHAL. The
+        CBHALs post their snapshots with post(). The mailbox holds one snapshot per board; a snapshot that was not
+        published yet is replaced by the newer one and counted as dropped.
+        
+        Values are sent to the server every flush period. In low latency mode, a switch change is flushed right away
+        instead, so a button press does not wait for the next periodic flush. Edge flushes are at least
+        min_flush_interval apart to protect the robot radio; an edge that comes sooner is flushed once the interval
+        is over. Analog changes ride the periodic flush, unless a channel moved by analog_flush_delta or more.
+        
         :param address: str - NT server address
         :param cbhal_handler: HAL - CBHAL instance
         :param flush_period: int - flush period in seconds (default is 50ms)
+        :param publish_rate: float - publisher updates per second at most; None to publish as soon as a snapshot is
+                             posted
+        :param min_flush_interval: float - shortest time in seconds between edge flushes; None to disable the low
+                                   latency mode
+        :param analog_flush_delta: int - analog change that also flushes right away; None to only flush on switches
+        :param latency_trace: bool - True to trace the input latency, see LatencyTracer
         """
         self.logger = logging.getLogger(__name__)
 
@@ -36,15 +70,252 @@ class NetworkTableAbstractionLayer:
         self.nt = None
         self.cbhal_handler = cbhal_handler
 
-        self.sw_vals_out = []
-        self.led_vals_in = []
-        self.ana_vals_out = []
-        self.pwm_vals_in = []
+        # Last values exchanged with each board's table, by board name
+        self.sw_vals_out = {}
+        self.led_vals_in = {}
+        self.ana_vals_out = {}
+        self.pwm_vals_in = {}
+
+        # Last values published to and applied from each board's table, by board name. Used to skip the Network
+        # Table and CBHAL calls when nothing changed.
+        self.sw_mask_out = {}
+        self.ana_bytes_out = {}
+        self.led_mask_in = {}
+        self.pwm_bytes_in = {}
+        self.update_counters = dict.fromkeys(['SwitchSent', 'SwitchSkipped', 'AnalogSent', 'AnalogSkipped',
+                                              'LedApplied', 'LedSkipped', 'PwmApplied', 'PwmSkipped'], 0)
+
+        # Serializes the table updates of the publisher thread, the entry listeners and the resets from the GUI
+        self.lock = threading.RLock()
+
+        # LED and PWM entry listeners, by board name
+        self.listeners = {}
+        self.listener_errors = 0
+
+        # In test mode the GUI drives the CBHAL outputs, so the LED and PWM values of the tables are only buffered
+        self.test_mode = False
+
+        # Publisher thread and its mailbox, board name to the latest snapshot not published yet
+        self.publish_period = None
+        self.set_publish_rate(publish_rate)
+        self.mailbox = collections.OrderedDict()
+        self.mailbox_condition = threading.Condition()
+        self.publisher_counters = dict.fromkeys(['Posted', 'Published', 'Dropped', 'MaxDepth'], 0)
+        self.run_publisher = False
+        self.publisher_thread = None
+
+        # Low latency mode, edge flushes requested by putNtData() and done by the publisher thread
+        self.min_flush_interval = None
+        self.set_min_flush_interval(min_flush_interval)
+        self.analog_flush_delta = analog_flush_delta
+        self.flush_pending = False
+        self.last_flush_time = 0.0
+        # Set by post() when a snapshot has an edge, so the publisher skips the rest of the publish period
+        self.last_posted = {}
+        self.edge_posted = False
+        self.publisher_counters.update(dict.fromkeys(['Flushes', 'FlushesDeferred'], 0))
+
+        # Input latency, from the serial port to the Network Table and back from the robot
+        self.tracer = LatencyTracer(enabled=latency_trace)
 
         self.startNtClient()
         self.reset_table()
         self.logger.debug('NTAL initialized.')
 
+    def set_test_mode(self, enabled):
+        """
+        Turns the test mode on or off. While it is on, the LED and PWM values that arrive from the Network Table are
+        only buffered, so they do not fight the test values of the GUI. Turning it off applies the buffered values.
+        
+        :param enabled: bool - True when the GUI test mode is on
+        :return: 
+        """
+        with self.lock:
+            self.test_mode = enabled
+            if not enabled:
+                for name in list(self.led_mask_in):
+                    self.getNtData(name)
+
+    def set_publish_rate(self, publish_rate):
+        """
+        Sets how often the publisher thread updates the Network Table at most.
+        
+        :param publish_rate: float - updates per second; None to publish as soon as a snapshot is posted
+        :return: 
+        """
+        if publish_rate is not None and publish_rate <= 0:
+            raise ValueError('The NT publish rate must be greater than 0 Hz, got %s' % publish_rate)
+        self.publish_period = None if publish_rate is None else 1.0 / publish_rate
+
+    def set_min_flush_interval(self, min_flush_interval):
+        """
+        Sets the shortest time between two edge flushes.
+        
+        :param min_flush_interval: float - seconds; None to disable the low latency mode
+        :return: 
+        """
+        if min_flush_interval is not None and min_flush_interval < self.NT_FLUSH_LIMIT:
+            raise ValueError('The minimum NT flush interval must be at least %s s, got %s' %
+                             (self.NT_FLUSH_LIMIT, min_flush_interval))
+        self.min_flush_interval = min_flush_interval
+        self.flush_pending = False
+
+    def get_flush_delay(self):
+        """
+        Returns the time until the pending edge flush is due. Does not flush, so it can be called with the mailbox
+        lock held.
+        
+        :return: float - seconds until the pending flush is due, 0.0 if it is due now; None if no flush is pending
+        """
+        if not self.flush_pending:
+            return None
+        return max(self.last_flush_time + self.min_flush_interval - time.perf_counter(), 0.0)
+
+    def flush_if_due(self):
+        """
+        Flushes the Network Table if an edge flush is pending and the minimum flush interval is over. Called by the
+        publisher thread, without the mailbox lock held, so post() never waits for a flush.
+        
+        :return: float - seconds until the pending flush is due; None if no flush is pending
+        """
+        delay = self.get_flush_delay()
+        if delay is None or delay > 0:
+            return delay
+        now = time.perf_counter()
+        NetworkTable.flush()
+        self.flush_pending = False
+        self.last_flush_time = now
+        self.publisher_counters['Flushes'] += 1
+        return None
+
+    def request_flush(self):
+        """
+        Asks for an edge flush, if the low latency mode is enabled. Called by putNtData().
+        
+        :return: 
+        """
+        if self.min_flush_interval is not None and not self.flush_pending:
+            self.flush_pending = True
+            if time.perf_counter() < self.last_flush_time + self.min_flush_interval:
+                self.publisher_counters['FlushesDeferred'] += 1
+
+    def start_publisher(self):
+        """
+        Starts the publisher thread.
+        
+        :return: 
+        """
+        if self.run_publisher:
+            return
+        self.run_publisher = True
+        self.publisher_thread = threading.Thread(target=self.run, name='NT publisher', daemon=True)
+        self.publisher_thread.start()
+
+    def stop_publisher(self):
+        """
+        Stops the publisher thread. Snapshots that were not published yet are dropped.
+        
+        :return: 
+        """
+        if self.run_publisher:
+            with self.mailbox_condition:
+                self.run_publisher = False
+                self.mailbox_condition.notify()
+            self.publisher_thread.join()
+
+    def post(self, board_name, snapshot):
+        """
+        Posts a board's latest snapshot to the publisher thread. Never waits. Called by the CBHAL event subscribers.
+        In low latency mode, a snapshot with an edge is published right away instead of at the next publish time.
+        
+        :param board_name: str - name of the board
+        :param snapshot: ControlBoardSnapshot - the board's snapshot
+        :return: 
+        """
+        with self.mailbox_condition:
+            counters = self.publisher_counters
+            counters['Posted'] += 1
+            if board_name in self.mailbox:
+                counters['Dropped'] += 1
+            if self.min_flush_interval is not None and not self.edge_posted:
+                self.edge_posted = self.is_edge(self.last_posted.get(board_name), snapshot)
+            self.last_posted[board_name] = snapshot
+            self.mailbox[board_name] = snapshot
+            if len(self.mailbox) > counters['MaxDepth']:
+                counters['MaxDepth'] = len(self.mailbox)
+            self.mailbox_condition.notify()
+
+    def is_edge(self, last_snapshot, snapshot):
+        """
+        Returns if a snapshot has an edge that gets an edge flush: a switch change, or an analog change of at least
+        analog_flush_delta.
+        
+        :param last_snapshot: ControlBoardSnapshot - the board's previous snapshot; None if there is none
+        :param snapshot: ControlBoardSnapshot - the board's new snapshot
+        :return: bool
+        """
+        if last_snapshot is None or snapshot.switch_mask != last_snapshot.switch_mask:
+            return True
+        return self.analog_flush_delta is not None and snapshot.analogs != last_snapshot.analogs and \
+            any(abs(new - old) >= self.analog_flush_delta for new, old in zip(snapshot.analogs, last_snapshot.analogs))
+
+    def get_publisher_status(self):
+        """
+        Returns the publisher thread status.
+        
+        :return: dict - Running (bool), Depth (snapshots waiting), Posted, Published, Dropped (replaced before they
+                 were published), MaxDepth, Rate (Hz, None if not limited), Flushes (edge flushes) and
+                 FlushesDeferred (edge flushes delayed by the minimum flush interval)
+        """
+        with self.mailbox_condition:
+            status = dict(self.publisher_counters, Running=self.run_publisher, Depth=len(self.mailbox))
+        status['Rate'] = None if self.publish_period is None else 1.0 / self.publish_period
+        return status
+
+    def run(self):
+        """
+        Publisher thread. Publishes the snapshots in the mailbox, at most once per publish period.
+        
+        :return: 
+        """
+        self.logger.debug('NT publisher thread has started.')
+        next_publish_time = time.perf_counter()
+        while True:
+            with self.mailbox_condition:
+                flush_due = False
+                while self.run_publisher and not self.mailbox:
+                    # Wake up for a deferred edge flush
+                    flush_delay = self.get_flush_delay()
+                    if flush_delay == 0.0:
+                        flush_due = True
+                        break
+                    self.mailbox_condition.wait(flush_delay)
+                if not self.run_publisher:
+                    break
+
+            if flush_due:
+                # The deferred edge flush is due, flush outside of the mailbox lock
+                self.flush_if_due()
+                continue
+
+            # Let the mailbox collect the snapshots until the next publish time. An edge is published right away,
+            # its flush is still limited by the minimum flush interval.
+            with self.mailbox_condition:
+                if self.publish_period is not None:
+                    self.mailbox_condition.wait_for(lambda: self.edge_posted or not self.run_publisher,
+                                                    next_publish_time - time.perf_counter())
+                    next_publish_time = max(next_publish_time + self.publish_period, time.perf_counter())
+                self.edge_posted = False
+                snapshots = list(self.mailbox.items())
+                self.mailbox.clear()
+
+            for board_name, snapshot in snapshots:
+                self.update(board_name, snapshot)
+            # One flush for the edges of all the boards
+            self.flush_if_due()
+            self.publisher_counters['Published'] += len(snapshots)
+        self.logger.debug('NT publisher thread has stopped.')
+
     def getNtServerAddress(self):
         """
         Returns the network table server address 
@@ -101,6 +372,10 @@ class NetworkTableAbstractionLayer:
                 NetworkTable.setUpdateRate(interval=self.flush_period)
                 NetworkTable.initialize(self.address)
                 self.nt = NetworkTable.getTable('OperatorInterfaceControlBoard')
+                # Shutting down the client removed the listeners of the boards
+                with self.lock:
+                    for name in list(self.listeners):
+                        self.add_listener(name)
                 self._set_status(self.STATUS_CLIENT_STARTED_CONNECTING)
             except:
                 self._set_status(self.STATUS_ERROR)
@@ -126,28 +401,136 @@ class NetworkTableAbstractionLayer:
             self.last_address = self.address
             self.last_ntal_log_status = status
 
-    def reset_table(self):
+    def get_board_names(self, board_name=None):
+        """
+        Returns the names of the boards to work on.
+        
+        :param board_name: str - a board name; None for all the boards
+        :return: list(str) - board names
+        """
+        return self.cbhal_handler.get_board_names() if board_name is None else [board_name]
+
+    def get_table(self, board_name):
+        """
+        Returns the table of a board. The primary board uses the main table, the other boards use a sub-table named
+        after the board.
+        
+        :param board_name: str - name of the board
+        :return: NetworkTable - the board's table
+        """
+        if board_name == self.cbhal_handler.PRIMARY_BOARD:
+            return self.nt
+        else:
+            return self.nt.getSubTable(board_name)
+
+    def reset_table(self, board_name=None):
         """
         Resets the Network Table values to default. 
         
+        :param board_name: str - the board to reset; None to reset all the boards
         :return: 
         """
-        self.logger.debug('Resetting the NT variables')
-        self.sw_vals_out.clear()
-        self.led_vals_in.clear()
-        self.ana_vals_out.clear()
-        self.pwm_vals_in.clear()
-        self.cbhal_handler.get_cbhal().reset_values()
+        with self.lock:
+            self._reset_table(board_name)
 
-        self.sw_vals_out.extend(self.cbhal_handler.get_cbhal().getSwitchValues())
-        self.led_vals_in.extend(self.cbhal_handler.get_cbhal().getLedValues())
-        self.ana_vals_out.extend(self.cbhal_handler.get_cbhal().getAnalogValues())
-        self.pwm_vals_in.extend(self.cbhal_handler.get_cbhal().getPwmValues())
+    def _reset_table(self, board_name):
+        """
+        Private - Resets the Network Table values to default. Called with the lock held.
+        
+        :param board_name: str - the board to reset; None to reset all the boards
+        :return: 
+        """
+        if board_name is None:
+            self.sw_vals_out.clear()
+            self.led_vals_in.clear()
+            self.ana_vals_out.clear()
+            self.pwm_vals_in.clear()
+            self.sw_mask_out.clear()
+            self.ana_bytes_out.clear()
+            self.led_mask_in.clear()
+            self.pwm_bytes_in.clear()
 
-        self.nt.putBooleanArray(self.SWITCH_OUT, self.sw_vals_out)
-        self.nt.putBooleanArray(self.LED_IN, self.led_vals_in)
-        self.nt.putNumberArray(self.ANALOG_OUT, self.ana_vals_out)
-        self.nt.putNumberArray(self.PWM_IN, self.pwm_vals_in)
+        for name in self.get_board_names(board_name):
+            self.logger.debug('Resetting the NT variables of board \"%s\"' % name)
+            cbhal = self.cbhal_handler.get_cbhal(name)
+            cbhal.reset_values()
+
+            self.sw_vals_out[name] = list(cbhal.getSwitchValues())
+            self.led_vals_in[name] = list(cbhal.getLedValues())
+            self.ana_vals_out[name] = cbhal.getAnalogValues()
+            self.pwm_vals_in[name] = cbhal.getPwmValues()
+            self.sw_mask_out[name] = cbhal.getSwitchMask()
+            self.ana_bytes_out[name] = cbhal.getAnalogBytes()
+            self.led_mask_in[name] = cbhal.getLedMask()
+            self.pwm_bytes_in[name] = cbhal.getPwmBytes()
+
+            table = self.get_table(name)
+            table.putBooleanArray(self.SWITCH_OUT, self.sw_vals_out[name])
+            table.putBooleanArray(self.LED_IN, self.led_vals_in[name])
+            table.putNumberArray(self.ANALOG_OUT, self.ana_vals_out[name])
+            table.putNumberArray(self.PWM_IN, self.pwm_vals_in[name])
+            self.add_listener(name)
+
+    def add_listener(self, board_name):
+        """
+        Adds the entry listener that applies the LED and PWM values of a board's table to its CBHAL when they arrive.
+        Replaces the board's listener, if it has one.
+        
+        :param board_name: str - name of the board
+        :return: 
+        """
+        table = self.get_table(board_name)
+        old_table, old_listener = self.listeners.pop(board_name, (None, None))
+        if old_table is table:
+            table.removeEntryListener(old_listener)
+
+        # Only remote changes. The values this NTAL puts itself are already in the CBHAL.
+        listener = functools.partial(self.on_entry_changed, board_name)
+        table.addEntryListenerEx(listener, NetworkTable.NotifyFlags.NEW | NetworkTable.NotifyFlags.UPDATE)
+        self.listeners[board_name] = (table, listener)
+
+    def on_entry_changed(self, board_name, _, key, value, __):
+        """
+        Entry listener. Applies a new LED or PWM value from a board's table to its CBHAL, or buffers it in test mode.
+        Called on the NetworkTables listener thread.
+        
+        :param board_name: str - name of the board
+        :param _: NetworkTable - not used
+        :param key: str - the key that changed
+        :param value: the new value
+        :param __: bool - not used
+        :return: 
+        """
+        try:
+            with self.lock:
+                if board_name not in self.led_vals_in:
+                    return
+                cbhal = self.cbhal_handler.get_cbhal(board_name)
+                if key == self.LED_IN:
+                    if self.test_mode:
+                        # Buffered until the test mode is turned off
+                        cbhal.check_list_length(value, cbhal.LED_OUTPUTS, 'LED outs')
+                        self.led_mask_in[board_name] = cbhal.list_to_mask(value)
+                    else:
+                        cbhal.putLedValues(value)
+                        self.led_mask_in[board_name] = cbhal.getLedMask()
+                        self.update_counters['LedApplied'] += 1
+                    self.led_vals_in[board_name] = value
+                elif key == self.PWM_IN:
+                    if self.test_mode:
+                        # Buffered until the test mode is turned off
+                        cbhal.check_list_length(value, cbhal.PWM_OUTPUTS, 'PWM outs')
+                        self.pwm_bytes_in[board_name] = cbhal.list_to_bytes(value)
+                    else:
+                        cbhal.putPwmValues(value)
+                        self.pwm_bytes_in[board_name] = cbhal.getPwmBytes()
+                        self.update_counters['PwmApplied'] += 1
+                    self.pwm_vals_in[board_name] = value
+                elif key == self.TRACE_ECHO:
+                    self.tracer.record_echo(board_name, value)
+        except Exception:
+            self.listener_errors += 1
+            self.logger.error('Error applying %s of board "%s": %s' % (key, board_name, traceback.format_exc()))
 
     def get_status(self):
         """
@@ -158,6 +541,33 @@ class NetworkTableAbstractionLayer:
         self.log_status_changes()
         return self._get_status()
 
+    def get_latency_statistics(self):
+        """
+        Returns the input latency statistics.
+        
+        :return: dict - see LatencyTracer.get_statistics()
+        """
+        return self.tracer.get_statistics()
+
+    def dump_latency_histograms(self, path):
+        """
+        Writes the input latency histograms to a CSV file.
+        
+        :param path: str - file path
+        :return: 
+        """
+        self.tracer.dump(path)
+
+    def get_update_counters(self):
+        """
+        Returns the counters of the updates sent to the Network Table and applied to the CBHALs, and of the ones
+        skipped because nothing changed.
+        
+        :return: dict - SwitchSent, SwitchSkipped, AnalogSent, AnalogSkipped, LedApplied, LedSkipped, PwmApplied,
+                 PwmSkipped and ListenerErrors, for all the boards
+        """
+        return dict(self.update_counters, ListenerErrors=self.listener_errors)
+
     def _get_status(self):
         """
         Private - Reutrns the NTAL status as a string. 
@@ -168,42 +578,86 @@ class NetworkTableAbstractionLayer:
         else:
             return self.ntal_status
 
-    def getNtData(self):
+    def getNtData(self, board_name):
         """
-        Reads data from the Network Table & updates the CBHAL
+        Makes sure a board's CBHAL has the LED and PWM values of its Network Table. New values are applied by the entry
+        listener as they arrive, so this only applies them again if the CBHAL's outputs no longer match, such as after
+        a board reset.
         
+        :param board_name: str - name of the board
         :return: 
         """
         # Data In
-        self.led_vals_in = list(self.nt.getBooleanArray(self.LED_IN, self.led_vals_in))
-        self.pwm_vals_in = list(self.nt.getNumberArray(self.PWM_IN, self.pwm_vals_in))
-        self.cbhal_handler.get_cbhal().putLedValues(self.led_vals_in)
-        self.cbhal_handler.get_cbhal().putPwmValues(self.pwm_vals_in)
+        cbhal = self.cbhal_handler.get_cbhal(board_name)
+
+        if cbhal.getLedMask() != self.led_mask_in[board_name]:
+            cbhal.putLedMask(self.led_mask_in[board_name])
+            self.update_counters['LedApplied'] += 1
+        else:
+            self.update_counters['LedSkipped'] += 1
 
-    def putNtData(self):
+        if cbhal.getPwmBytes() != self.pwm_bytes_in[board_name]:
+            cbhal.putPwmValues(self.pwm_bytes_in[board_name])
+            self.update_counters['PwmApplied'] += 1
+        else:
+            self.update_counters['PwmSkipped'] += 1
+
+    def putNtData(self, board_name, snapshot=None):
         """
-        Reads data from the CBHAL & updates the Network Table
+        Reads data from a board's CBHAL & updates its Network Table
         
+        :param board_name: str - name of the board
+        :param snapshot: ControlBoardSnapshot - the snapshot to publish; None for the board's latest
         :return: 
         """
-        # Data Out
-        self.sw_vals_out.clear()
-        self.ana_vals_out.clear()
-        self.sw_vals_out.extend(self.cbhal_handler.get_cbhal().getSwitchValues())
-        self.ana_vals_out.extend(self.cbhal_handler.get_cbhal().getAnalogValues())
-        self.nt.putBooleanArray(self.SWITCH_OUT, self.sw_vals_out)
-        self.nt.putNumberArray(self.ANALOG_OUT, self.ana_vals_out)
+        # Data Out. Only the values that changed since they were last published are sent.
+        table = self.get_table(board_name)
+        cbhal = self.cbhal_handler.get_cbhal(board_name)
+        if snapshot is None:
+            snapshot = cbhal.get_snapshot()
+
+        traced = False
+        if snapshot.switch_mask != self.sw_mask_out[board_name]:
+            self.sw_vals_out[board_name] = cbhal.mask_to_list(snapshot.switch_mask, cbhal.SWITCH_INPUTS)
+            table.putBooleanArray(self.SWITCH_OUT, self.sw_vals_out[board_name])
+            if self.tracer.enabled:
+                table.putNumber(self.TRACE_SEQ, snapshot.cycle)
+                traced = True
+            self.sw_mask_out[board_name] = snapshot.switch_mask
+            self.update_counters['SwitchSent'] += 1
+            self.request_flush()
+        else:
+            self.update_counters['SwitchSkipped'] += 1
+
+        if snapshot.analogs != self.ana_bytes_out[board_name]:
+            if self.analog_flush_delta is not None and \
+                    any(abs(new - old) >= self.analog_flush_delta
+                        for new, old in zip(snapshot.analogs, self.ana_bytes_out[board_name])):
+                self.request_flush()
+            self.ana_vals_out[board_name] = list(snapshot.analogs)
+            table.putNumberArray(self.ANALOG_OUT, self.ana_vals_out[board_name])
+            self.ana_bytes_out[board_name] = snapshot.analogs
+            self.update_counters['AnalogSent'] += 1
+        else:
+            self.update_counters['AnalogSkipped'] += 1
+
+        self.tracer.record_publish(board_name, snapshot, traced)
 
-    def update(self):
+    def update(self, board_name=None, snapshot=None):
         """
-        Updates both Network Table and CBHAL with new data if connected. 
+        Updates both Network Table and CBHAL with new data if connected. Called by the publisher thread.
         
+        :param board_name: str - the board to update; None to update all the boards
+        :param snapshot: ControlBoardSnapshot - the snapshot to publish, for a single board; None for the latest
         :return: 
         """
         try:
             if NetworkTable.isConnected():
-                self.putNtData()
-                self.getNtData()
+                with self.lock:
+                    for name in self.get_board_names(board_name):
+                        self.putNtData(name, snapshot)
+                        if not self.test_mode:
+                            self.getNtData(name)
                 if self._get_status() == self.STATUS_ERROR:
                     self.logger.info('Error cleared.')
                 self._set_status(self.STATUS_CLIENT_STARTED_CONNECTING)
@@ -0,0 +1,335 @@
+"""
+Benchmarks the NTAL against a NetworkTables server on loopback, so changes to the NT layer can be measured without a
+roboRIO.
+
+NetworkTables is a singleton, so the server runs in a child process, started from this script with --server. The
+server plays the robot: it echoes TraceSeq back into TraceEcho for the latency tracer, counts the updates it
+receives, and writes the LED and PWM values at the robot loop rate. The NTAL runs in this process and is fed by fake
+HALs at the chosen cycle rate.
+
+Usage (from the ControlBoardApp folder):
+    python ntal_benchmark.py --duration 10
+    python ntal_benchmark.py --cycle-rate 500 --boards 3 --publish-rate none
+    python ntal_benchmark.py --min-flush-interval none
+"""
+import argparse
+import collections
+import functools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from networktables import NetworkTables
+
+logger = logging.getLogger(__name__)
+
+if getattr(sys, 'frozen', False):
+    # Normal Mode
+    from ControlBoardApp.cbhal.ControlBoardBase import ControlBoardBase
+    from ControlBoardApp.cbhal.EventBus import EventBus
+    from ControlBoardApp.ntal import NetworkTableAbstractionLayer
+else:
+    # Test Mode
+    from cbhal.ControlBoardBase import ControlBoardBase
+    from cbhal.EventBus import EventBus
+    from ntal import NetworkTableAbstractionLayer
+
+
+class FakeHal(ControlBoardBase):
+    """
+    HAL with no board behind it. Each cycle it makes up new inputs: the first switch toggles every edge_cycles
+    cycles, and an analog channel moves by one count with a probability of analog_change.
+    """
+    NAME = 'Fake Control Board'
+    LED_OUTPUTS = 16
+    PWM_OUTPUTS = 11
+    ANALOG_INPUTS = 16
+    SWITCH_INPUTS = 16
+
+    def __init__(self, cycle_rate=100, edge_cycles=10, analog_change=0.5, seed=None):
+        """
+        :param cycle_rate: float - HAL cycle rate in Hz; None to free run
+        :param edge_cycles: int - cycles between two switch changes
+        :param analog_change: float - probability of an analog change in a cycle
+        :param seed: int - random seed for the analog changes
+        """
+        super(FakeHal, self).__init__()
+        self.set_cycle_rate(cycle_rate)
+        self.edge_cycles = max(1, int(edge_cycles))
+        self.analog_change = analog_change
+        self.random = random.Random(seed)
+        self.analog_values = bytearray(self.ANALOG_INPUTS)
+
+    def reset_board(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def reconnect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def update(self):
+        """
+        Makes up the inputs of a cycle.
+
+        :return:
+        """
+        self.record_input_time()
+        if self.cycle_count % self.edge_cycles == 0:
+            self.putSwitchMask(self.switch_mask ^ 0x01)
+        if self.random.random() < self.analog_change:
+            channel = self.random.randrange(self.ANALOG_INPUTS)
+            self.analog_values[channel] = (self.analog_values[channel] + self.random.choice((1, 255))) & 0xFF
+            self.putAnalogvalues(bytes(self.analog_values))
+
+
+class BenchmarkHandler:
+    """ Stands in for the ControlBoardHalInterfaceHandler, with a fake HAL per board. """
+    PRIMARY_BOARD = ''
+
+    def __init__(self, boards, **hal_kwargs):
+        """
+        :param boards: int - number of boards
+        :param hal_kwargs: - passed to FakeHal
+        """
+        self.hals = collections.OrderedDict()
+        for index in range(boards):
+            board_name = self.PRIMARY_BOARD if index == 0 else 'Board%d' % (index + 1)
+            self.hals[board_name] = FakeHal(**hal_kwargs)
+
+    def get_board_names(self):
+        return list(self.hals)
+
+    def get_cbhal(self, board_name=PRIMARY_BOARD):
+        return self.hals[board_name]
+
+
+class BenchmarkNtal(NetworkTableAbstractionLayer):
+    """ NTAL that measures the CPU and wall time of each update of the publisher thread. """
+
+    def __init__(self, *args, **kwargs):
+        self.update_count = 0
+        self.update_cpu_time = 0.0
+        self.update_wall_time = 0.0
+        super(BenchmarkNtal, self).__init__(*args, **kwargs)
+
+    def update(self, board_name=None, snapshot=None):
+        start_cpu_time = time.thread_time()
+        start_time = time.perf_counter()
+        super(BenchmarkNtal, self).update(board_name, snapshot)
+        self.update_wall_time += time.perf_counter() - start_time
+        self.update_cpu_time += time.thread_time() - start_cpu_time
+        self.update_count += 1
+
+
+def run_server(robot_rate=50.0):
+    """
+    Runs the NT server, playing the robot. Prints a line when it is ready, then runs until a line is read from stdin
+    and prints its counters as JSON.
+
+    :param robot_rate: float - Hz, how often the LED and PWM values are written
+    :return:
+    """
+    ntal = NetworkTableAbstractionLayer
+    persist_dir = tempfile.mkdtemp()
+    NetworkTables.startServer(persistFilename=os.path.join(persist_dir, 'networktables.ini'), listenAddress='127.0.0.1')
+    counters = collections.Counter()
+    tables = set()
+
+    def on_entry(key, value, _):
+        path, _, name = key.rpartition('/')
+        if name == ntal.SWITCH_OUT:
+            counters['SwitchUpdates'] += 1
+            tables.add(path)
+        elif name == ntal.ANALOG_OUT:
+            counters['AnalogUpdates'] += 1
+        elif name == ntal.TRACE_SEQ:
+            NetworkTables.getEntry('%s/%s' % (path, ntal.TRACE_ECHO)).setNumber(value)
+            NetworkTables.flush()
+            counters['Echoes'] += 1
+
+    NetworkTables.addEntryListenerEx(on_entry, NetworkTables.NotifyFlags.NEW | NetworkTables.NotifyFlags.UPDATE)
+
+    run_robot = threading.Event()
+    run_robot.set()
+
+    def robot_loop():
+        period = 1.0 / robot_rate
+        loop_count = 0
+        while run_robot.is_set():
+            loop_count += 1
+            leds = [bool((loop_count >> bit) & 0x01) for bit in range(FakeHal.LED_OUTPUTS)]
+            pwms = [loop_count & 0xFF] * FakeHal.PWM_OUTPUTS
+            for path in list(tables):
+                NetworkTables.getEntry('%s/%s' % (path, ntal.LED_IN)).setBooleanArray(leds)
+                NetworkTables.getEntry('%s/%s' % (path, ntal.PWM_IN)).setDoubleArray(pwms)
+                counters['OutputWrites'] += 1
+            time.sleep(period)
+
+    robot_thread = threading.Thread(target=robot_loop, name='Robot loop', daemon=True)
+    robot_thread.start()
+
+    print('ready', flush=True)
+    sys.stdin.readline()
+    run_robot.clear()
+    robot_thread.join()
+    print(json.dumps(counters), flush=True)
+    NetworkTables.shutdown()
+
+
+def benchmark(duration=5.0, boards=1, cycle_rate=100, edge_rate=10.0, analog_change=0.5, robot_rate=50.0,
+              seed=None, connect_timeout=5.0, **ntal_kwargs):
+    """
+    Runs the NTAL against a server on loopback and measures the publish throughput, latency and CPU time.
+
+    :param duration: float - measurement time in seconds, after the client connects
+    :param boards: int - number of fake boards
+    :param cycle_rate: float - HAL cycle rate in Hz
+    :param edge_rate: float - switch changes per second of each board
+    :param analog_change: float - probability of an analog change in a HAL cycle
+    :param robot_rate: float - Hz, how often the server writes the LED and PWM values
+    :param seed: int - random seed for the analog changes
+    :param connect_timeout: float - seconds to wait for the client to connect
+    :param ntal_kwargs: - passed to NetworkTableAbstractionLayer, such as publish_rate and min_flush_interval
+    :return: dict - Updates, Rate (updates per second), CpuPerUpdate and WallPerUpdate (us), ProcessCpu (% of one
+             core), Publisher (publisher status), Counters (update counters), Latency (latency statistics) and Server
+             (server counters)
+    """
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--server', '--robot-rate', str(robot_rate)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    handler = None
+    nt = None
+    try:
+        if server.stdout.readline().strip() != 'ready':
+            raise RuntimeError('The NT server did not start.')
+
+        handler = BenchmarkHandler(boards, cycle_rate=cycle_rate, edge_cycles=cycle_rate / edge_rate,
+                                   analog_change=analog_change, seed=seed)
+        nt = BenchmarkNtal('127.0.0.1', handler, **ntal_kwargs)
+        nt.start_publisher()
+        deadline = time.perf_counter() + connect_timeout
+        while not NetworkTables.isConnected():
+            if time.perf_counter() > deadline:
+                raise RuntimeError('Could not connect to the NT server.')
+            time.sleep(0.01)
+
+        for board_name in handler.get_board_names():
+            hal = handler.get_cbhal(board_name)
+            hal.subscribe(EventBus.EVENT_NEW_INPUTS, functools.partial(nt.post, board_name))
+            hal.start()
+
+        # Measure from a clean start
+        time.sleep(0.5)
+        nt.tracer.reset()
+        start_publisher = nt.get_publisher_status()
+        start_counters = nt.get_update_counters()
+        start_updates = (nt.update_count, nt.update_cpu_time, nt.update_wall_time)
+        start_cpu_time = time.process_time()
+        start_time = time.perf_counter()
+
+        time.sleep(duration)
+
+        elapsed = time.perf_counter() - start_time
+        process_cpu_time = time.process_time() - start_cpu_time
+        update_count, update_cpu_time, update_wall_time = (end - start for end, start in
+                                                           zip((nt.update_count, nt.update_cpu_time,
+                                                                nt.update_wall_time), start_updates))
+        publisher = nt.get_publisher_status()
+        for name in ('Posted', 'Published', 'Dropped', 'Flushes', 'FlushesDeferred'):
+            publisher[name] -= start_publisher[name]
+        counters = {name: value - start_counters[name] for name, value in nt.get_update_counters().items()}
+        latency = nt.get_latency_statistics()
+    finally:
+        if handler is not None:
+            for hal in handler.hals.values():
+                hal.stop()
+        if nt is not None:
+            nt.stop_publisher()
+            nt.shutdownNtClient()
+        server_output, _ = server.communicate('stop\n', timeout=10)
+
+    lines = server_output.strip().splitlines()
+    return {'Updates': update_count,
+            'Rate': update_count / elapsed,
+            'CpuPerUpdate': update_cpu_time / update_count * 1e6 if update_count else None,
+            'WallPerUpdate': update_wall_time / update_count * 1e6 if update_count else None,
+            'ProcessCpu': process_cpu_time / elapsed * 100,
+            'Publisher': publisher,
+            'Counters': counters,
+            'Latency': latency,
+            'Server': json.loads(lines[-1]) if lines else {}}
+
+
+def parse_optional_float(value):
+    """
+    Parses a float argument that can be turned off.
+
+    :param value: str - the argument
+    :return: float - the value; None if the argument is 'none'
+    """
+    return None if value.lower() == 'none' else float(value)
+
+
+def main():
+    """
+    Benchmarks the NTAL against a loopback NT server, or runs the server.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the NTAL against a NetworkTables server on loopback.')
+    parser.add_argument('--duration', type=float, default=5.0, help='measurement time in seconds')
+    parser.add_argument('--boards', type=int, default=1, help='number of fake control boards')
+    parser.add_argument('--cycle-rate', type=float, default=100.0, help='HAL cycle rate in Hz')
+    parser.add_argument('--edge-rate', type=float, default=10.0, help='switch changes per second of each board')
+    parser.add_argument('--analog-change', type=float, default=0.5,
+                        help='probability of an analog change in a HAL cycle')
+    parser.add_argument('--robot-rate', type=float, default=50.0, help='Hz, how often the robot writes LEDs and PWMs')
+    parser.add_argument('--publish-rate', type=parse_optional_float, default=NetworkTableAbstractionLayer.PUBLISH_RATE,
+                        help='NTAL publish rate in Hz, or none')
+    parser.add_argument('--min-flush-interval', type=parse_optional_float,
+                        default=NetworkTableAbstractionLayer.MIN_FLUSH_INTERVAL,
+                        help='seconds between edge flushes, or none to turn the low latency mode off')
+    parser.add_argument('--flush-period', type=float, default=50e-3, help='NT periodic flush period in seconds')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the analog changes')
+    parser.add_argument('--server', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.server:
+        run_server(robot_rate=args.robot_rate)
+        return
+
+    results = benchmark(duration=args.duration, boards=args.boards, cycle_rate=args.cycle_rate,
+                        edge_rate=args.edge_rate, analog_change=args.analog_change, robot_rate=args.robot_rate,
+                        seed=args.seed, publish_rate=args.publish_rate, min_flush_interval=args.min_flush_interval,
+                        flush_period=args.flush_period)
+
+    publisher = results['Publisher']
+    print('NTAL: %d updates, %.1f updates/s, %d posted, %d dropped, %d edge flushes' %
+          (results['Updates'], results['Rate'], publisher['Posted'], publisher['Dropped'], publisher['Flushes']))
+    if results['Updates']:
+        print('  Per update (us): CPU %.1f, wall %.1f' % (results['CpuPerUpdate'], results['WallPerUpdate']))
+    print('  Process CPU: %.1f %% of one core' % results['ProcessCpu'])
+    for stage in ('SerialToNt', 'NtToEcho', 'SerialToEcho'):
+        statistics = results['Latency'][stage]
+        if statistics['Count']:
+            print('  Latency %s (ms): mean %.3f, p50 %s, p99 %s, max %.3f (%d samples)' %
+                  (stage, statistics['Mean'], statistics['P50'], statistics['P99'], statistics['Max'],
+                   statistics['Count']))
+    print('  Update counters: %s' % results['Counters'])
+    for name, value in sorted(results['Server'].items()):
+        print('  Server %s: %d' % (name, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,3 @@
-py -3.6 cx_setup.py bdist_msi
-py -3.6-32 cx_setup.py bdist_msi
+py -3.7 cx_setup.py bdist_msi
+py -3.7-32 cx_setup.py bdist_msi
 pause
@@ -1,2 +1,2 @@
-py -3.6 -m pip install --upgrade pynetworktables wxpython cx_freeze crccheck numpy pyserial
-py -3.6-32 -m pip install --upgrade pynetworktables wxpython cx_freeze crccheck numpy pyserial
+py -3.7 -m pip install --upgrade pynetworktables wxpython cx_freeze pyserial
+py -3.7-32 -m pip install --upgrade pynetworktables wxpython cx_freeze pyserial
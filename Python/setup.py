@@ -13,12 +13,10 @@ version_file = os.path.join(
 exec(open(version_file).read())
 
 REQUIREMENTS = [
-        'crccheck',
-        'numpy',
         'pyfrc',
         'pynetworktables',
         'pyserial',
-        'wxPython_Phoenix',
+        'wxPython',
     ]
 
 setup(
@@ -37,9 +35,10 @@ setup(
     },
     requires=REQUIREMENTS,
     install_requires=REQUIREMENTS,
-    dependency_links=[
-        'https://wxpython.org/Phoenix/snapshot-builds#egg=wxPython_Phoenix-3.0.3.dev2648+23be602-cp35-cp35'
-    ]
+    # The HAL uses time.perf_counter_ns() and asyncio.get_running_loop()
+    python_requires='>=3.7',
+    # crccheck is only used by the CRC benchmark in Crc8MaximTable.py
+    extras_require={'benchmark': ['crccheck']},
 )
 
 
@@ -0,0 +1,79 @@
+"""
+Shared fixtures of the Control Board App tests. The tests run the app in Test Mode, so the app folder is added to the
+module search path the same way running main.py from it does.
+
+Usage (from the Python folder):
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'ControlBoardApp'))
+
+from cbhal.AsyncEngine import AsyncEngine
+import firmware_emulator
+
+START_TIMEOUT = 5.0  # second(s), time for a HAL to reset the emulated board and reach the running state
+
+
+def wait_until(predicate, timeout=START_TIMEOUT, period=5e-3):
+    """
+    Polls a predicate until it is true or the timeout expires.
+
+    :param predicate: function - called without arguments
+    :param timeout: float - second(s) to wait at most
+    :param period: float - second(s) between two polls
+    :return: bool - the last result of the predicate
+    """
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(period)
+    return True
+
+
+@pytest.fixture(name='wait_until')
+def wait_until_fixture():
+    return wait_until
+
+
+@pytest.fixture
+def emulated_hal():
+    """
+    Starts HALs against emulated boards, and stops them after the test.
+
+    Call the fixture with the HAL class and the FirmwareEmulator arguments. use_asyncio runs the HAL on the asyncio
+    engine instead of its own thread, delta_mode turns the delta mode of a firmware v2 HAL on or off before it starts.
+
+    :return: function - returns the emulator and the running HAL
+    """
+    if firmware_emulator.pty is None:
+        pytest.skip('The firmware emulator needs pseudo-terminals')
+    started = []
+
+    def start(hal_class, use_asyncio=False, delta_mode=None, **emulator_kwargs):
+        emulator = firmware_emulator.FirmwareEmulator(hal_class, **emulator_kwargs)
+        emulator.start()
+        hal = emulator.hal_class()()
+        engine = AsyncEngine() if use_asyncio else None
+        started.append((emulator, hal, engine))
+        if delta_mode is not None:
+            hal.set_delta_mode(delta_mode)
+        if engine is not None:
+            engine.start_hal(hal)
+        else:
+            hal.start()
+        assert wait_until(hal.is_control_board_running), 'HAL did not reach the running state: %s' % hal.get_status()
+        return emulator, hal
+
+    yield start
+
+    for emulator, hal, engine in reversed(started):
+        hal.stop()
+        if engine is not None:
+            engine.stop()
+        emulator.stop()
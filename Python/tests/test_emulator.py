@@ -0,0 +1,118 @@
+"""
+Tests of the serial HALs against the firmware emulator: reset, baud rate negotiation, the input and output exchange,
+delta mode and the asyncio engine.
+"""
+import time
+
+import pytest
+
+from cbhal import ControlBoard_1v1, ControlBoard_1v1_Fw2, ControlBoard_1v1_Fw2_Delta, ArduinoUno_Fw2
+
+SERIAL_HALS = [ControlBoard_1v1.HardwareAbstractionLayer,
+               ControlBoard_1v1_Fw2.HardwareAbstractionLayer,
+               ControlBoard_1v1_Fw2_Delta.HardwareAbstractionLayer,
+               ArduinoUno_Fw2.HardwareAbstractionLayer]
+HAL_IDS = ['Fw1v0', 'Fw2', 'Fw2_Delta', 'ArduinoUno_Fw2']
+
+
+@pytest.mark.parametrize('hal_class', SERIAL_HALS, ids=HAL_IDS)
+def test_baud_rate_negotiation(emulated_hal, hal_class):
+    emulator, hal = emulated_hal(hal_class)
+
+    assert hal.port.baudrate == hal_class.NEGOTIATED_BAUD_RATES[0]
+    assert hal.baud_negotiation_supported is True
+    assert emulator.get_counters()['BaudRateChanges'] == 1
+
+
+@pytest.mark.parametrize('hal_class', SERIAL_HALS, ids=HAL_IDS)
+def test_legacy_firmware(emulated_hal, wait_until, hal_class):
+    # Firmware without baud rate negotiation answers the request with inputs. The HAL must stay at BAUD_RATE, without
+    # resetting the board or marking the negotiated rates as failed.
+    emulator, hal = emulated_hal(hal_class, legacy_firmware=True)
+    cycle = hal.get_snapshot().cycle
+    assert wait_until(lambda: hal.get_snapshot().cycle >= cycle + 10)
+
+    assert hal.is_control_board_running()
+    assert hal.port.baudrate == hal_class.BAUD_RATE
+    assert hal.baud_negotiation_supported is False
+    assert not hal.failed_baud_rates
+    counters = emulator.get_counters()
+    assert counters['Resets'] == 1
+    assert counters['BaudRateChanges'] == 0
+
+
+def test_unreliable_baud_rate(emulated_hal, wait_until):
+    emulator, hal = emulated_hal(ControlBoard_1v1_Fw2.HardwareAbstractionLayer, unreliable_baud_rates=(1000000,))
+
+    assert wait_until(lambda: hal.is_control_board_running() and hal.port.baudrate == 500000)
+    assert 1000000 in hal.failed_baud_rates
+
+
+@pytest.mark.parametrize('use_asyncio', [False, True], ids=['thread', 'asyncio'])
+@pytest.mark.parametrize('hal_class', SERIAL_HALS, ids=HAL_IDS)
+def test_exchange(emulated_hal, wait_until, hal_class, use_asyncio):
+    emulator, hal = emulated_hal(hal_class, use_asyncio=use_asyncio)
+
+    switches = [switch_num % 3 == 1 for switch_num in range(hal.SWITCH_INPUTS)]
+    analogs = [(analog_num * 37) & 0xFF for analog_num in range(hal.ANALOG_INPUTS)]
+    emulator.set_inputs(switches=switches, analogs=analogs)
+    assert wait_until(lambda: hal.getSwitchValues() == switches and hal.getAnalogValues() == analogs)
+
+    leds = [led_num % 2 == 0 for led_num in range(hal.LED_OUTPUTS)]
+    pwms = [(pwm_num * 23) & 0xFF for pwm_num in range(hal.PWM_OUTPUTS)]
+    hal.putLedValues(leds)
+    hal.putPwmValues(pwms)
+    assert wait_until(lambda: emulator.get_outputs() == (leds, pwms))
+
+    # The board must not have seen any bad frames, and must not have been reset again
+    counters = emulator.get_counters()
+    assert counters['CrcErrors'] == 0
+    assert counters['Resets'] == 1
+
+
+# Fw1v0 waits for each reply, so a dropped reply costs a full timeout. Fw2 expires lost replies.
+@pytest.mark.parametrize('hal_class, error_rates', [(ControlBoard_1v1.HardwareAbstractionLayer,
+                                                     {'corrupt_rate': 0.02}),
+                                                    (ControlBoard_1v1_Fw2.HardwareAbstractionLayer,
+                                                     {'corrupt_rate': 0.05, 'drop_rate': 0.05})], ids=HAL_IDS[:2])
+def test_bad_replies(emulated_hal, wait_until, hal_class, error_rates):
+    # Bad replies are dropped and the HAL keeps running, instead of resetting the board
+    emulator, hal = emulated_hal(hal_class, seed=1, **error_rates)
+    emulator.set_inputs(analogs=[200] * hal.ANALOG_INPUTS)
+    assert wait_until(lambda: hal.getAnalogValues() == [200] * hal.ANALOG_INPUTS)
+
+    cycle = hal.get_snapshot().cycle
+    assert wait_until(lambda: hal.get_snapshot().cycle >= cycle + 100)
+    assert hal.is_control_board_running()
+    counters = emulator.get_counters()
+    assert counters['RepliesCorrupted'] + counters['RepliesDropped'] > 0
+    assert counters['Resets'] == 1
+
+
+def test_delta_mode_quiet_board(emulated_hal):
+    # A board whose inputs do not change only sends the periodic full sync, and the HAL only completes a cycle when it
+    # received a packet
+    emulator, hal = emulated_hal(ControlBoard_1v1_Fw2.HardwareAbstractionLayer, delta_mode=True)
+    time.sleep(0.2)
+
+    cycle = hal.get_snapshot().cycle
+    time.sleep(0.5)
+    cycles = hal.get_snapshot().cycle - cycle
+    assert hal.is_control_board_running()
+    assert 0 < cycles <= 0.5 / emulator.protocol.FULL_SYNC_PERIOD + 2
+
+
+def test_delta_mode_changes(emulated_hal, wait_until):
+    emulator, hal = emulated_hal(ControlBoard_1v1_Fw2.HardwareAbstractionLayer, delta_mode=True)
+    time.sleep(0.2)
+
+    # A change can also arrive with the periodic full sync, so make a few
+    for value in (99, 150, 30):
+        analogs = [0] * hal.ANALOG_INPUTS
+        analogs[5] = value
+        emulator.set_inputs(switches=[value > 50] + [False] * (hal.SWITCH_INPUTS - 1), analogs=analogs)
+        assert wait_until(lambda: hal.getSwitchMask() == int(value > 50) and hal.getAnalogValues() == analogs)
+    assert hal.get_status()['Delta']['InputDeltas'] > 0
+
+    hal.putPwmValues([42] * hal.PWM_OUTPUTS)
+    assert wait_until(lambda: emulator.get_outputs()[1] == [42] * hal.PWM_OUTPUTS)
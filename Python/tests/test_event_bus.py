@@ -0,0 +1,138 @@
+"""
+Tests of the event bus: delivery, coalescing, slow subscriber isolation and restarting.
+"""
+import threading
+
+import pytest
+
+from cbhal.EventBus import EventBus
+
+
+@pytest.fixture
+def event_bus():
+    event_bus = EventBus('Test')
+    event_bus.start()
+    yield event_bus
+    event_bus.unsubscribe_all()
+
+
+class Subscriber:
+    """ Records the values it receives. Blocks in the callback while the gate is closed. """
+
+    def __init__(self):
+        self.values = []
+        self.received = threading.Condition()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def __call__(self, value):
+        self.entered.set()
+        self.gate.wait()
+        with self.received:
+            self.values.append(value)
+            self.received.notify_all()
+
+    def wait_for(self, predicate, timeout=2.0):
+        with self.received:
+            return self.received.wait_for(lambda: predicate(self.values), timeout)
+
+
+def test_delivery(event_bus):
+    subscriber = Subscriber()
+    event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, subscriber)
+
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 1)
+    event_bus.publish(EventBus.EVENT_STATE_CHANGED, 2)
+
+    assert subscriber.wait_for(lambda values: values == [1])
+
+
+def test_invalid_event_type(event_bus):
+    with pytest.raises(KeyError):
+        event_bus.subscribe('NoSuchEvent', Subscriber())
+
+
+def test_coalescing(event_bus):
+    subscriber = Subscriber()
+    subscription = event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, subscriber)
+
+    # Hold the dispatcher in the first callback, so the next values queue up
+    subscriber.gate.clear()
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 0)
+    assert subscriber.entered.wait(2.0)
+    for value in range(1, 10):
+        event_bus.publish(EventBus.EVENT_NEW_INPUTS, value)
+    subscriber.gate.set()
+
+    # Only the latest value is delivered
+    assert subscriber.wait_for(lambda values: values == [0, 9])
+    status = subscription.get_status()
+    assert status['Published'] == 10
+    assert status['Delivered'] == 2
+    assert status['Coalesced'] == 8
+
+
+def test_slow_subscriber(event_bus):
+    slow = Subscriber()
+    fast = Subscriber()
+    event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, slow)
+    event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, fast)
+
+    slow.gate.clear()
+    for value in range(5):
+        event_bus.publish(EventBus.EVENT_NEW_INPUTS, value)
+        # The fast subscriber gets every value while the slow one is blocked
+        assert fast.wait_for(lambda values: values[-1:] == [value])
+    assert slow.values == []
+
+    slow.gate.set()
+    assert slow.wait_for(lambda values: values[-1:] == [4])
+
+
+def test_callback_errors(event_bus):
+    def failing_callback(value):
+        raise ValueError(value)
+
+    subscription = event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, failing_callback)
+    subscriber = Subscriber()
+    event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, subscriber)
+
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 1)
+    assert subscriber.wait_for(lambda values: values == [1])
+    event_bus.unsubscribe(subscription)
+    assert subscription.get_status()['Errors'] == 1
+
+
+def test_restart(event_bus):
+    # A value that was queued when the bus stopped must not block the subscription after a restart
+    subscriber = Subscriber()
+    event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, subscriber)
+
+    subscriber.gate.clear()
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 1)
+    assert subscriber.entered.wait(2.0)
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 2)
+    stopping = threading.Thread(target=event_bus.stop)
+    stopping.start()
+    subscriber.gate.set()
+    stopping.join(2.0)
+    assert not stopping.is_alive()
+
+    event_bus.start()
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 3)
+    assert subscriber.wait_for(lambda values: values[-1:] == [3])
+    assert 2 not in subscriber.values
+
+
+def test_unsubscribe(event_bus):
+    subscriber = Subscriber()
+    subscription = event_bus.subscribe(EventBus.EVENT_NEW_INPUTS, subscriber)
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 1)
+    assert subscriber.wait_for(lambda values: values == [1])
+
+    event_bus.unsubscribe(subscription)
+    event_bus.publish(EventBus.EVENT_NEW_INPUTS, 2)
+
+    assert not subscriber.wait_for(lambda values: len(values) > 1, timeout=0.1)
+    assert event_bus.get_status()[EventBus.EVENT_NEW_INPUTS] == []
@@ -0,0 +1,75 @@
+"""
+Tests of the firmware v1.0 line format: outputs lines and the parsing of inputs lines.
+"""
+import pytest
+
+from cbhal.ControlBoard_1v1 import HardwareAbstractionLayer
+from cbhal.ControlBoardBase import DataIntegrityError
+from cbhal.Crc8MaximTable import Crc8MaximTable
+
+
+@pytest.fixture
+def hal():
+    return HardwareAbstractionLayer()
+
+
+def make_line(switch_mask, analogs):
+    """
+    Builds an inputs line the way the firmware does.
+
+    :param switch_mask: int - switch values, bit n = switch n
+    :param analogs: list(int) - analog values
+    :return: bytes - the line, without the line ending
+    """
+    data = ('SW:%x;ANA:%s;' % (switch_mask, ','.join(map(str, analogs)))).encode()
+    return data + ('CRC:%d;' % Crc8MaximTable.calc(data, 0)).encode()
+
+
+def test_unpack_inputs(hal):
+    analogs = list(range(240, 240 + hal.ANALOG_INPUTS))
+    line = make_line(0x8005, analogs)
+
+    assert hal.unpack_inputs(line) == (0x8005, bytes(analogs))
+    # The serial port hands over memoryviews, the tests and older code use str
+    assert hal.unpack_inputs(memoryview(line)) == (0x8005, bytes(analogs))
+    assert hal.unpack_inputs(line.decode()) == (0x8005, bytes(analogs))
+
+
+def test_unpack_data(hal):
+    analogs = [4, 4, 6, 4, 4, 4, 5, 4, 4, 4, 4, 5, 5, 4, 4, 6]
+    switches, analog_values = hal.unpack_data(make_line(0x0003, analogs))
+
+    assert switches == [True, True] + [False] * (hal.SWITCH_INPUTS - 2)
+    assert analog_values == analogs
+
+
+def test_unpack_padded_analogs(hal):
+    # Values the firmware does not normally send take the slow path
+    line = make_line(0, ['007'] + ['0'] * (hal.ANALOG_INPUTS - 1))
+
+    assert hal.unpack_inputs(line) == (0, bytes([7] + [0] * (hal.ANALOG_INPUTS - 1)))
+
+
+@pytest.mark.parametrize('line', [b'',
+                                  b'SW:0;ANA:0;',  # Missing CRC
+                                  b'SW:0;ANA:0;CRC:x;',  # Invalid CRC value
+                                  make_line(1, [0] * 16).replace(b'SW:1', b'SW:3')])  # Bad CRC
+def test_unpack_invalid(hal, line):
+    with pytest.raises(DataIntegrityError):
+        hal.unpack_inputs(line)
+
+
+def test_unpack_wrong_analog_count(hal):
+    with pytest.raises(IndexError):
+        hal.unpack_inputs(make_line(0, [0] * (hal.ANALOG_INPUTS - 1)))
+
+
+def test_format_outputs(hal):
+    pwms = list(range(hal.PWM_OUTPUTS))
+    line = hal.format_outputs(0x0001, pwms)
+
+    data, crc = line.split('CRC:')
+    # The LEDs fill the upper bits of the 16-bit number
+    assert data == 'LED:%d;PWM:%s;' % (1 << (16 - hal.LED_OUTPUTS), ','.join(map(str, pwms)))
+    assert int(crc) == Crc8MaximTable.calc(data.encode(), 0)
+    assert hal.pack_frame(0x0001, bytes(pwms)) == (line + '\r\n').encode()
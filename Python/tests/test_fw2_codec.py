@@ -0,0 +1,111 @@
+"""
+Tests of the firmware v2 packet codec: CRC, byte stuffing, outputs packets and inputs / input delta packets.
+"""
+import pytest
+
+from cbhal.ControlBoard_1v1_Fw2 import HardwareAbstractionLayer
+from cbhal.ControlBoardBase import DataIntegrityError
+from cbhal.Crc8MaximTable import Crc8MaximTable
+
+
+@pytest.fixture
+def hal():
+    return HardwareAbstractionLayer()
+
+
+def make_frame(hal, packet, sequence=0):
+    """
+    Completes a packet with the sequence number and CRC, and byte stuffs it like the firmware does.
+
+    :param hal: ControlBoardSerialBaseFw2 - the HAL
+    :param packet: bytes - type and data
+    :param sequence: int - packet sequence number (0-255)
+    :return: bytes - the frame, without the FRAME_END terminator
+    """
+    packet = bytearray(packet) + bytes([sequence])
+    packet.append(Crc8MaximTable.calc(packet, 0))
+    return hal.stuff_frame(packet)[:-1]
+
+
+def test_crc_check_value():
+    # Check value of CRC-8/Maxim
+    assert Crc8MaximTable.calc(b'123456789', 0) == 0xA1
+
+
+def test_stuff_frame_roundtrip(hal):
+    packet = bytes([0x01, hal.FRAME_END, 0x02, hal.FRAME_ESC, hal.FRAME_ESC_END, hal.FRAME_END, hal.FRAME_ESC])
+    frame = hal.stuff_frame(packet)
+
+    assert frame.count(hal.FRAME_END) == 1 and frame[-1] == hal.FRAME_END
+    assert hal.unstuff_frame(frame[:-1]) == packet
+
+
+def test_pack_data(hal):
+    leds = [led_num % 3 == 0 for led_num in range(hal.LED_OUTPUTS)]
+    pwms = [0xC0, 0xDB] + list(range(hal.PWM_OUTPUTS - 2))
+    frame = hal.pack_data(leds, pwms, sequence=0xC0)
+
+    assert frame.count(hal.FRAME_END) == 1 and frame[-1] == hal.FRAME_END
+    packet = hal.unstuff_frame(frame[:-1])
+    assert packet[0] == hal.PACKET_OUTPUTS
+    assert int.from_bytes(packet[1:1 + hal.led_mask_bytes], 'little') == hal.list_to_mask(leds)
+    assert list(packet[1 + hal.led_mask_bytes:-2]) == pwms
+    assert packet[-2] == 0xC0
+    assert packet[-1] == Crc8MaximTable.calc(packet[:-1], 0)
+
+
+def test_unpack_inputs(hal):
+    analogs = bytes([0xC0, 0xDB] + list(range(hal.ANALOG_INPUTS - 2)))
+    frame = make_frame(hal, bytes([hal.PACKET_INPUTS]) + (0x8001).to_bytes(hal.switch_mask_bytes, 'little') + analogs,
+                       sequence=7)
+
+    assert hal.unpack_packet(frame) == (hal.PACKET_INPUTS, 7, 0x8001, analogs)
+
+
+def test_unpack_input_delta(hal):
+    analogs = bytes(range(100, 100 + hal.ANALOG_INPUTS))
+    hal.unpack_packet(make_frame(hal, bytes([hal.PACKET_INPUTS]) + bytes(hal.switch_mask_bytes) + analogs))
+
+    # Channels 1 and 3 changed
+    delta = bytes([hal.PACKET_INPUT_DELTA]) + (0x0002).to_bytes(hal.switch_mask_bytes, 'little') + \
+        (0b1010).to_bytes(hal.analog_mask_bytes, 'little') + bytes([11, 33])
+    packet_type, _, switch_mask, analog_values = hal.unpack_packet(make_frame(hal, delta, sequence=1))
+
+    expected = bytearray(analogs)
+    expected[1] = 11
+    expected[3] = 33
+    assert packet_type == hal.PACKET_INPUT_DELTA
+    assert switch_mask == 0x0002
+    assert analog_values == bytes(expected)
+
+
+@pytest.mark.parametrize('analog_mask, values', [(0b1010, [11]),  # Fewer values than changed channels
+                                                 (0b0010, [11, 33])])  # More values than changed channels
+def test_unpack_input_delta_mismatch(hal, analog_mask, values):
+    delta = bytes([hal.PACKET_INPUT_DELTA]) + bytes(hal.switch_mask_bytes) + \
+        analog_mask.to_bytes(hal.analog_mask_bytes, 'little') + bytes(values)
+
+    with pytest.raises(DataIntegrityError):
+        hal.unpack_packet(make_frame(hal, delta))
+
+
+def test_unpack_input_delta_too_short(hal):
+    with pytest.raises(DataIntegrityError):
+        hal.unpack_packet(make_frame(hal, bytes([hal.PACKET_INPUT_DELTA]) + bytes(hal.switch_mask_bytes)))
+
+
+@pytest.mark.parametrize('corrupt', [lambda packet: packet[:-1] + bytes([packet[-1] ^ 0x01]),  # Bad CRC
+                                     lambda packet: packet[:-3],  # Truncated
+                                     lambda packet: b''])  # Empty
+def test_unpack_invalid(hal, corrupt):
+    packet = bytes([hal.PACKET_INPUTS]) + bytes(hal.switch_mask_bytes + hal.ANALOG_INPUTS) + bytes([0])
+    packet += bytes([Crc8MaximTable.calc(packet, 0)])
+
+    with pytest.raises(DataIntegrityError):
+        hal.unpack_packet(hal.stuff_frame(corrupt(packet))[:-1])
+
+
+def test_unpack_unexpected_type(hal):
+    with pytest.raises(DataIntegrityError):
+        hal.unpack_packet(make_frame(hal, bytes([hal.PACKET_OUTPUTS]) +
+                                     bytes(hal.switch_mask_bytes + hal.ANALOG_INPUTS)))
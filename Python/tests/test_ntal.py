@@ -0,0 +1,134 @@
+"""
+Tests of the NTAL change detection, entry listeners, test mode buffering and edge detection. The NT client is started
+but never connects, and the tests call the NTAL methods the publisher thread and the listeners would call.
+"""
+import pytest
+
+from ntal import NetworkTableAbstractionLayer
+from ntal_benchmark import BenchmarkHandler
+
+BOARD = BenchmarkHandler.PRIMARY_BOARD
+SECOND_BOARD = 'Board2'
+
+
+@pytest.fixture
+def handler():
+    return BenchmarkHandler(2, cycle_rate=None)
+
+
+@pytest.fixture
+def ntal(handler):
+    ntal = NetworkTableAbstractionLayer('127.0.0.1', handler, analog_flush_delta=10, latency_trace=False)
+    yield ntal
+    ntal.shutdownNtClient()
+
+
+def test_change_detection(ntal, handler):
+    hal = handler.get_cbhal(SECOND_BOARD)
+    snapshot = hal.get_snapshot()
+
+    ntal.putNtData(SECOND_BOARD, snapshot)
+    counters = ntal.get_update_counters()
+    assert (counters['SwitchSent'], counters['SwitchSkipped']) == (0, 1)
+    assert (counters['AnalogSent'], counters['AnalogSkipped']) == (0, 1)
+    assert not ntal.flush_pending
+
+    switch_mask = 0b101
+    ntal.putNtData(SECOND_BOARD, snapshot._replace(switch_mask=switch_mask))
+    counters = ntal.get_update_counters()
+    assert (counters['SwitchSent'], counters['SwitchSkipped']) == (1, 1)
+    assert ntal.flush_pending
+    table = ntal.get_table(SECOND_BOARD)
+    assert list(table.getBooleanArray(ntal.SWITCH_OUT, None)) == hal.mask_to_list(switch_mask, hal.SWITCH_INPUTS)
+
+    # The other board's values are tracked separately
+    ntal.putNtData(BOARD, handler.get_cbhal(BOARD).get_snapshot())
+    assert ntal.get_update_counters()['SwitchSkipped'] == 2
+
+
+def test_analog_flush_delta(ntal, handler):
+    snapshot = handler.get_cbhal(BOARD).get_snapshot()
+    analogs = bytearray(snapshot.analogs)
+
+    # Small changes ride the periodic flush
+    analogs[3] += 5
+    ntal.putNtData(BOARD, snapshot._replace(analogs=bytes(analogs)))
+    assert ntal.get_update_counters()['AnalogSent'] == 1
+    assert not ntal.flush_pending
+    assert list(ntal.get_table(BOARD).getNumberArray(ntal.ANALOG_OUT, None)) == list(analogs)
+
+    analogs[3] += 10
+    ntal.putNtData(BOARD, snapshot._replace(analogs=bytes(analogs)))
+    assert ntal.get_update_counters()['AnalogSent'] == 2
+    assert ntal.flush_pending
+
+
+def test_entry_listener(ntal, handler):
+    hal = handler.get_cbhal(BOARD)
+    leds = [led_num % 2 == 1 for led_num in range(hal.LED_OUTPUTS)]
+    pwms = list(range(hal.PWM_OUTPUTS))
+
+    ntal.on_entry_changed(BOARD, None, ntal.LED_IN, leds, False)
+    ntal.on_entry_changed(BOARD, None, ntal.PWM_IN, pwms, False)
+    assert hal.getLedValues() == leds
+    assert hal.getPwmValues() == pwms
+    counters = ntal.get_update_counters()
+    assert (counters['LedApplied'], counters['PwmApplied']) == (1, 1)
+
+    # The CBHAL already has the values, so the publisher skips them
+    ntal.getNtData(BOARD)
+    counters = ntal.get_update_counters()
+    assert (counters['LedApplied'], counters['LedSkipped'], counters['PwmApplied'], counters['PwmSkipped']) == \
+        (1, 1, 1, 1)
+
+    # A board reset lost them, so they are applied again
+    hal.reset_values()
+    ntal.getNtData(BOARD)
+    assert hal.getLedValues() == leds
+    assert hal.getPwmValues() == pwms
+
+
+def test_entry_listener_errors(ntal, handler):
+    hal = handler.get_cbhal(BOARD)
+
+    ntal.on_entry_changed(BOARD, None, ntal.LED_IN, [True] * (hal.LED_OUTPUTS - 1), False)
+
+    assert ntal.get_update_counters()['ListenerErrors'] == 1
+    assert hal.getLedMask() == 0
+
+
+def test_test_mode(ntal, handler):
+    hal = handler.get_cbhal(BOARD)
+    robot_pwms = [100] * hal.PWM_OUTPUTS
+    test_pwms = [5] * hal.PWM_OUTPUTS
+
+    # The robot's values are buffered while the GUI drives the outputs
+    ntal.set_test_mode(True)
+    hal.putPwmValues(test_pwms)
+    ntal.on_entry_changed(BOARD, None, ntal.PWM_IN, robot_pwms, False)
+    assert hal.getPwmValues() == test_pwms
+
+    ntal.set_test_mode(False)
+    assert hal.getPwmValues() == robot_pwms
+
+
+def test_edge_detection(ntal, handler):
+    snapshot = handler.get_cbhal(BOARD).get_snapshot()
+
+    # The first snapshot of a board is always published right away
+    ntal.post(BOARD, snapshot)
+    assert ntal.edge_posted
+
+    ntal.edge_posted = False
+    ntal.post(BOARD, snapshot._replace(cycle=snapshot.cycle + 1))
+    assert not ntal.edge_posted
+
+    analogs = bytearray(snapshot.analogs)
+    analogs[0] += 10
+    ntal.post(BOARD, snapshot._replace(analogs=bytes(analogs)))
+    assert ntal.edge_posted
+
+    ntal.edge_posted = False
+    ntal.post(BOARD, snapshot._replace(switch_mask=1))
+    assert ntal.edge_posted
+    assert ntal.get_publisher_status()['Posted'] == 4